@@ -1,8 +1,9 @@
 # core/admin.py
 
 from django.contrib import admin
+from django.db.models import Sum
 from .models import UserProfile, Education, Experience
-from .models import Generation
+from .models import Generation, GenerationSection, PDFArtifact, GenerationJob, GenerationBatch, UsageRecord
 
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
@@ -16,9 +17,64 @@ class EducationAdmin(admin.ModelAdmin):
 class ExperienceAdmin(admin.ModelAdmin):
     list_display = ['title', 'company', 'profile']
 
+class GenerationSectionInline(admin.TabularInline):
+    model = GenerationSection
+    fields = ('position', 'key', 'latex', 'input_hash', 'updated_at')
+    readonly_fields = ('input_hash', 'updated_at')
+    extra = 0
+
+class UsageRecordInline(admin.TabularInline):
+    model = UsageRecord
+    fields = ('purpose', 'model', 'prompt_tokens', 'completion_tokens', 'total_tokens', 'latency_ms', 'cost', 'created_at')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
 @admin.register(Generation)
 class GenerationAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user', 'generation_type', 'job_title', 'company', 'created_at')
+    inlines = [GenerationSectionInline, UsageRecordInline]
+    list_display = ('id', 'user', 'generation_type', 'job_title', 'company', 'tokens', 'cost', 'created_at')
     list_display_links = ('id', 'user')  # Makes 'id' and 'user' clickable
     readonly_fields = ('id', 'created_at')  # Optional: make 'id' and 'created_at' read-only
-    fields = ('id', 'user', 'job_description', 'generation_type', 'job_title', 'company', 'json_output', 'created_at')
\ No newline at end of file
+    fields = ('id', 'user', 'job_description', 'generation_type', 'job_title', 'company', 'json_output', 'created_at')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            total_tokens=Sum('usage_records__total_tokens'),
+            total_cost=Sum('usage_records__cost'),
+        )
+
+    @admin.display(description='Tokens', ordering='total_tokens')
+    def tokens(self, obj):
+        return obj.total_tokens
+
+    @admin.display(description='Cost (USD)', ordering='total_cost')
+    def cost(self, obj):
+        return obj.total_cost
+
+@admin.register(PDFArtifact)
+class PDFArtifactAdmin(admin.ModelAdmin):
+    list_display = ('id', 'generation', 'size_bytes', 'compile_duration_ms', 'created_at')
+    readonly_fields = ('source_hash', 'created_at')
+
+@admin.register(GenerationJob)
+class GenerationJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'batch', 'status', 'created_at', 'started_at', 'finished_at')
+    list_filter = ('status',)
+    readonly_fields = ('created_at', 'started_at', 'finished_at')
+
+@admin.register(GenerationBatch)
+class GenerationBatchAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'concurrency', 'use_batch_api', 'remote_status', 'created_at')
+    list_filter = ('use_batch_api', 'remote_status')
+    readonly_fields = ('remote_batch_id', 'submitted_at', 'created_at')
+
+@admin.register(UsageRecord)
+class UsageRecordAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'generation', 'purpose', 'model', 'total_tokens', 'latency_ms', 'cost', 'created_at')
+    list_filter = ('purpose', 'model')
+    date_hierarchy = 'created_at'
+    readonly_fields = ('created_at',)
@@ -0,0 +1,124 @@
+# core/artifacts.py
+
+import time
+import logging
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils import timezone
+
+from .latex import prepare_latex_source, get_pdf, LatexCompilationError
+from .metrics import span
+from .models import PDFArtifact
+from .pdf_cache import latex_source_hash
+
+logger = logging.getLogger(__name__)
+
+
+def _compile_generation(generation):
+    """
+    Compiles a generation's LaTeX code.
+
+    Returns:
+        tuple: (PDF bytes, compile duration in milliseconds, source hash).
+
+    Raises:
+        LatexCompilationError: If the generation has no LaTeX code or it fails to compile.
+    """
+    latex_code_raw = generation.json_output.get('latex_code', '')
+    if not latex_code_raw:
+        raise LatexCompilationError("No LaTeX code found for this document.")
+
+    latex_code_clean = prepare_latex_source(latex_code_raw)
+
+    start = time.perf_counter()
+    pdf_content = get_pdf(latex_code_clean)
+    compile_duration_ms = int((time.perf_counter() - start) * 1000)
+    return pdf_content, compile_duration_ms, latex_source_hash(latex_code_clean)
+
+
+def create_pdf_artifact(generation):
+    """
+    Compiles a generation's LaTeX code and stores the PDF as a file-backed artifact.
+
+    Args:
+        generation (Generation): The generation to compile.
+
+    Returns:
+        PDFArtifact: The stored artifact.
+
+    Raises:
+        LatexCompilationError: If the generation has no LaTeX code or it fails to compile.
+    """
+    pdf_content, compile_duration_ms, source_hash = _compile_generation(generation)
+
+    artifact = PDFArtifact(
+        generation=generation,
+        size_bytes=len(pdf_content),
+        compile_duration_ms=compile_duration_ms,
+        source_hash=source_hash,
+        compiled_at=timezone.now(),
+    )
+    artifact.pdf_file.save(f"generation-{generation.id}.pdf", ContentFile(pdf_content), save=False)
+    artifact.save()
+    logger.debug(
+        f"Stored PDF artifact for Generation ID {generation.id} "
+        f"({artifact.size_bytes} bytes, compiled in {compile_duration_ms} ms)."
+    )
+    return artifact
+
+
+def replace_pdf_artifact(generation):
+    """
+    Recompiles a generation's PDF and swaps it in for its current artifact.
+
+    The new PDF is compiled and written before the artifact row is updated, so when the
+    compilation fails the current PDF stays in place. The previous file is deleted once
+    the update is committed. The artifact cached on the generation is the one updated.
+
+    Returns:
+        PDFArtifact: The updated (or, for a generation without one, new) artifact.
+
+    Raises:
+        LatexCompilationError: If the LaTeX code fails to compile; nothing is changed.
+    """
+    try:
+        artifact = generation.artifact
+    except PDFArtifact.DoesNotExist:
+        return create_pdf_artifact(generation)
+
+    pdf_content, compile_duration_ms, source_hash = _compile_generation(generation)
+    previous_name = artifact.pdf_file.name
+    artifact.pdf_file.save(f"generation-{generation.id}.pdf", ContentFile(pdf_content), save=False)
+    artifact.size_bytes = len(pdf_content)
+    artifact.compile_duration_ms = compile_duration_ms
+    artifact.source_hash = source_hash
+    artifact.compiled_at = timezone.now()
+    with transaction.atomic():
+        artifact.save(update_fields=['pdf_file', 'size_bytes', 'compile_duration_ms', 'source_hash', 'compiled_at'])
+        storage = artifact.pdf_file.storage
+        transaction.on_commit(lambda: storage.delete(previous_name))
+    logger.debug(f"Replaced the PDF artifact of Generation ID {generation.id} ({artifact.size_bytes} bytes).")
+    return artifact
+
+
+def get_or_create_pdf_artifact(generation):
+    """
+    Returns the generation's PDF artifact, compiling it first for generations that predate artifacts.
+
+    Raises:
+        LatexCompilationError: If the artifact is missing and the LaTeX code fails to compile.
+    """
+    try:
+        return generation.artifact
+    except PDFArtifact.DoesNotExist:
+        logger.info(f"No PDF artifact for Generation ID {generation.id}; compiling it now.")
+        return create_pdf_artifact(generation)
+
+
+def read_pdf_artifact(artifact):
+    """
+    Reads the stored PDF content of an artifact.
+    """
+    with span('pdf_read'), artifact.pdf_file.open('rb') as pdf_file:
+        return pdf_file.read()
@@ -0,0 +1,429 @@
+# core/batch_api.py
+
+import io
+import json
+import logging
+import os
+import uuid
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import GenerationBatch, GenerationJob
+from .generation import document_output, document_request, document_response_format, save_document
+from .llm import get_openai_client
+from .ratelimit import estimate_tokens
+from .usage import batch_usage_record, check_token_budget, save_usage
+from .utils import JobDetails, job_details_request
+
+logger = logging.getLogger(__name__)
+
+# Batch service statuses after which a batch will not change any more
+FINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+
+class BatchServiceError(Exception):
+    """
+    Raised when the batch service rejects a request.
+    """
+
+
+class OpenAIBatchBackend:
+    """
+    Submits batches to the OpenAI Batch API.
+    """
+
+    def submit(self, name, requests_jsonl):
+        """
+        Uploads a JSONL file of requests and starts a batch.
+
+        Args:
+            name (str): A file name for the requests.
+            requests_jsonl (str): One chat completion request per line.
+
+        Returns:
+            str: The ID of the batch at the service.
+        """
+        client = get_openai_client()
+        input_file = client.files.create(file=(name, io.BytesIO(requests_jsonl.encode('utf-8'))), purpose='batch')
+        remote_batch = client.batches.create(
+            input_file_id=input_file.id,
+            endpoint='/v1/chat/completions',
+            completion_window='24h',
+        )
+        return remote_batch.id
+
+    def retrieve(self, remote_batch_id):
+        """
+        Returns the status of a batch and, once it is completed, its results.
+
+        Returns:
+            tuple: (status, output JSONL or None).
+        """
+        client = get_openai_client()
+        remote_batch = client.batches.retrieve(remote_batch_id)
+        output = None
+        if remote_batch.status == 'completed':
+            # Requests that failed are reported in a separate error file
+            output = ''.join(
+                client.files.content(file_id).text
+                for file_id in (remote_batch.output_file_id, remote_batch.error_file_id)
+                if file_id
+            )
+        return remote_batch.status, output
+
+
+def placeholder_completion(body):
+    """
+    Builds a response that matches the requested JSON schema, filling every field
+    with a placeholder, so the local batch service needs no model.
+    """
+    schema = body['response_format']['json_schema']['schema']
+    content = {}
+    for name, field_schema in schema.get('properties', {}).items():
+        if name == 'latex_code':
+            content[name] = '\\documentclass{article}\n\\begin{document}\nPlaceholder document.\n\\end{document}'
+        elif field_schema.get('type') == 'string':
+            content[name] = f"<{name}>"
+        elif field_schema.get('type') == 'array':
+            content[name] = []
+        elif field_schema.get('type') == 'integer':
+            content[name] = 0
+        else:
+            content[name] = None
+    return json.dumps(content)
+
+
+class LocalBatchBackend:
+    """
+    A file-based stand-in for the OpenAI Batch API, for development and tests.
+
+    Each batch is a directory under settings.OPENAI_BATCH_LOCAL_DIR holding the
+    submitted input.jsonl. The batch completes on its first poll: output.jsonl is
+    written with a placeholder_completion for every request, unless an
+    output.jsonl was put there before (e.g. a recorded response).
+    """
+
+    def __init__(self, directory=None, responder=placeholder_completion):
+        self.directory = str(directory or settings.OPENAI_BATCH_LOCAL_DIR)
+        self.responder = responder
+
+    def submit(self, name, requests_jsonl):
+        remote_batch_id = f"batch_local_{uuid.uuid4().hex}"
+        batch_dir = os.path.join(self.directory, remote_batch_id)
+        os.makedirs(batch_dir)
+        with open(os.path.join(batch_dir, 'input.jsonl'), 'w', encoding='utf-8') as input_file:
+            input_file.write(requests_jsonl)
+        return remote_batch_id
+
+    def retrieve(self, remote_batch_id):
+        batch_dir = os.path.join(self.directory, remote_batch_id)
+        if not os.path.isdir(batch_dir):
+            raise BatchServiceError(f"Unknown batch: {remote_batch_id}")
+        output_path = os.path.join(batch_dir, 'output.jsonl')
+        if not os.path.exists(output_path):
+            with open(os.path.join(batch_dir, 'input.jsonl'), encoding='utf-8') as input_file:
+                lines = [json.loads(line) for line in input_file if line.strip()]
+            with open(output_path, 'w', encoding='utf-8') as output_file:
+                for request in lines:
+                    content = self.responder(request['body'])
+                    # Same estimate as core.ratelimit: about four characters per token
+                    prompt_tokens = estimate_tokens(request['body']['messages'], 0)
+                    output_file.write(json.dumps({
+                        'id': f"batch_req_{uuid.uuid4().hex}",
+                        'custom_id': request['custom_id'],
+                        'response': {
+                            'status_code': 200,
+                            'body': {
+                                'model': request['body']['model'],
+                                'choices': [{'message': {'role': 'assistant', 'content': content}}],
+                                'usage': {
+                                    'prompt_tokens': prompt_tokens,
+                                    'completion_tokens': len(content) // 4,
+                                    'total_tokens': prompt_tokens + len(content) // 4,
+                                },
+                            },
+                        },
+                        'error': None,
+                    }) + '\n')
+        with open(output_path, encoding='utf-8') as output_file:
+            return 'completed', output_file.read()
+
+
+def get_batch_backend():
+    """
+    Returns an instance of the settings.OPENAI_BATCH_BACKEND class.
+    """
+    return import_string(settings.OPENAI_BATCH_BACKEND)()
+
+
+def _strict_json_schema(schema, root):
+    """
+    Rewrites a JSON schema in place into the subset accepted by structured outputs in
+    strict mode: closed objects with every property required, no None defaults, and
+    $refs with sibling keys inlined.
+    """
+    for defs_key in ('$defs', 'definitions'):
+        for definition in (schema.get(defs_key) or {}).values():
+            _strict_json_schema(definition, root)
+
+    if schema.get('type') == 'object':
+        schema.setdefault('additionalProperties', False)
+    properties = schema.get('properties')
+    if isinstance(properties, dict):
+        schema['required'] = list(properties)
+        for property_schema in properties.values():
+            _strict_json_schema(property_schema, root)
+    if isinstance(schema.get('items'), dict):
+        _strict_json_schema(schema['items'], root)
+    for variant in schema.get('anyOf') or []:
+        _strict_json_schema(variant, root)
+    all_of = schema.get('allOf')
+    if isinstance(all_of, list):
+        for entry in all_of:
+            _strict_json_schema(entry, root)
+        if len(all_of) == 1:
+            schema.update(schema.pop('allOf')[0])
+
+    if 'default' in schema and schema['default'] is None:
+        del schema['default']
+
+    ref = schema.get('$ref')
+    if ref and len(schema) > 1:
+        resolved = root
+        for key in ref[len('#/'):].split('/'):
+            resolved = resolved[key]
+        # The keys next to the $ref take priority over the referenced schema's
+        schema.update({**resolved, **schema})
+        del schema['$ref']
+    return schema
+
+
+def response_format_param(response_format):
+    """
+    Builds the 'response_format' of a chat completion request body for a Pydantic model,
+    as the SDK's parse() sends it: a strict JSON schema named after the model.
+    """
+    schema = response_format.model_json_schema()
+    return {
+        'type': 'json_schema',
+        'json_schema': {
+            'name': response_format.__name__,
+            'schema': _strict_json_schema(schema, schema),
+            'strict': True,
+        },
+    }
+
+
+def _batch_request(custom_id, request_kwargs):
+    body = {
+        'model': request_kwargs['model'],
+        'messages': request_kwargs['messages'],
+        'response_format': response_format_param(request_kwargs['response_format']),
+        'max_tokens': request_kwargs['max_tokens'],
+        'temperature': request_kwargs['temperature'],
+    }
+    return json.dumps({'custom_id': custom_id, 'method': 'POST', 'url': '/v1/chat/completions', 'body': body})
+
+
+def build_batch_requests(batch):
+    """
+    Serializes the queued jobs of a batch into Batch API requests: one per document,
+    plus one job details extraction per job outside Fast Mode.
+
+    Returns:
+        str: The requests as JSONL, with custom IDs 'job-<id>-<type>'.
+    """
+    lines = []
+    for job in batch.jobs.filter(status=GenerationJob.STATUS_QUEUED).order_by('id'):
+        if not job.fast_mode:
+            lines.append(_batch_request(f"job-{job.id}-details", job_details_request(job.job_description)))
+        for gen_type in job.generation_types:
+            request_kwargs = document_request(job.job_description, gen_type, batch.user_info, job.fast_mode)
+            lines.append(_batch_request(f"job-{job.id}-{gen_type}", request_kwargs))
+    return ''.join(line + '\n' for line in lines)
+
+
+def estimate_batch_tokens(requests_jsonl):
+    """
+    Estimates the tokens of the requests of a batch, as core.ratelimit.estimate_tokens does.
+    """
+    tokens = 0
+    for line in requests_jsonl.splitlines():
+        body = json.loads(line)['body']
+        tokens += estimate_tokens(body['messages'], body['max_tokens'])
+    return tokens
+
+
+def submit_batch(batch, backend=None):
+    """
+    Submits the queued jobs of an API-mode batch to the batch service and marks them running.
+
+    Returns:
+        GenerationBatch: The batch, with its remote ID recorded.
+
+    Raises:
+        TokenBudgetExceeded: If the estimated tokens of the batch do not fit in what is
+            left of the user's daily token budget (the batch stays pending).
+    """
+    backend = backend or get_batch_backend()
+    requests_jsonl = build_batch_requests(batch)
+    check_token_budget(batch.user, estimate_batch_tokens(requests_jsonl))
+    remote_batch_id = backend.submit(f"generation-batch-{batch.id}.jsonl", requests_jsonl)
+
+    now = timezone.now()
+    with transaction.atomic():
+        batch.remote_batch_id = remote_batch_id
+        batch.remote_status = 'validating'
+        batch.submitted_at = now
+        batch.save(update_fields=['remote_batch_id', 'remote_status', 'submitted_at'])
+        batch.jobs.filter(status=GenerationJob.STATUS_QUEUED).update(status=GenerationJob.STATUS_RUNNING, started_at=now)
+    logger.info(f"Submitted generation batch {batch.id} as {remote_batch_id} ({requests_jsonl.count(chr(10))} request(s)).")
+    return batch
+
+
+def _parse_results(output_jsonl):
+    """
+    Maps each custom ID to its response content, or to an Exception for failed requests.
+
+    Returns:
+        tuple: (results, usages), usages mapping the custom ID of each request billed
+        to the (model, usage) of its response body.
+    """
+    results = {}
+    usages = {}
+    for line in output_jsonl.splitlines():
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        response = item.get('response') or {}
+        body = response.get('body') or {}
+        if body.get('usage'):
+            usages[item['custom_id']] = (body.get('model', ''), body['usage'])
+        if item.get('error') or response.get('status_code') != 200:
+            error = item.get('error') or body.get('error') or f"status {response.get('status_code')}"
+            results[item['custom_id']] = Exception(f"Batch request failed: {error}")
+        else:
+            results[item['custom_id']] = body['choices'][0]['message']['content']
+    return results, usages
+
+
+def _usage_records(usages, custom_id, response_format):
+    """
+    Returns the usage records of a batch request, for save_usage (none if it was not billed).
+    """
+    if custom_id not in usages:
+        return []
+    model, usage = usages[custom_id]
+    return [batch_usage_record(response_format, model, usage)]
+
+
+def _parsed_result(results, custom_id, response_format):
+    result = results.get(custom_id)
+    if result is None:
+        raise Exception("No result returned by the batch service.")
+    if isinstance(result, Exception):
+        raise result
+    return response_format.model_validate_json(result)
+
+
+def ingest_batch_results(batch, output_jsonl):
+    """
+    Stores the documents of a completed batch as Generation rows and finishes its jobs.
+
+    Jobs end up like jobs run by a worker: done with their result when at least one
+    document was generated, failed otherwise. The usage of each request is stored
+    like that of a direct call, at the batch price; the job details request is counted
+    with the first document of its job.
+
+    Each job is stored in one transaction, with its row locked, and skipped once it is
+    no longer running: a poll that crashed partway through is resumed without storing
+    any job's documents twice.
+    """
+    results, usages = _parse_results(output_jsonl)
+    job_ids = batch.jobs.filter(status=GenerationJob.STATUS_RUNNING).order_by('id').values_list('id', flat=True)
+    for job_id in job_ids:
+        with transaction.atomic():
+            job = (
+                GenerationJob.objects.select_for_update()
+                .filter(id=job_id, status=GenerationJob.STATUS_RUNNING)
+                .select_related('user')
+                .first()
+            )
+            if job is None:
+                # Ingested by a concurrent poll
+                continue
+            _ingest_job(batch, job, results, usages)
+
+
+def _ingest_job(batch, job, results, usages):
+    generated_docs = []
+    errors = []
+    job_details_usage = _usage_records(usages, f"job-{job.id}-details", JobDetails)
+    for gen_type in job.generation_types:
+        response_format = document_response_format(gen_type, job.fast_mode)
+        usage_records = _usage_records(usages, f"job-{job.id}-{gen_type}", response_format)
+        try:
+            response = _parsed_result(results, f"job-{job.id}-{gen_type}", response_format)
+            latex_output, job_details = document_output(gen_type, response, batch.user_info)
+            if not job.fast_mode:
+                job_details = _parsed_result(results, f"job-{job.id}-details", JobDetails)
+                usage_records = usage_records + job_details_usage
+                job_details_usage.clear()
+            generated_docs.append(save_document(
+                job.user, job.job_description, gen_type, job_details, latex_output, batch.user_info,
+                usage_records,
+            ))
+        except Exception as e:
+            logger.error(f"Error generating {gen_type} for job {job.id}: {e}")
+            errors.append({
+                'type': gen_type.replace('_', ' ').title(),
+                'error': f"Error generating {gen_type}: {e}",
+            })
+            save_usage(job.user, usage_records)
+    save_usage(job.user, job_details_usage)
+
+    job.result = {'documents': generated_docs, 'errors': errors, 'batch_api': True}
+    if generated_docs:
+        job.status = GenerationJob.STATUS_DONE
+    else:
+        job.status = GenerationJob.STATUS_FAILED
+        job.error = "; ".join(error['error'] for error in errors)
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'result', 'error', 'finished_at'])
+
+
+def poll_batch(batch, backend=None):
+    """
+    Updates a submitted batch from the batch service, ingesting its results once it is completed.
+
+    Returns:
+        str: The batch service status.
+    """
+    backend = backend or get_batch_backend()
+    status, output_jsonl = backend.retrieve(batch.remote_batch_id)
+    if status == 'completed':
+        ingest_batch_results(batch, output_jsonl or '')
+    elif status in FINAL_STATUSES:
+        batch.jobs.filter(status=GenerationJob.STATUS_RUNNING).update(
+            status=GenerationJob.STATUS_FAILED,
+            error=f"The batch service reported the batch as {status}.",
+            finished_at=timezone.now(),
+        )
+    batch.remote_status = status
+    batch.save(update_fields=['remote_status'])
+    logger.info(f"Generation batch {batch.id} ({batch.remote_batch_id}): {status}.")
+    return status
+
+
+def pending_batches():
+    """
+    Returns the API-mode batches that still need to be submitted, and those waiting for results.
+    """
+    api_batches = GenerationBatch.objects.filter(use_batch_api=True)
+    return (
+        api_batches.filter(remote_batch_id=''),
+        api_batches.exclude(remote_batch_id='').exclude(remote_status__in=FINAL_STATUSES),
+    )
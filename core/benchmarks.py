@@ -0,0 +1,565 @@
+# core/benchmarks.py
+
+import json
+import logging
+import os
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connection
+from django.utils.module_loading import import_string
+
+from . import generation, llm
+from .bulk import create_generation_batch, run_batch
+from .generation import run_generation
+from .latex import LatexCompilationError, PdflatexBackend, prepare_latex_source
+from .llm_stub import StubLLMServer
+from .models import Education, Experience, GenerationJob
+from .pdf_cache import PDFCache
+from .ratelimit import limiter
+from .rendering import render_cv
+from .templates import cv_template, cover_letter_template
+from .tokens import SAMPLE_JOB_DESCRIPTION
+from .utils import CVContent, ExperienceBullets, FlexibleItem
+
+logger = logging.getLogger(__name__)
+
+# Sets up Django and loads everything a web or worker process loads at boot
+STARTUP_SCRIPT = (
+    "import django\n"
+    "django.setup()\n"
+    "from django.urls import get_resolver\n"
+    "get_resolver().url_patterns\n"
+    "import core.jobs\n"
+)
+
+# Modules that should only be imported once an LLM call is made
+LAZY_MODULES = ('openai', 'httpx')
+
+_importtime_re = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$')
+
+
+def parse_importtime(output):
+    """
+    Parses the report written to stderr by `python -X importtime`.
+
+    Args:
+        output (str): The stderr of the process.
+
+    Returns:
+        tuple: (total_ms, modules), where total_ms is the cumulative import time of
+        all top-level imports and modules maps each module name to its cumulative
+        import time in milliseconds.
+    """
+    total_us = 0
+    modules = {}
+    for line in output.splitlines():
+        match = _importtime_re.match(line)
+        if not match:
+            continue
+        _, cumulative, indent, name = match.groups()
+        cumulative = int(cumulative)
+        modules[name] = cumulative / 1000
+        # Nested imports are indented by two spaces per level, after the separator's space
+        if len(indent) == 1:
+            total_us += cumulative
+    return total_us / 1000, modules
+
+
+def measure_startup(runs=5, script=STARTUP_SCRIPT):
+    """
+    Measures the import time of a Django process boot, in fresh interpreters.
+
+    Args:
+        runs (int): The number of interpreters started; the median run is reported.
+        script (str): The Python code run by each interpreter.
+
+    Returns:
+        dict: 'total_ms' (median total import time), 'runs_ms' (the total of every
+        run) and 'modules' (cumulative import time of each module in the median run).
+
+    Raises:
+        RuntimeError: If the script fails.
+    """
+    results = []
+    for _ in range(runs):
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', script],
+            capture_output=True,
+            text=True,
+        )
+        if process.returncode != 0:
+            raise RuntimeError(f"The startup script failed:\n{process.stderr[-2000:]}")
+        results.append(parse_importtime(process.stderr))
+
+    results.sort(key=lambda result: result[0])
+    total_ms, modules = results[len(results) // 2]
+    return {
+        'total_ms': total_ms,
+        'runs_ms': [result[0] for result in results],
+        'modules': modules,
+    }
+
+
+# Generation pipeline benchmarks (see the benchmark_generation command)
+
+SCENARIOS = ('single', 'concurrent', 'bulk')
+
+BENCHMARK_USER_PREFIX = 'benchmark-user-'
+
+
+def percentile(values, pct):
+    """
+    Returns the pct-th percentile of values, interpolating between the closest ranks.
+    """
+    if not values:
+        return 0.0
+    values = sorted(values)
+    rank = (len(values) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (rank - lower)
+
+
+def summarize_latencies(latencies_ms, wall_seconds, workers, errors=0):
+    """
+    Summarizes the request latencies of a load scenario.
+
+    Args:
+        latencies_ms (list): The latency of every completed request, in milliseconds.
+        wall_seconds (float): The wall time of the whole scenario.
+        workers (int): The requests the scenario could run at once.
+        errors (int): The requests that failed.
+
+    Returns:
+        dict: 'requests', 'errors', the 'p50_ms', 'p95_ms', 'p99_ms' and 'max_ms'
+        latencies, 'requests_per_second', and 'worker_utilization' (the share of the
+        workers' time spent on requests, from 0 to 1).
+    """
+    busy_seconds = sum(latencies_ms) / 1000
+    return {
+        'requests': len(latencies_ms),
+        'errors': errors,
+        'p50_ms': percentile(latencies_ms, 50),
+        'p95_ms': percentile(latencies_ms, 95),
+        'p99_ms': percentile(latencies_ms, 99),
+        'max_ms': max(latencies_ms, default=0.0),
+        'wall_seconds': wall_seconds,
+        'requests_per_second': len(latencies_ms) / wall_seconds if wall_seconds else 0.0,
+        'worker_utilization': min(1.0, busy_seconds / (wall_seconds * workers)) if wall_seconds else 0.0,
+    }
+
+
+@contextmanager
+def stub_llm(latency=0.5, tokens_per_second=80.0, requests_per_minute=None, tokens_per_minute=None):
+    """
+    Runs the block against a local StubLLMServer instead of the OpenAI API.
+
+    The shared OpenAI clients are rebuilt for the stub's URL, and the LLM response
+    cache is disabled so every request reaches it. requests_per_minute and
+    tokens_per_minute replace the rate limiter budgets for the block (0 disables a
+    budget); the configured budgets apply when they are None.
+
+    Yields:
+        StubLLMServer: The running server.
+    """
+    from django.test import override_settings
+
+    with StubLLMServer(latency=latency, tokens_per_second=tokens_per_second) as stub:
+        budgets = (limiter.requests_per_minute, limiter.tokens_per_minute)
+        if requests_per_minute is not None:
+            limiter.requests_per_minute = requests_per_minute
+        if tokens_per_minute is not None:
+            limiter.tokens_per_minute = tokens_per_minute
+        llm._clients.clear()
+        try:
+            with override_settings(OPENAI_BASE_URL=stub.base_url, LLM_RESPONSE_CACHE_ENABLED=False):
+                yield stub
+        finally:
+            llm._clients.clear()
+            limiter.requests_per_minute, limiter.tokens_per_minute = budgets
+
+
+def create_benchmark_users(count):
+    """
+    Creates users with a filled-in profile for a load scenario.
+
+    Returns:
+        list: The users, named BENCHMARK_USER_PREFIX followed by a number.
+    """
+    users = []
+    for number in range(count):
+        user = User.objects.create_user(f"{BENCHMARK_USER_PREFIX}{number}", f"benchmark{number}@example.com")
+        profile = user.userprofile
+        profile.name = f"Benchmark User {number}"
+        profile.phone = '+1 555 0100'
+        profile.skills = 'SQL, Python, Tableau, A/B testing'
+        profile.projects = 'Churn model; Sales dashboard'
+        profile.save()
+        Education.objects.create(
+            profile=profile, education_level='MSc', university='New York University',
+            specialization='Data Science', start_date=date(2019, 9, 1), end_date=date(2021, 5, 31),
+        )
+        Experience.objects.create(
+            profile=profile, company='XYZ Corporation', title='Data Analyst', start_date=date(2021, 6, 1),
+            description='Built dashboards for the sales team\nRan A/B tests on the onboarding flow',
+        )
+        users.append(user)
+    return users
+
+
+@contextmanager
+def throwaway_database():
+    """
+    Runs the block against a new, migrated database, destroyed afterwards, so the
+    benchmark users and their documents never reach the configured one.
+
+    The database is the test database of the default connection (see
+    settings.DATABASES), so the database user needs the right to create it. For
+    SQLite it is a temporary file rather than the in-memory default, which the
+    worker threads of the concurrent and bulk scenarios could not write to at once.
+    """
+    from django.test.utils import setup_databases, teardown_databases
+
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    test_name = test_settings.get('NAME')
+    with tempfile.TemporaryDirectory() as directory:
+        if connection.vendor == 'sqlite' and not test_name:
+            test_settings['NAME'] = os.path.join(directory, 'benchmark.sqlite3')
+        try:
+            old_config = setup_databases(verbosity=0, interactive=False, aliases={DEFAULT_DB_ALIAS})
+            try:
+                yield
+            finally:
+                teardown_databases(old_config, verbosity=0)
+        finally:
+            test_settings['NAME'] = test_name
+
+
+def benchmark_job_descriptions(count):
+    """
+    Returns count distinct postings, also distinct from those of earlier runs, so no
+    request is answered from the job details or LLM response caches.
+    """
+    run_id = uuid.uuid4().hex[:8]
+    return [f"{SAMPLE_JOB_DESCRIPTION}\nReference: BENCH-{run_id}-{number}\n" for number in range(count)]
+
+
+def _timed_generation(user, job_description, generation_types, fast_mode):
+    start = time.perf_counter()
+    try:
+        result = run_generation(user, job_description, generation_types, bypass_cache=True, fast_mode=fast_mode)
+        failed = bool(result['errors'])
+    except Exception as e:
+        logger.error(f"Benchmark generation failed: {e}")
+        failed = True
+    return (time.perf_counter() - start) * 1000, failed
+
+
+def _threaded_generation(*args):
+    try:
+        return _timed_generation(*args)
+    finally:
+        # Each thread has its own database connection
+        connection.close()
+
+
+def run_load_scenario(scenario, requests=10, users=50, concurrency=None, generation_types=('cv', 'cover_letter'),
+                      fast_mode=False):
+    """
+    Runs a load scenario against the generation pipeline and measures it. Point the
+    pipeline at a stub first (see stub_llm) to run it offline.
+
+    The scenario creates its users and documents in the current database; run it in a
+    throwaway_database (or a test) to leave the configured one untouched. PDFs are not
+    compiled, so the latencies are those of the LLM calls and the database; the
+    benchmark_latex command measures compilation.
+
+    Scenarios:
+        single: one user generating `requests` times in a row.
+        concurrent: `users` users generating once each, all at the same time (as web
+            requests on a threaded server).
+        bulk: one user's batch of `requests` postings, run by run_batch with
+            `concurrency` worker threads.
+
+    Returns:
+        dict: The summarize_latencies of the scenario, plus its 'scenario' name. For
+        bulk, latencies are the run time of each job, and 'queue_p50_ms' is the median
+        time jobs waited for a worker.
+    """
+    if scenario not in SCENARIOS:
+        raise ValueError(f"Unknown scenario {scenario!r}; expected one of {', '.join(SCENARIOS)}.")
+    with mock.patch.object(generation, 'create_pdf_artifact', lambda document: None):
+        return _run_load_scenario(scenario, requests, users, concurrency, list(generation_types), fast_mode)
+
+
+def _run_load_scenario(scenario, requests, users, concurrency, generation_types, fast_mode):
+    latencies_ms = []
+    errors = 0
+    extra = {}
+
+    if scenario == 'single':
+        user = create_benchmark_users(1)[0]
+        workers = 1
+        start = time.perf_counter()
+        for job_description in benchmark_job_descriptions(requests):
+            latency_ms, failed = _timed_generation(user, job_description, generation_types, fast_mode)
+            latencies_ms.append(latency_ms)
+            errors += failed
+    elif scenario == 'concurrent':
+        workers = users
+        benchmark_users = create_benchmark_users(users)
+        job_descriptions = benchmark_job_descriptions(users)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=users, thread_name_prefix='benchmark') as executor:
+            futures = [
+                executor.submit(_threaded_generation, user, job_description, generation_types, fast_mode)
+                for user, job_description in zip(benchmark_users, job_descriptions)
+            ]
+            for future in futures:
+                latency_ms, failed = future.result()
+                latencies_ms.append(latency_ms)
+                errors += failed
+    else:
+        user = create_benchmark_users(1)[0]
+        batch = create_generation_batch(
+            user,
+            benchmark_job_descriptions(requests),
+            generate_cv='cv' in generation_types,
+            generate_cover_letter='cover_letter' in generation_types,
+            fast_mode=fast_mode,
+            concurrency=concurrency,
+        )
+        workers = batch.concurrency
+        start = time.perf_counter()
+        run_batch(batch)
+        queue_ms = []
+        for job in batch.jobs.all():
+            if job.started_at and job.finished_at:
+                latencies_ms.append((job.finished_at - job.started_at).total_seconds() * 1000)
+                queue_ms.append((job.started_at - job.created_at).total_seconds() * 1000)
+            errors += job.status != GenerationJob.STATUS_DONE
+        extra['queue_p50_ms'] = percentile(queue_ms, 50)
+
+    wall_seconds = time.perf_counter() - start
+    result = summarize_latencies(latencies_ms, wall_seconds, workers, errors)
+    result.update(extra, scenario=scenario)
+    logger.info(f"Benchmark scenario {scenario}: {result}")
+    return result
+
+
+# LaTeX compilation benchmarks (see the benchmark_latex command)
+
+# How documents are compiled: straight pdflatex, pdflatex with the precompiled
+# template formats, and a hit in the PDF cache. A dotted path to a
+# core.latex.LatexBackend class is also accepted as a mode.
+COMPILE_MODES = ('pdflatex', 'pdflatex-formats', 'pdf-cache')
+
+# Experience entries of the synthetic CVs in the corpus
+SYNTHETIC_CV_SIZES = (10, 40)
+
+# Time differences below this are noise, never regressions
+COMPILE_NOISE_FLOOR_MS = 20.0
+
+_compile_script = (
+    "import django, json, sys\n"
+    "django.setup()\n"
+    "from core.benchmarks import compile_runs\n"
+    "print('BENCHMARK_RESULT ' + json.dumps(compile_runs(sys.argv[1], sys.argv[2], int(sys.argv[3]))))\n"
+)
+
+
+def synthetic_cv(entries):
+    """
+    Renders a long CV with the given number of experience entries, as generated by
+    the local rendering pipeline.
+    """
+    user_info = {
+        'name': 'Benchmark User',
+        'email': 'benchmark@example.com',
+        'phone': '+1 555 0100',
+        'education': [
+            {'education_level': 'MSc', 'university': 'New York University', 'specialization': 'Data Science',
+             'start_date': 'Sep 2019', 'end_date': 'May 2021', 'relevant_subjects': 'Statistics, Machine Learning'},
+        ],
+        'experience': [
+            {'company': f"Company {number}", 'city': 'New York', 'title': 'Data Analyst',
+             'start_date': 'Jan 2020', 'end_date': 'Dec 2020', 'description': []}
+            for number in range(entries)
+        ],
+        'skills': ['SQL', 'Python', 'Tableau', 'A/B testing', 'Statistics'],
+    }
+    content = CVContent(
+        summary="Data analyst with experience turning customer data into decisions. " * 3,
+        experience=[
+            ExperienceBullets(index=number, bullets=[
+                f"Built dashboards used by {10 + number} stakeholders, cutting weekly reporting time by 60%.",
+                "Designed and analyzed A/B tests on onboarding flows, lifting activation by 8%.",
+                "Automated data quality checks on the SQL pipelines feeding the finance reports.",
+            ])
+            for number in range(entries)
+        ],
+        flexible_title='Projects',
+        flexible_items=[FlexibleItem(label='Churn Model', content="Predicted customer churn with gradient boosting.")],
+    )
+    return render_cv(user_info, content)
+
+
+def compile_corpus():
+    """
+    Returns the documents of the compilation benchmark: the bundled templates, the
+    example CV of the repository and synthetic long CVs.
+
+    Returns:
+        dict: The cleaned LaTeX source of each document, by name.
+    """
+    corpus = {
+        'cv_template': cv_template,
+        'cover_letter_template': cover_letter_template,
+    }
+    example_path = os.path.join(settings.BASE_DIR, 'Mario_Diez_Martinez_CV.tex')
+    if os.path.exists(example_path):
+        with open(example_path, encoding='utf-8') as example_file:
+            corpus['example_cv'] = example_file.read()
+    for entries in SYNTHETIC_CV_SIZES:
+        corpus[f"synthetic_cv_{entries}"] = synthetic_cv(entries)
+    return {name: prepare_latex_source(latex_code) for name, latex_code in corpus.items()}
+
+
+def _compile_function(mode, cache_dir):
+    """
+    Returns the function compiling a document in the given mode, and the function
+    preparing it before the timed runs.
+    """
+    if mode == 'pdflatex':
+        backend = PdflatexBackend(preload_formats=False)
+        return backend.compile, lambda latex_code: None
+    if mode == 'pdflatex-formats':
+        backend = PdflatexBackend(preload_formats=True)
+        return backend.compile, lambda latex_code: backend.warm()
+    if mode == 'pdf-cache':
+        cache = PDFCache(cache_dir, max_bytes=100 * 1024 * 1024)
+        backend = PdflatexBackend()
+
+        def compile_cached(latex_code):
+            return cache.get_or_compile(latex_code, lambda source: backend.compile(source).pdf)
+        # Compiled once beforehand, so the timed runs are cache hits
+        return compile_cached, compile_cached
+    backend = import_string(mode)()
+    return backend.compile, lambda latex_code: backend.warm()
+
+
+def _cpu_seconds():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def compile_runs(document, mode, runs):
+    """
+    Compiles one document of the corpus `runs` times in one mode, in this process.
+
+    Run by measure_compile in a fresh interpreter per document and mode, so the peak
+    RSS of the TeX processes is that of this document alone.
+
+    Returns:
+        dict: The median 'wall_ms' and 'cpu_ms' (this process and its children),
+        'peak_rss_kb' (of the TeX processes; 0 when none ran) and 'pdf_bytes', or
+        'error' if the document could not be compiled.
+    """
+    latex_code = compile_corpus()[document]
+    with tempfile.TemporaryDirectory() as cache_dir:
+        try:
+            compile_func, prepare = _compile_function(mode, cache_dir)
+            prepare(latex_code)
+            wall_ms, cpu_ms = [], []
+            for _ in range(runs):
+                wall_start, cpu_start = time.perf_counter(), _cpu_seconds()
+                result = compile_func(latex_code)
+                wall_ms.append((time.perf_counter() - wall_start) * 1000)
+                cpu_ms.append((_cpu_seconds() - cpu_start) * 1000)
+        except LatexCompilationError as e:
+            return {'error': str(e)}
+
+    pdf = result if isinstance(result, bytes) else result.pdf
+    peak_rss_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    if sys.platform == 'darwin':
+        peak_rss_kb //= 1024  # Reported in bytes on macOS
+    return {
+        'wall_ms': percentile(wall_ms, 50),
+        'cpu_ms': percentile(cpu_ms, 50),
+        'peak_rss_kb': peak_rss_kb,
+        'pdf_bytes': len(pdf),
+    }
+
+
+def measure_compile(documents=None, modes=COMPILE_MODES, runs=3):
+    """
+    Measures the compilation of the corpus documents in each mode, each pair in a
+    fresh interpreter.
+
+    Args:
+        documents (list): Names of corpus documents; all of them by default.
+        modes (list): Entries of COMPILE_MODES or LatexBackend class paths.
+        runs (int): Timed compilations per document and mode; the median is reported.
+
+    Returns:
+        dict: The compile_runs result of each "document/mode".
+
+    Raises:
+        RuntimeError: If a measuring interpreter fails.
+    """
+    results = {}
+    for document in documents or list(compile_corpus()):
+        for mode in modes:
+            process = subprocess.run(
+                [sys.executable, '-c', _compile_script, document, mode, str(runs)],
+                capture_output=True,
+                text=True,
+            )
+            lines = [line for line in process.stdout.splitlines() if line.startswith('BENCHMARK_RESULT ')]
+            if process.returncode != 0 or not lines:
+                raise RuntimeError(f"Measuring {document} ({mode}) failed:\n{process.stderr[-2000:]}")
+            results[f"{document}/{mode}"] = json.loads(lines[-1][len('BENCHMARK_RESULT '):])
+    return results
+
+
+def compare_to_baseline(results, baseline, threshold=0.2):
+    """
+    Lists the regressions of compilation results against a baseline.
+
+    A metric regresses when it grows by more than `threshold` (a fraction) over its
+    baseline value; times must also grow by more than COMPILE_NOISE_FLOOR_MS. A
+    document that compiled in the baseline and now fails is a regression too.
+    Entries missing from the baseline are not compared.
+
+    Returns:
+        list: A message per regression.
+    """
+    regressions = []
+    for key, result in results.items():
+        expected = baseline.get(key)
+        if not expected or 'error' in expected:
+            continue
+        if 'error' in result:
+            regressions.append(f"{key}: compiled in the baseline, now fails: {result['error']}")
+            continue
+        for metric in ('wall_ms', 'cpu_ms', 'peak_rss_kb', 'pdf_bytes'):
+            before, after = expected.get(metric), result[metric]
+            if not before or after <= before * (1 + threshold):
+                continue
+            if metric.endswith('_ms') and after - before <= COMPILE_NOISE_FLOOR_MS:
+                continue
+            regressions.append(f"{key}: {metric} {after:.0f} vs {before:.0f} in the baseline (+{after / before - 1:.0%})")
+    return regressions
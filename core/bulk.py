@@ -0,0 +1,227 @@
+# core/bulk.py
+
+import csv
+import io
+import json
+import logging
+import re
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import Generation, GenerationBatch, GenerationJob
+from .generation import build_user_info, document_filename
+from .jobs import claim_next_job, run_job
+
+logger = logging.getLogger(__name__)
+
+INPUT_FORMATS = ('text', 'csv', 'jsonl')
+
+# In plain text input, postings are separated by a line of three or more dashes
+_text_separator_re = re.compile(r'^\s*-{3,}\s*$', re.MULTILINE)
+
+
+class BulkInputError(ValueError):
+    """
+    Raised when a list of job descriptions cannot be parsed.
+    """
+
+
+def detect_input_format(filename):
+    """
+    Guesses the input format from a file name: 'csv', 'jsonl' or 'text'.
+    """
+    filename = (filename or '').lower()
+    if filename.endswith('.csv'):
+        return 'csv'
+    if filename.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return 'text'
+
+
+def parse_job_descriptions(content, input_format='text'):
+    """
+    Parses a list of job descriptions.
+
+    Formats:
+    - 'text': postings separated by a line of dashes ('---').
+    - 'csv': a 'job_description' column, or the first column if there is none.
+    - 'jsonl': one JSON object with a 'job_description' key, or one JSON string, per line.
+
+    Args:
+        content (str): The raw input.
+        input_format (str): One of INPUT_FORMATS.
+
+    Returns:
+        list: The non-empty job descriptions, in input order.
+
+    Raises:
+        BulkInputError: If the input is malformed.
+    """
+    if input_format == 'text':
+        descriptions = _text_separator_re.split(content)
+    elif input_format == 'csv':
+        reader = csv.reader(io.StringIO(content))
+        rows = [row for row in reader if any(cell.strip() for cell in row)]
+        if not rows:
+            return []
+        header = [cell.strip().lower() for cell in rows[0]]
+        if 'job_description' in header:
+            column = header.index('job_description')
+            rows = rows[1:]
+        else:
+            column = 0
+        descriptions = [row[column] if column < len(row) else '' for row in rows]
+    elif input_format == 'jsonl':
+        descriptions = []
+        for line_number, line in enumerate(content.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise BulkInputError(f"Line {line_number} is not valid JSON: {e}") from e
+            if isinstance(item, dict):
+                item = item.get('job_description', '')
+            if not isinstance(item, str):
+                raise BulkInputError(f"Line {line_number} has no job description.")
+            descriptions.append(item)
+    else:
+        raise BulkInputError(f"Unknown input format: {input_format}")
+
+    return [description.strip() for description in descriptions if description.strip()]
+
+
+def create_generation_batch(user, job_descriptions, generate_cv=True, generate_cover_letter=True, fast_mode=False,
+                            concurrency=None, use_batch_api=False):
+    """
+    Queues one generation job per job description, as a batch.
+
+    The user's profile is formatted once and stored on the batch, so every job
+    reuses the same prompt payload.
+
+    Args:
+        user (User): The user the documents are generated for.
+        job_descriptions (list): The job descriptions.
+        generate_cv (bool): Generate a CV for each posting.
+        generate_cover_letter (bool): Generate a cover letter for each posting.
+        fast_mode (bool): Use the low-latency pipeline.
+        concurrency (int): Maximum jobs of the batch running at once; defaults to
+            settings.BULK_GENERATION_CONCURRENCY.
+        use_batch_api (bool): Leave the jobs to core.batch_api instead of the workers.
+
+    Returns:
+        GenerationBatch: The batch, with its jobs queued.
+    """
+    with transaction.atomic():
+        batch = GenerationBatch.objects.create(
+            user=user,
+            user_info=build_user_info(user),
+            concurrency=concurrency or settings.BULK_GENERATION_CONCURRENCY,
+            use_batch_api=use_batch_api,
+        )
+        GenerationJob.objects.bulk_create([
+            GenerationJob(
+                user=user,
+                batch=batch,
+                job_description=job_description,
+                generate_cv=generate_cv,
+                generate_cover_letter=generate_cover_letter,
+                fast_mode=fast_mode,
+            )
+            for job_description in job_descriptions
+        ])
+    logger.info(f"Queued generation batch {batch.id} with {len(job_descriptions)} job(s) for {user.username}.")
+    return batch
+
+
+def batch_progress(batch):
+    """
+    Counts the jobs of a batch per status.
+
+    Returns:
+        dict: 'total', one count per status, and 'finished' (True once no job is queued or running).
+    """
+    progress = {status: 0 for status, _ in GenerationJob.STATUS_CHOICES}
+    for status in batch.jobs.values_list('status', flat=True):
+        progress[status] += 1
+    progress['total'] = sum(progress.values())
+    progress['finished'] = not (progress[GenerationJob.STATUS_QUEUED] or progress[GenerationJob.STATUS_RUNNING])
+    return progress
+
+
+def batch_generations(batch):
+    """
+    Returns the (job, generation) pairs of every document generated by a batch.
+    """
+    jobs = list(batch.jobs.filter(status=GenerationJob.STATUS_DONE).order_by('id'))
+    generation_ids = [
+        document['generation_id']
+        for job in jobs
+        for document in (job.result or {}).get('documents', [])
+        if 'generation_id' in document
+    ]
+    generations = Generation.objects.select_related('artifact', 'user__userprofile').in_bulk(generation_ids)
+    pairs = []
+    for job in jobs:
+        for document in (job.result or {}).get('documents', []):
+            generation = generations.get(document.get('generation_id'))
+            if generation is not None:
+                pairs.append((job, generation))
+    return pairs
+
+
+def write_batch_zip(batch, fileobj):
+    """
+    Writes the compiled PDFs of a batch into a ZIP archive.
+
+    Each file is prefixed with the position of its job in the batch, so documents
+    for the same company keep distinct names.
+
+    Args:
+        batch (GenerationBatch): The batch.
+        fileobj (file): A binary file object to write the archive to.
+
+    Returns:
+        int: The number of PDFs written.
+    """
+    positions = {job_id: position for position, job_id in enumerate(batch.jobs.order_by('id').values_list('id', flat=True), start=1)}
+    count = 0
+    # PDFs are already compressed, so they are stored as they are
+    with zipfile.ZipFile(fileobj, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for job, generation in batch_generations(batch):
+            if not generation.has_pdf_artifact:
+                continue
+            with generation.artifact.pdf_file.open('rb') as pdf_file:
+                archive.writestr(f"{positions[job.id]:03d}-{document_filename(generation)}", pdf_file.read())
+            count += 1
+    return count
+
+
+def _batch_worker(batch):
+    processed = 0
+    try:
+        while True:
+            job = claim_next_job(batch=batch)
+            if job is None:
+                return processed
+            run_job(job)
+            processed += 1
+    finally:
+        # Each thread has its own database connection
+        connection.close()
+
+
+def run_batch(batch):
+    """
+    Runs the queued jobs of a batch in this process, in batch.concurrency worker threads.
+
+    Returns:
+        dict: The batch_progress once no job is left to claim.
+    """
+    with ThreadPoolExecutor(max_workers=batch.concurrency, thread_name_prefix='batch') as executor:
+        processed = sum(executor.map(_batch_worker, [batch] * batch.concurrency))
+    logger.info(f"Ran {processed} job(s) of generation batch {batch.id}.")
+    return batch_progress(batch)
@@ -1,7 +1,9 @@
 # core/forms.py
 
 from django import forms
+from django.conf import settings
 from .models import UserProfile, Education, Experience
+from .bulk import BulkInputError, detect_input_format, parse_job_descriptions
 from django.forms import inlineformset_factory
 
 class UserProfileForm(forms.ModelForm):
@@ -137,4 +139,106 @@ class GenerationForm(forms.Form):
         required=False,
         initial=False,  # Unchecked by default
         label='Fast Mode'
-    )
\ No newline at end of file
+    )
+    
+    bypass_cache = forms.BooleanField(
+        required=False,
+        initial=False,
+        label='Ignore cached results',
+        help_text='Always ask the model again, even for a profile and job description generated before.'
+    )
+
+
+class BulkGenerationForm(forms.Form):
+    INPUT_FORMAT_CHOICES = [
+        ('auto', 'Detect from file name'),
+        ('text', "Text (postings separated by '---')"),
+        ('csv', 'CSV'),
+        ('jsonl', 'JSON Lines'),
+    ]
+
+    job_descriptions = forms.CharField(
+        required=False,
+        widget=forms.Textarea(attrs={'class': 'form-control', 'rows': 10}),
+        label='Job Descriptions',
+        help_text="Paste several job descriptions, separated by a line containing only '---'."
+    )
+
+    upload = forms.FileField(
+        required=False,
+        label='Or upload a file',
+        help_text="A CSV file with a 'job_description' column, a JSON Lines file, or a text file."
+    )
+
+    input_format = forms.ChoiceField(
+        choices=INPUT_FORMAT_CHOICES,
+        initial='auto',
+        widget=forms.Select(attrs={'class': 'form-select'}),
+        label='Format'
+    )
+
+    generate_cv = forms.BooleanField(
+        required=False,
+        initial=True,
+        label='Generate CV'
+    )
+
+    generate_cover_letter = forms.BooleanField(
+        required=False,
+        initial=True,
+        label='Generate Cover Letter'
+    )
+
+    fast_mode = forms.BooleanField(
+        required=False,
+        initial=False,
+        label='Fast Mode'
+    )
+
+    use_batch_api = forms.BooleanField(
+        required=False,
+        initial=False,
+        label='Use the Batch API',
+        help_text='Cheaper and not rate limited, but documents can take up to 24 hours.'
+    )
+
+    concurrency = forms.IntegerField(
+        min_value=1,
+        max_value=10,
+        initial=settings.BULK_GENERATION_CONCURRENCY,
+        widget=forms.NumberInput(attrs={'class': 'form-control'}),
+        label='Parallel generations',
+        help_text='How many postings are generated at the same time.'
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not (cleaned_data.get('generate_cv') or cleaned_data.get('generate_cover_letter')):
+            raise forms.ValidationError("Please select at least one document to generate.")
+
+        upload = cleaned_data.get('upload')
+        input_format = cleaned_data.get('input_format') or 'auto'
+        if upload:
+            try:
+                content = upload.read().decode('utf-8-sig')
+            except UnicodeDecodeError:
+                raise forms.ValidationError("The uploaded file must be UTF-8 text.")
+            if input_format == 'auto':
+                input_format = detect_input_format(upload.name)
+        else:
+            content = cleaned_data.get('job_descriptions', '')
+            if input_format == 'auto':
+                input_format = 'text'
+
+        try:
+            job_descriptions = parse_job_descriptions(content, input_format)
+        except BulkInputError as e:
+            raise forms.ValidationError(str(e))
+        if not job_descriptions:
+            raise forms.ValidationError("Please enter at least one job description.")
+        if len(job_descriptions) > settings.BULK_GENERATION_MAX_JOBS:
+            raise forms.ValidationError(
+                f"At most {settings.BULK_GENERATION_MAX_JOBS} job descriptions can be submitted at once."
+            )
+        cleaned_data['job_description_list'] = job_descriptions
+        return cleaned_data
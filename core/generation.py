@@ -0,0 +1,627 @@
+# core/generation.py
+
+import asyncio
+import contextvars
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.urls import reverse
+
+from .models import Generation
+from .prompts import (
+    generate_cv_prompt,
+    generate_cover_letter_prompt,
+    generate_cv_prompt_fast,
+    generate_cover_letter_prompt_fast,
+    generate_cv_section_prompt,
+    generate_cv_content_prompt,
+    generate_cover_letter_content_prompt,
+)
+from .templates import cv_template_skeleton, cover_letter_template_skeleton
+from .utils import (
+    escape_latex_special_chars,
+    format_user_experience,
+    format_user_education,
+    format_user_list_field,
+    user_info_to_prompt_format,
+    compact_latex,
+    compact_text,
+    sanitize_filename,
+    clean_latex,
+    LatexOutput,
+    FastLatexOutput,
+    CVContent,
+    FastCVContent,
+    CoverLetterContent,
+    FastCoverLetterContent,
+    JobDetails,
+    extract_job_details,
+    aextract_job_details,
+)
+from .log import truncate_payload
+from .metrics import span
+from .llm import get_async_openai_client, get_openai_client, parse_completion, aparse_completion
+from .ratelimit import rate_limit_user
+from .usage import acall_collecting_usage, call_collecting_usage, check_token_budget, collect_usage, save_usage
+from .latex import LatexCompilationError
+from .artifacts import create_pdf_artifact, replace_pdf_artifact
+from .rendering import LOCAL_SECTIONS, render_cover_letter, render_cv, render_section
+from .sections import (
+    CV_SECTIONS,
+    SECTION_INPUTS,
+    SECTION_TITLES,
+    SectionParseError,
+    assemble_sections,
+    get_cv_sections,
+    section_input_hashes,
+    stale_sections,
+    store_cv_sections,
+)
+
+logger = logging.getLogger(__name__)
+
+# The template skeletons as embedded in the full-template prompts, without indentation or comments
+CV_PROMPT_TEMPLATE = compact_latex(cv_template_skeleton)
+COVER_LETTER_PROMPT_TEMPLATE = compact_latex(cover_letter_template_skeleton)
+
+class GenerationError(Exception):
+    """
+    Raised when a document cannot be generated.
+    """
+
+
+def build_user_info(user):
+    """
+    Collects the user's profile, education and experience into the prompt payload.
+
+    Args:
+        user (User): The user whose profile is used.
+
+    Returns:
+        str: The formatted user information, ready to embed in a prompt.
+    """
+    # Convert user_info to a formatted string for the prompt
+    return user_info_to_prompt_format(build_user_info_dict(user))
+
+
+def build_user_info_dict(user):
+    """
+    Returns the user information of build_user_info as a dict, one key per profile part.
+    """
+    with span('profile'):
+        user_profile = user.userprofile
+
+        # Retrieve educations and experiences
+        educations = user_profile.educations.all()
+        experiences = user_profile.experiences.all()
+
+        user_info = {
+            'name': escape_latex_special_chars(user_profile.name),
+            'email': escape_latex_special_chars(user.email),
+            'phone': escape_latex_special_chars(user_profile.phone),
+            'education': format_user_education(educations),
+            'experience': format_user_experience(experiences),
+            'skills': format_user_list_field(user_profile.skills),
+            'interests': format_user_list_field(user_profile.interests),
+            'projects': format_user_list_field(user_profile.projects),
+            'publications': format_user_list_field(user_profile.publications),
+        }
+        return user_info
+
+
+def document_filename(generation):
+    """
+    Returns the download filename of a generation's PDF.
+    """
+    if generation.generation_type == 'cv':
+        name = generation.user.userprofile.name
+        filename = f"CV-{name}-{generation.company}.pdf"
+    elif generation.generation_type == 'cover_letter':
+        filename = f"COVER-LETTER-{generation.company}.pdf"
+    else:
+        filename = f"{generation.get_generation_type_display()}_{generation.id}.pdf"
+    return sanitize_filename(filename)
+
+
+def document_response_format(gen_type, fast_mode=False, local_rendering=None):
+    """
+    Returns the Pydantic model the LLM response for a document is parsed into.
+
+    With settings.LOCAL_LATEX_RENDERING the model only writes the prose (CVContent or
+    CoverLetterContent) and core.rendering lays out the document; otherwise it writes
+    the whole LaTeX code. Fast Mode responses also carry the job details.
+    """
+    if gen_type not in ('cv', 'cover_letter'):
+        raise GenerationError(f"Unknown generation type: {gen_type}")
+    if local_rendering is None:
+        local_rendering = settings.LOCAL_LATEX_RENDERING
+    if not local_rendering:
+        return FastLatexOutput if fast_mode else LatexOutput
+    if gen_type == 'cv':
+        return FastCVContent if fast_mode else CVContent
+    return FastCoverLetterContent if fast_mode else CoverLetterContent
+
+
+def document_request(job_description, gen_type, user_info_str, fast_mode=False, local_rendering=None):
+    """
+    Builds the LLM request for one document.
+
+    With settings.LOCAL_LATEX_RENDERING the model is asked only for the tailored prose,
+    with a completion limit of settings.LOCAL_RENDERING_MAX_TOKENS (see
+    document_response_format). Otherwise it fills in a LaTeX template.
+
+    Fast Mode uses settings.FAST_MODE_MODEL and asks for the job title and company in the
+    same response. Without local rendering, it also uses a trimmed prompt and a lower
+    completion limit.
+
+    The prompts embed the compacted template skeletons (CV_PROMPT_TEMPLATE), and their
+    whitespace is normalized to save input tokens.
+
+    Args:
+        job_description (str): The raw job description.
+        gen_type (str): 'cv' or 'cover_letter'.
+        user_info_str (str): The formatted user information from build_user_info.
+        fast_mode (bool): Use the low-latency pipeline.
+        local_rendering (bool): Override settings.LOCAL_LATEX_RENDERING.
+
+    Returns:
+        dict: The keyword arguments for core.llm.parse_completion / astream_completion.
+    """
+    with span('prompt_build'):
+        if local_rendering is None:
+            local_rendering = settings.LOCAL_LATEX_RENDERING
+        response_format = document_response_format(gen_type, fast_mode, local_rendering)
+        escaped_job_description = escape_latex_special_chars(compact_text(job_description))
+
+        if local_rendering:
+            if gen_type == 'cv':
+                prompt = generate_cv_content_prompt(user_info_str, escaped_job_description, fast_mode)
+            else:
+                prompt = generate_cover_letter_content_prompt(user_info_str, escaped_job_description, fast_mode)
+            system_prompt = "You are a helpful assistant designed to write tailored CV and cover letter content in a structured format."
+            max_tokens = settings.LOCAL_RENDERING_MAX_TOKENS
+        else:
+            if gen_type == 'cv':
+                if fast_mode:
+                    prompt = generate_cv_prompt_fast(user_info_str, escaped_job_description, CV_PROMPT_TEMPLATE)
+                else:
+                    prompt = generate_cv_prompt(user_info_str, escaped_job_description, CV_PROMPT_TEMPLATE)
+            else:
+                if fast_mode:
+                    prompt = generate_cover_letter_prompt_fast(user_info_str, escaped_job_description, COVER_LETTER_PROMPT_TEMPLATE)
+                else:
+                    prompt = generate_cover_letter_prompt(user_info_str, escaped_job_description, COVER_LETTER_PROMPT_TEMPLATE)
+            system_prompt = "You are a helpful assistant designed to output LaTeX code in a structured format."
+            max_tokens = settings.FAST_MODE_MAX_TOKENS if fast_mode else 5000
+
+    return {
+        'model': settings.FAST_MODE_MODEL if fast_mode else settings.GENERATION_MODEL,
+        'messages': [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": compact_text(prompt)}
+        ],
+        'response_format': response_format,
+        'max_tokens': max_tokens,
+        'temperature': 0.7,
+        'timeout': settings.OPENAI_GENERATION_TIMEOUT,
+    }
+
+
+def document_output(gen_type, response, user_info_str):
+    """
+    Turns the LLM response for a document into its LaTeX code, rendering it locally
+    when the response only carries the prose.
+
+    Args:
+        gen_type (str): 'cv' or 'cover_letter'.
+        response: The parsed response (see document_response_format).
+        user_info_str (str): The formatted user information the document was written from.
+
+    Returns:
+        tuple: (LatexOutput, JobDetails), with JobDetails None unless the response
+        carries them (Fast Mode).
+    """
+    job_details = None
+    if hasattr(response, 'job_title'):
+        job_details = JobDetails(job_title=response.job_title, company=response.company)
+    if isinstance(response, CVContent):
+        latex_code = render_cv(json.loads(user_info_str), response)
+    elif isinstance(response, CoverLetterContent):
+        latex_code = render_cover_letter(json.loads(user_info_str), response)
+    else:
+        latex_code = response.latex_code
+    return LatexOutput(latex_code=latex_code), job_details
+
+
+def request_document(job_description, gen_type, user_info_str, bypass_cache=False, fast_mode=False):
+    """
+    Asks the LLM for one document. Makes no database queries, so it is safe to run in a worker thread.
+
+    Args:
+        job_description (str): The raw job description.
+        gen_type (str): 'cv' or 'cover_letter'.
+        user_info_str (str): The formatted user information from build_user_info.
+        bypass_cache (bool): Ignore a cached response for an identical prompt.
+        fast_mode (bool): Use the low-latency pipeline (see document_request).
+
+    Returns:
+        The parsed LLM response, an instance of document_response_format; see document_output.
+    """
+    request_kwargs = document_request(job_description, gen_type, user_info_str, fast_mode)
+    return parse_completion(get_openai_client(), bypass_cache=bypass_cache, **request_kwargs)
+
+
+async def arequest_document(job_description, gen_type, user_info_str, bypass_cache=False, fast_mode=False):
+    """
+    Async version of request_document, using the shared AsyncOpenAI client.
+    """
+    request_kwargs = document_request(job_description, gen_type, user_info_str, fast_mode)
+    return await aparse_completion(get_async_openai_client(), bypass_cache=bypass_cache, **request_kwargs)
+
+
+def _timed(func, *args):
+    """Calls func and returns its result with the elapsed wall time in milliseconds."""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, int((time.perf_counter() - start) * 1000)
+
+
+async def _atimed(coro):
+    """Awaits coro and returns its result with the elapsed wall time in milliseconds."""
+    start = time.perf_counter()
+    result = await coro
+    return result, int((time.perf_counter() - start) * 1000)
+
+
+def save_document(user, job_description, gen_type, job_details, latex_output, user_info_str=None, usage_records=None):
+    """
+    Stores a generated document and compiles its PDF.
+
+    CVs are also stored section by section, with the hash of the user information each
+    section was written from, for regenerate_cv_sections. The usage_records collected
+    from the document's completion calls (see core.usage) are stored linked to it, and
+    removed from the list, so a caller saving the leftovers of a failed document does
+    not count them twice.
+
+    Returns:
+        dict: The document info returned to the front end.
+    """
+    with span('db_write'):
+        generation = Generation.objects.create(
+            user=user,
+            job_description=job_description,
+            generation_type=gen_type,
+            job_title=job_details.job_title,
+            company=job_details.company,
+            json_output=latex_output.dict(),  # Convert Pydantic model to dictionary
+        )
+
+        if gen_type == 'cv':
+            try:
+                store_cv_sections(generation, user_info_str)
+            except SectionParseError as e:
+                logger.warning(f"Could not split Generation ID {generation.id} into sections: {e}")
+
+        save_usage(user, usage_records, generation)
+        if usage_records:
+            usage_records.clear()
+
+    # Compile the PDF once, now, so viewing and downloading are pure reads
+    try:
+        create_pdf_artifact(generation)
+        pdf_ready = True
+    except LatexCompilationError as e:
+        logger.warning(f"Could not compile PDF for Generation ID {generation.id}: {truncate_payload(str(e))}")
+        pdf_ready = False
+
+    return {
+        'generation_id': generation.id,
+        'type': gen_type.replace('_', ' ').title(),
+        'view_url': reverse('render_latex', args=[generation.id]),
+        'download_url': reverse('download_pdf', args=[generation.id]),
+        'filename': document_filename(generation),
+        'pdf_ready': pdf_ready,
+    }
+
+
+def run_generation(user, job_description, generation_types, bypass_cache=False, fast_mode=False,
+                   user_info_str=None):
+    """
+    Generates every requested document for one job description.
+
+    The job details extraction and the LLM calls for the different document types run
+    concurrently; the results are then stored one by one. A failing document does not
+    prevent the others from being generated. In Fast Mode the job details come back with
+    each document, so there is no separate extraction call.
+
+    Args:
+        user (User): The user the documents are generated for.
+        job_description (str): The raw job description.
+        generation_types (list): The requested types, e.g. ['cv', 'cover_letter'].
+        bypass_cache (bool): Ignore cached LLM responses for identical prompts.
+        fast_mode (bool): Use the low-latency pipeline (see request_document).
+        user_info_str (str): The formatted user information, when the caller already
+            built it (e.g. once for a whole batch); built from the profile otherwise.
+
+    Returns:
+        dict: 'documents' with the info of each generated document, 'errors' with the
+        type and message of each document that failed, and 'elapsed_ms' with the
+        wall time of the whole generation.
+
+    Raises:
+        TokenBudgetExceeded: If the user has used up their daily token budget.
+    """
+    start = time.perf_counter()
+    check_token_budget(user)
+    if user_info_str is None:
+        user_info_str = build_user_info(user)
+
+    generated_docs = []
+    errors = []
+    # The usage of each call, stored with the document it produced. The job details
+    # call is counted with the first document stored.
+    job_details_usage = []
+    document_usage = {gen_type: [] for gen_type in generation_types}
+    with rate_limit_user(user.id), ThreadPoolExecutor(max_workers=len(generation_types) + 1) as executor:
+        # Job details are extracted once per request, alongside the document calls. Each
+        # call runs in a copy of this context, so the rate limiter knows the user.
+        if not fast_mode:
+            job_details_future = executor.submit(
+                contextvars.copy_context().run,
+                call_collecting_usage, job_details_usage, extract_job_details, job_description
+            )
+        futures = {
+            gen_type: executor.submit(
+                contextvars.copy_context().run,
+                call_collecting_usage, document_usage[gen_type],
+                _timed, request_document, job_description, gen_type, user_info_str, bypass_cache, fast_mode
+            )
+            for gen_type in generation_types
+        }
+        # Store each document as soon as its own LLM call returns
+        for gen_type, future in futures.items():
+            usage_records = document_usage[gen_type]
+            try:
+                response, llm_ms = future.result()
+                latex_output, job_details = document_output(gen_type, response, user_info_str)
+                if not fast_mode:
+                    job_details = job_details_future.result()
+                    usage_records = usage_records + job_details_usage
+                    job_details_usage.clear()
+                document = save_document(
+                    user, job_description, gen_type, job_details, latex_output, user_info_str, usage_records
+                )
+                document['llm_ms'] = llm_ms
+                generated_docs.append(document)
+            except Exception as e:
+                logger.error(f"Error generating {gen_type}: {e}")
+                errors.append({
+                    'type': gen_type.replace('_', ' ').title(),
+                    'error': f"Error generating {gen_type}: {e}",
+                })
+                save_usage(user, usage_records)
+    # Calls of a generation where every document failed still count against the budget
+    save_usage(user, job_details_usage)
+    elapsed_ms = int((time.perf_counter() - start) * 1000)
+    logger.info(f"Generated {len(generated_docs)} document(s) in {elapsed_ms} ms (fast mode: {fast_mode}).")
+    return {'documents': generated_docs, 'errors': errors, 'elapsed_ms': elapsed_ms, 'fast_mode': fast_mode}
+
+
+async def arun_generation(user, job_description, generation_types, bypass_cache=False, fast_mode=False):
+    """
+    Async version of run_generation, for async views.
+
+    The LLM calls are awaited on the event loop with the shared AsyncOpenAI client
+    instead of occupying one thread each; only the database work and the PDF
+    compilation run in threads. Takes the same arguments and returns the same dict
+    as run_generation, but leaves the token budget check to the caller (the async
+    views check it before they start).
+    """
+    start = time.perf_counter()
+    user_info_str = await sync_to_async(build_user_info)(user)
+
+    job_details_usage = []
+    document_usage = {gen_type: [] for gen_type in generation_types}
+    # The tasks inherit the user attribution for the rate limiter
+    with rate_limit_user(user.id):
+        job_details_task = None
+        if not fast_mode:
+            job_details_task = asyncio.ensure_future(
+                acall_collecting_usage(job_details_usage, aextract_job_details(job_description))
+            )
+        results = await asyncio.gather(
+            *(
+                acall_collecting_usage(
+                    document_usage[gen_type],
+                    _atimed(arequest_document(job_description, gen_type, user_info_str, bypass_cache, fast_mode)),
+                )
+                for gen_type in generation_types
+            ),
+            return_exceptions=True,
+        )
+
+    generated_docs = []
+    errors = []
+    for gen_type, result in zip(generation_types, results):
+        usage_records = document_usage[gen_type]
+        try:
+            if isinstance(result, BaseException):
+                raise result
+            response, llm_ms = result
+            latex_output, job_details = document_output(gen_type, response, user_info_str)
+            if not fast_mode:
+                job_details = await job_details_task
+                usage_records = usage_records + job_details_usage
+                job_details_usage.clear()
+            document = await sync_to_async(save_document)(
+                user, job_description, gen_type, job_details, latex_output, user_info_str, usage_records
+            )
+            document['llm_ms'] = llm_ms
+            generated_docs.append(document)
+        except Exception as e:
+            logger.error(f"Error generating {gen_type}: {e}")
+            errors.append({
+                'type': gen_type.replace('_', ' ').title(),
+                'error': f"Error generating {gen_type}: {e}",
+            })
+            await sync_to_async(save_usage)(user, usage_records)
+    if job_details_task is not None and not job_details_task.done():
+        job_details_task.cancel()
+    elif job_details_task is not None and not job_details_task.cancelled():
+        job_details_task.exception()  # Mark a failed extraction as retrieved
+    await sync_to_async(save_usage)(user, job_details_usage)
+    elapsed_ms = int((time.perf_counter() - start) * 1000)
+    logger.info(f"Generated {len(generated_docs)} document(s) in {elapsed_ms} ms (fast mode: {fast_mode}).")
+    return {'documents': generated_docs, 'errors': errors, 'elapsed_ms': elapsed_ms, 'fast_mode': fast_mode}
+
+
+def section_request(job_description, section_key, user_info, current_section):
+    """
+    Builds the LLM request that rewrites one CV section.
+
+    The prompt carries only the parts of the user information the section is written
+    from (see core.sections.SECTION_INPUTS) and the section's current LaTeX as the
+    format to follow, so it is a fraction of the size of a full CV request.
+
+    Args:
+        job_description (str): The raw job description.
+        section_key (str): One of core.sections.CV_SECTIONS.
+        user_info (dict): The user information from build_user_info_dict.
+        current_section (str): The current LaTeX of the section.
+
+    Returns:
+        dict: The keyword arguments for core.llm.parse_completion.
+    """
+    with span('prompt_build'):
+        section_info = user_info_to_prompt_format({name: user_info.get(name) for name in SECTION_INPUTS[section_key]})
+        prompt = generate_cv_section_prompt(
+            SECTION_TITLES[section_key],
+            section_info,
+            escape_latex_special_chars(compact_text(job_description)),
+            compact_latex(current_section),
+        )
+    return {
+        'model': settings.GENERATION_MODEL,
+        'messages': [
+            {"role": "system", "content": "You are a helpful assistant designed to output LaTeX code in a structured format."},
+            {"role": "user", "content": compact_text(prompt)}
+        ],
+        'response_format': LatexOutput,
+        'max_tokens': settings.SECTION_MAX_TOKENS,
+        'temperature': 0.7,
+        'timeout': settings.OPENAI_GENERATION_TIMEOUT,
+    }
+
+
+def _section_latex(section_key, latex_code):
+    """
+    Checks a regenerated section and formats it to be joined with the others.
+    """
+    latex_code = clean_latex(latex_code).strip()
+    if '\\documentclass' in latex_code or '\\begin{document}' in latex_code or '\\end{document}' in latex_code:
+        raise GenerationError("The model returned a whole document instead of the section.")
+    if section_key != 'header' and not latex_code.startswith('\\section*'):
+        raise GenerationError("The regenerated section has no \\section* heading.")
+    return f"\n{latex_code}\n\n"
+
+
+def regenerate_cv_sections(generation, section_keys=None, bypass_cache=False):
+    """
+    Regenerates the sections of a CV whose inputs changed, then re-assembles and recompiles it.
+
+    Only the stale sections are sent to the LLM, concurrently, each with its own short
+    prompt; the other sections are kept as they are. With settings.LOCAL_LATEX_RENDERING
+    the header, education and skills are rendered from the profile instead. A section
+    that fails keeps its previous version and stays stale. If the new PDF does not
+    compile, the previous one is kept and 'pdf_ready' is False.
+
+    Args:
+        generation (Generation): The CV to update.
+        section_keys (list): The sections to regenerate; by default those whose part of
+            the user's profile changed since they were written.
+        bypass_cache (bool): Ignore cached LLM responses for identical prompts.
+
+    Returns:
+        dict: 'regenerated' with the keys of the rewritten sections, 'errors' with the
+        section and message of each failure, 'pdf_ready' and 'elapsed_ms'.
+
+    Raises:
+        GenerationError: If the generation is not a CV or a requested section does not exist.
+        SectionParseError: If the CV cannot be split into sections.
+        TokenBudgetExceeded: If the user has used up their daily token budget.
+    """
+    if generation.generation_type != 'cv':
+        raise GenerationError("Only CVs can be regenerated section by section.")
+    start = time.perf_counter()
+    check_token_budget(generation.user)
+
+    user_info = build_user_info_dict(generation.user)
+    user_info_str = user_info_to_prompt_format(user_info)
+    sections = get_cv_sections(generation)
+    sections_by_key = {section.key: section for section in sections}
+    if section_keys is None:
+        section_keys = stale_sections(sections, user_info_str)
+    else:
+        unknown = [key for key in section_keys if key not in CV_SECTIONS or key not in sections_by_key]
+        if unknown:
+            raise GenerationError(f"Unknown section(s): {', '.join(unknown)}")
+
+    regenerated = []
+    errors = []
+    hashes = section_input_hashes(user_info_str)
+    if settings.LOCAL_LATEX_RENDERING:
+        # The structural sections are rendered from the profile, without the LLM
+        for key in [key for key in section_keys if key in LOCAL_SECTIONS]:
+            section = sections_by_key[key]
+            section.latex = render_section(key, user_info)
+            section.input_hash = hashes[key]
+            section.save(update_fields=['latex', 'input_hash', 'updated_at'])
+            regenerated.append(key)
+        section_keys = [key for key in section_keys if key not in LOCAL_SECTIONS]
+    if section_keys:
+        with rate_limit_user(generation.user_id), collect_usage() as usage_records, \
+                ThreadPoolExecutor(max_workers=len(section_keys)) as executor:
+            futures = {
+                key: executor.submit(
+                    contextvars.copy_context().run,
+                    parse_completion,
+                    get_openai_client(),
+                    bypass_cache=bypass_cache,
+                    **section_request(generation.job_description, key, user_info, sections_by_key[key].latex),
+                )
+                for key in section_keys
+            }
+            for key, future in futures.items():
+                try:
+                    section = sections_by_key[key]
+                    section.latex = _section_latex(key, future.result().latex_code)
+                    section.input_hash = hashes[key]
+                    section.save(update_fields=['latex', 'input_hash', 'updated_at'])
+                    regenerated.append(key)
+                except Exception as e:
+                    logger.error(f"Error regenerating the {key} section of Generation ID {generation.id}: {e}")
+                    errors.append({'section': key, 'error': f"Error regenerating {key}: {e}"})
+        save_usage(generation.user, usage_records, generation)
+
+    pdf_ready = generation.has_pdf_artifact
+    if regenerated:
+        generation.json_output = LatexOutput(latex_code=assemble_sections(sections)).dict()
+        generation.save(update_fields=['json_output'])
+        try:
+            replace_pdf_artifact(generation)
+            pdf_ready = True
+        except LatexCompilationError as e:
+            # The previous PDF is kept, but it predates the regenerated sections
+            logger.warning(f"Could not compile PDF for Generation ID {generation.id}: {truncate_payload(str(e))}")
+            pdf_ready = False
+
+    elapsed_ms = int((time.perf_counter() - start) * 1000)
+    logger.info(
+        f"Regenerated {len(regenerated)} section(s) of Generation ID {generation.id} in {elapsed_ms} ms"
+        f" ({', '.join(regenerated) or 'none'})."
+    )
+    return {'regenerated': regenerated, 'errors': errors, 'pdf_ready': pdf_ready, 'elapsed_ms': elapsed_ms}
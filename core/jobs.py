@@ -0,0 +1,169 @@
+# core/jobs.py
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from django.db.models import Count, F, Q
+
+from .models import GenerationBatch, GenerationJob
+from .generation import run_generation
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_generation_job(user, job_description, generate_cv=True, generate_cover_letter=True, fast_mode=False,
+                           bypass_cache=False):
+    """
+    Queues a document generation to be picked up by a worker.
+
+    Returns:
+        GenerationJob: The queued job.
+    """
+    job = GenerationJob.objects.create(
+        user=user,
+        job_description=job_description,
+        generate_cv=generate_cv,
+        generate_cover_letter=generate_cover_letter,
+        fast_mode=fast_mode,
+        bypass_cache=bypass_cache,
+    )
+    logger.debug(f"Queued generation job {job.id} for {user.username}.")
+    return job
+
+
+def requeue_stale_jobs():
+    """
+    Queues again the jobs claimed more than settings.GENERATION_JOB_TIMEOUT seconds
+    ago and still running, whose worker presumably died. Batch API jobs, which run
+    until their batch is collected, are left alone.
+
+    Returns:
+        int: The number of jobs queued again.
+    """
+    timeout = settings.GENERATION_JOB_TIMEOUT
+    if timeout <= 0:
+        return 0
+    requeued = (
+        GenerationJob.objects.filter(
+            status=GenerationJob.STATUS_RUNNING,
+            started_at__lt=timezone.now() - timedelta(seconds=timeout),
+        )
+        .exclude(batch__use_batch_api=True)
+        .update(status=GenerationJob.STATUS_QUEUED, started_at=None)
+    )
+    if requeued:
+        logger.warning(f"Queued again {requeued} generation job(s) running for more than {timeout} seconds.")
+    return requeued
+
+
+def claim_next_job(batch=None):
+    """
+    Atomically moves the oldest queued job to running.
+
+    The claim is a conditional UPDATE on the job's status, so several workers can
+    poll the same database without picking up the same job. Jobs of a batch that
+    already has its GenerationBatch.concurrency jobs running are skipped (workers
+    racing for the last slot can briefly exceed the limit by one job each). Stale
+    claims are released first (see requeue_stale_jobs), so a crashed worker's job
+    neither stays running nor keeps holding a slot of its batch.
+
+    Args:
+        batch (GenerationBatch): Only claim jobs of this batch.
+
+    Returns:
+        GenerationJob or None: The claimed job, or None if no job can be claimed.
+    """
+    requeue_stale_jobs()
+    while True:
+        saturated_batches = GenerationBatch.objects.annotate(
+            running=Count('jobs', filter=Q(jobs__status=GenerationJob.STATUS_RUNNING))
+        ).filter(running__gte=F('concurrency')).values('id')
+        jobs = (
+            GenerationJob.objects.filter(status=GenerationJob.STATUS_QUEUED)
+            .exclude(batch__in=saturated_batches)
+            .exclude(batch__use_batch_api=True)  # Generated by core.batch_api instead
+        )
+        if batch is not None:
+            jobs = jobs.filter(batch=batch)
+        job = jobs.order_by('created_at', 'id').first()
+        if job is None:
+            return None
+        if claim_job(job):
+            return job
+        # Another worker claimed it first; try the next one.
+
+
+def claim_job(job):
+    """
+    Moves a queued job to running, unless another worker claimed it first.
+
+    Returns:
+        bool: Whether the job was claimed.
+    """
+    started_at = timezone.now()
+    claimed = GenerationJob.objects.filter(id=job.id, status=GenerationJob.STATUS_QUEUED).update(
+        status=GenerationJob.STATUS_RUNNING,
+        started_at=started_at,
+    )
+    if claimed:
+        job.status = GenerationJob.STATUS_RUNNING
+        job.started_at = started_at
+    return bool(claimed)
+
+
+def run_job(job):
+    """
+    Runs a claimed job and records its outcome.
+
+    Args:
+        job (GenerationJob): A job in the running state.
+
+    Returns:
+        GenerationJob: The job, now done or failed.
+    """
+    logger.info(f"Running generation job {job.id}.")
+    try:
+        result = run_generation(
+            job.user,
+            job.job_description,
+            job.generation_types,
+            bypass_cache=job.bypass_cache,
+            fast_mode=job.fast_mode,
+            user_info_str=job.batch.user_info if job.batch_id else None,
+        )
+    except Exception as e:
+        logger.error(f"Generation job {job.id} failed: {e}")
+        job.status = GenerationJob.STATUS_FAILED
+        job.error = str(e)
+    else:
+        job.result = result
+        if result['documents']:
+            job.status = GenerationJob.STATUS_DONE
+        else:
+            # Every document failed; surface their errors as the job's error
+            job.status = GenerationJob.STATUS_FAILED
+            job.error = "; ".join(error['error'] for error in result['errors'])
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'result', 'error', 'finished_at'])
+    return job
+
+
+def job_status_payload(job):
+    """
+    Returns the JSON-serializable status of a job for the polling endpoint.
+    """
+    payload = {
+        'id': job.id,
+        'status': job.status,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+    if job.status == GenerationJob.STATUS_DONE:
+        payload.update(job.result or {})
+    elif job.status == GenerationJob.STATUS_FAILED:
+        payload['error'] = job.error
+    return payload
@@ -0,0 +1,450 @@
+# core/latex.py
+
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .log import log_payload, truncate_payload
+from .metrics import record_span, span
+from .pdf_cache import pdf_cache
+from .templates import cv_template, cover_letter_template, cv_template_skeleton, cover_letter_template_skeleton
+from .utils import clean_latex
+
+logger = logging.getLogger(__name__)
+
+
+class LatexCompilationError(Exception):
+    """
+    Raised when a LaTeX document cannot be compiled into a PDF.
+
+    Attributes:
+        log (str): The compiler output, when there is any.
+    """
+
+    def __init__(self, message, log=''):
+        super().__init__(message)
+        self.log = log
+
+
+@dataclass
+class CompileResult:
+    """
+    The outcome of compiling one LaTeX document.
+
+    Attributes:
+        pdf (bytes): The compiled PDF content.
+        log (str): The compiler output.
+        timings (dict): Durations in milliseconds, e.g. 'queue_ms', 'compile_ms', 'total_ms'.
+        backend (str): The name of the backend that compiled the document.
+    """
+    pdf: bytes
+    log: str = ''
+    timings: dict = field(default_factory=dict)
+    backend: str = ''
+
+
+def prepare_latex_source(latex_code_raw):
+    """
+    Turns the LaTeX code stored on a Generation into the exact source handed to pdflatex.
+
+    Args:
+        latex_code_raw (str): The LaTeX code from the generation's JSON output.
+
+    Returns:
+        str: The cleaned LaTeX source, with the inputenc package ensured in the preamble.
+    """
+    latex_code_clean = clean_latex(latex_code_raw)
+
+    # Ensure the LaTeX preamble includes the inputenc package for Unicode
+    if '\\usepackage[utf8]{inputenc}' not in latex_code_clean:
+        # Insert \usepackage[utf8]{inputenc} after \documentclass
+        latex_code_clean = latex_code_clean.replace(
+            '\\documentclass[a4paper,10pt]{article}',
+            '\\documentclass[a4paper,10pt]{article}\n\\usepackage[utf8]{inputenc}'
+        )
+        logger.debug("Added '\\usepackage[utf8]{inputenc}' to the LaTeX preamble.")
+
+    return latex_code_clean
+
+
+def split_preamble(latex_code):
+    """
+    Splits LaTeX source into its preamble and its body at \begin{document}.
+
+    Args:
+        latex_code (str): The LaTeX source.
+
+    Returns:
+        tuple: (preamble, body), where body starts with \begin{document}, or
+        (None, latex_code) if the source has no \begin{document}.
+    """
+    index = latex_code.find('\\begin{document}')
+    if index == -1:
+        return None, latex_code
+    return latex_code[:index], latex_code[index:]
+
+
+def normalize_preamble(preamble):
+    """
+    Strips comments, indentation and blank lines from a preamble, so preambles that
+    only differ in layout compare equal.
+    """
+    lines = []
+    for line in preamble.splitlines():
+        line = re.sub(r'(?<!\\)%.*', '', line).strip()
+        if line:
+            lines.append(line)
+    return '\n'.join(lines)
+
+
+def preamble_format_name(preamble):
+    """
+    Returns the format file name (without extension) of a normalized preamble.
+    """
+    return f"preamble-{hashlib.sha256(preamble.encode('utf-8')).hexdigest()[:16]}"
+
+
+def template_preambles():
+    """
+    Returns the normalized preambles of the bundled CV and cover letter templates.
+    """
+    preambles = set()
+    for template in (cv_template, cover_letter_template, cv_template_skeleton, cover_letter_template_skeleton):
+        preamble, _ = split_preamble(template)
+        preambles.add(normalize_preamble(preamble))
+    return preambles
+
+
+_template_preambles = template_preambles()
+
+
+def resolve_pdflatex():
+    """
+    Locates the pdflatex executable: settings.PDFLATEX_PATH if set, then the PATH,
+    then the MacTeX location.
+
+    Returns:
+        str: The path of pdflatex, or None if it cannot be found.
+    """
+    if settings.PDFLATEX_PATH:
+        return settings.PDFLATEX_PATH
+    pdflatex_path = shutil.which('pdflatex')
+    if not pdflatex_path and os.path.exists('/Library/TeX/texbin/pdflatex'):
+        pdflatex_path = '/Library/TeX/texbin/pdflatex'
+    if pdflatex_path:
+        logger.info(f"Using pdflatex at: {pdflatex_path}")
+    else:
+        logger.warning("pdflatex executable not found in PATH or at '/Library/TeX/texbin/pdflatex'.")
+    return pdflatex_path
+
+
+# Resolved once, when the module is first imported at startup
+PDFLATEX_PATH = resolve_pdflatex()
+
+
+class LatexBackend:
+    """
+    Base class of LaTeX compilation backends. settings.LATEX_BACKEND names the
+    backend class used by the engine; it is instantiated without arguments.
+    """
+    name = 'base'
+
+    def compile(self, latex_code):
+        """
+        Compiles LaTeX source.
+
+        Args:
+            latex_code (str): The cleaned LaTeX source.
+
+        Returns:
+            CompileResult: The PDF, the compiler output and the 'compile_ms' timing.
+
+        Raises:
+            LatexCompilationError: If the document cannot be compiled.
+        """
+        raise NotImplementedError
+
+    def warm(self):
+        """
+        Prepares the backend ahead of the first compilation.
+
+        Returns:
+            list: The names of the resources that were prepared.
+        """
+        return []
+
+
+class PdflatexBackend(LatexBackend):
+    """
+    Compiles with a pdflatex subprocess per document.
+
+    Documents whose preamble matches a bundled template preamble are compiled with a
+    precompiled format of that preamble (see build_format), so pdflatex starts with
+    the packages already loaded. This can be turned off with settings.LATEX_PRELOAD_FORMATS.
+    """
+    name = 'pdflatex'
+
+    def __init__(self, pdflatex_path=None, preload_formats=None):
+        self.pdflatex_path = pdflatex_path or PDFLATEX_PATH
+        self.preload_formats = settings.LATEX_PRELOAD_FORMATS if preload_formats is None else preload_formats
+        # Format names that failed to build or to compile with, skipped from then on
+        self._failed_formats = set()
+        self._format_lock = threading.Lock()
+
+    def _pdflatex(self):
+        if not self.pdflatex_path:
+            raise LatexCompilationError(
+                "pdflatex executable not found. Please ensure that LaTeX is installed correctly and that 'pdflatex' is in your system's PATH."
+            )
+        return self.pdflatex_path
+
+    def build_format(self, preamble):
+        """
+        Dumps a preamble into a precompiled pdflatex format in settings.LATEX_FORMAT_DIR,
+        unless it already exists.
+
+        Args:
+            preamble (str): The normalized preamble.
+
+        Returns:
+            str: The format name, or None if the format could not be built.
+        """
+        pdflatex_path = self._pdflatex()
+        name = preamble_format_name(preamble)
+        format_dir = str(settings.LATEX_FORMAT_DIR)
+        format_path = os.path.join(format_dir, f"{name}.fmt")
+
+        with self._format_lock:
+            if name in self._failed_formats:
+                return None
+            if os.path.exists(format_path):
+                return name
+
+            os.makedirs(format_dir, exist_ok=True)
+            with tempfile.TemporaryDirectory() as temp_dir:
+                with open(os.path.join(temp_dir, f"{name}.tex"), 'w', encoding='utf-8') as tex_file:
+                    tex_file.write(preamble + '\n\\dump\n')
+                start = time.perf_counter()
+                try:
+                    subprocess.run(
+                        [pdflatex_path, '-ini', '-interaction=nonstopmode', '-halt-on-error',
+                         f'-jobname={name}', '&pdflatex', f'{name}.tex'],
+                        cwd=temp_dir,
+                        check=True,
+                        stdout=subprocess.PIPE,
+                        stderr=subprocess.PIPE,
+                        timeout=120
+                    )
+                    # Move the format in place atomically, so other processes never read a partial file
+                    os.replace(os.path.join(temp_dir, f"{name}.fmt"), format_path)
+                except (subprocess.SubprocessError, OSError) as e:
+                    logger.warning(f"Could not build LaTeX format {name}, compiling without it: {e}")
+                    self._failed_formats.add(name)
+                    return None
+
+            logger.info(f"Built LaTeX format {name} in {int((time.perf_counter() - start) * 1000)} ms.")
+            return name
+
+    def _drop_format(self, name):
+        with self._format_lock:
+            self._failed_formats.add(name)
+            try:
+                os.remove(os.path.join(str(settings.LATEX_FORMAT_DIR), f"{name}.fmt"))
+            except OSError:
+                pass
+
+    def warm(self):
+        """
+        Builds the formats of the bundled template preambles.
+        """
+        names = [self.build_format(preamble) for preamble in sorted(_template_preambles)]
+        return [name for name in names if name]
+
+    def _run(self, latex_code, format_name=None):
+        """
+        Runs pdflatex once on latex_code in a temporary directory, with the given
+        precompiled format if any, and returns the PDF content and the compiler output.
+        """
+        env = None
+        command = [self._pdflatex(), '-interaction=nonstopmode']
+        if format_name:
+            # Look formats up in LATEX_FORMAT_DIR first, then in the default locations
+            env = {**os.environ, 'TEXFORMATS': f"{settings.LATEX_FORMAT_DIR}{os.pathsep}"}
+            command.append(f'-fmt={format_name}')
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            tex_file_path = os.path.join(temp_dir, 'document.tex')
+            pdf_file_path = os.path.join(temp_dir, 'document.pdf')
+
+            try:
+                with open(tex_file_path, 'w', encoding='utf-8') as tex_file:
+                    tex_file.write(latex_code)
+                logger.debug(f"Wrote cleaned LaTeX code to {tex_file_path}")
+            except Exception as e:
+                logger.error(f"Failed to write LaTeX code to file: {e}")
+                raise LatexCompilationError("Failed to write LaTeX code to file.") from e
+
+            try:
+                logger.debug("Starting pdflatex subprocess.")
+                result = subprocess.run(
+                    command + [tex_file_path],
+                    cwd=temp_dir,
+                    env=env,
+                    check=True,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    timeout=60  # Increased timeout to handle longer compilations
+                )
+                log = result.stdout.decode('utf-8', errors='replace')
+                log_payload(logger, logging.DEBUG, "pdflatex stdout", log)
+                log_payload(logger, logging.DEBUG, "pdflatex stderr", result.stderr)
+            except subprocess.TimeoutExpired as e:
+                logger.error("pdflatex subprocess timed out.")
+                raise LatexCompilationError("LaTeX compilation timed out.") from e
+            except subprocess.CalledProcessError as e:
+                error_message = e.stderr.decode('utf-8', errors='replace') if e.stderr else "No stderr captured."
+                log = e.stdout.decode('utf-8', errors='replace') if e.stdout else ''
+                logger.error(f"Error compiling LaTeX: {truncate_payload(error_message)}")
+                raise LatexCompilationError(f"Error compiling LaTeX: {error_message}", log=log) from e
+            except Exception as e:
+                logger.error(f"Unexpected error during LaTeX compilation: {str(e)}")
+                raise LatexCompilationError(f"Unexpected error during LaTeX compilation: {str(e)}") from e
+
+            if not os.path.exists(pdf_file_path):
+                logger.error("PDF file was not created.")
+                raise LatexCompilationError("PDF file was not created.", log=log)
+
+            try:
+                with open(pdf_file_path, 'rb') as pdf_file:
+                    pdf_content = pdf_file.read()
+                logger.debug("Read compiled PDF content.")
+            except Exception as e:
+                logger.error(f"Failed to read compiled PDF: {e}")
+                raise LatexCompilationError("Failed to read compiled PDF.", log=log) from e
+
+        return pdf_content, log
+
+    def compile(self, latex_code):
+        start = time.perf_counter()
+
+        preamble, body = split_preamble(latex_code)
+        format_name = None
+        if self.preload_formats and preamble is not None:
+            preamble = normalize_preamble(preamble)
+            if preamble in _template_preambles:
+                format_name = self.build_format(preamble)
+
+        if format_name:
+            try:
+                pdf_content, log = self._run(body, format_name)
+            except LatexCompilationError:
+                # The error may come from the format (e.g. built by another TeX version):
+                # compile without it, and stop using it if that succeeds
+                pdf_content, log = self._run(latex_code)
+                logger.warning(f"Compiling with LaTeX format {format_name} failed; disabling it.")
+                self._drop_format(format_name)
+        else:
+            pdf_content, log = self._run(latex_code)
+
+        compile_ms = int((time.perf_counter() - start) * 1000)
+        return CompileResult(pdf=pdf_content, log=log, timings={'compile_ms': compile_ms}, backend=self.name)
+
+
+class LatexEngine:
+    """
+    Runs compilations on a backend through a bounded pool of worker threads, so at
+    most max_workers compilations (and TeX processes) run at once per server process;
+    further requests wait for a free worker.
+    """
+
+    def __init__(self, backend, max_workers):
+        self.backend = backend
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='latex')
+
+    def compile(self, latex_code):
+        """
+        Compiles LaTeX source.
+
+        Args:
+            latex_code (str): The cleaned LaTeX source.
+
+        Returns:
+            CompileResult: The result, with 'queue_ms' and 'total_ms' added to its timings.
+
+        Raises:
+            LatexCompilationError: If the document cannot be compiled.
+        """
+        submitted = time.perf_counter()
+
+        def run():
+            queue_ms = int((time.perf_counter() - submitted) * 1000)
+            result = self.backend.compile(latex_code)
+            result.timings['queue_ms'] = queue_ms
+            return result
+
+        result = self._pool.submit(run).result()
+        result.timings['total_ms'] = int((time.perf_counter() - submitted) * 1000)
+        logger.debug(f"Compiled LaTeX with {result.backend}: {result.timings}")
+        return result
+
+
+engine = LatexEngine(import_string(settings.LATEX_BACKEND)(), settings.LATEX_COMPILE_WORKERS)
+
+
+def compile_latex(latex_code):
+    """
+    Compiles LaTeX source with the configured engine. This is the entry point for all
+    LaTeX compilation.
+
+    Args:
+        latex_code (str): The cleaned LaTeX source (see prepare_latex_source).
+
+    Returns:
+        CompileResult: The PDF bytes, the compiler output and the timings.
+
+    Raises:
+        LatexCompilationError: If the document cannot be compiled.
+    """
+    with span('latex_compile'):
+        result = engine.compile(latex_code)
+    # Part of latex_compile: the wait for a free compile worker
+    record_span('latex_queue', result.timings.get('queue_ms', 0) / 1000)
+    return result
+
+
+def compile_latex_to_pdf(latex_code):
+    """
+    Compiles LaTeX source and returns only the PDF content (see compile_latex).
+    """
+    return compile_latex(latex_code).pdf
+
+
+def warm_latex_formats():
+    """
+    Prepares the configured backend, e.g. builds the precompiled template formats.
+
+    Returns:
+        list: The names of the resources that were prepared.
+    """
+    return engine.backend.warm()
+
+
+def get_pdf(latex_code):
+    """
+    Returns the PDF for the given cleaned LaTeX source, served from the PDF cache when possible.
+
+    Raises:
+        LatexCompilationError: If the source is not cached and fails to compile.
+    """
+    return pdf_cache.get_or_compile(latex_code, compile_latex_to_pdf)
@@ -0,0 +1,299 @@
+# core/llm.py
+
+import hashlib
+import importlib.util
+import json
+import logging
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+from .metrics import record_completion, record_span, span
+from .usage import record_usage
+from .ratelimit import acall_with_rate_limit, astream_with_rate_limit, call_with_rate_limit
+
+logger = logging.getLogger(__name__)
+
+# openai and httpx are imported on first use rather than here: they are most of
+# the import time of the app, which every manage.py command and worker pays
+# (see the benchmark_startup command).
+
+# The process-wide clients, created on first use by get_openai_client / get_async_openai_client
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _client_options():
+    """
+    Returns the options shared by both OpenAI clients and their connection pools.
+    """
+    import httpx
+
+    http2 = settings.OPENAI_HTTP2
+    if http2 and importlib.util.find_spec('h2') is None:
+        logger.warning("OPENAI_HTTP2 is set but the 'h2' package is not installed; using HTTP/1.1.")
+        http2 = False
+    return {
+        'api_key': settings.OPENAI_API_KEY,
+        'base_url': settings.OPENAI_BASE_URL,
+        # Retries are done by core.ratelimit, within the shared budgets
+        'max_retries': 0,
+        # Default deadline of a call; document_request and the job details request set their own
+        'timeout': httpx.Timeout(settings.OPENAI_READ_TIMEOUT, connect=settings.OPENAI_CONNECT_TIMEOUT),
+        'http_client_options': {
+            'limits': httpx.Limits(
+                max_connections=settings.OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.OPENAI_KEEPALIVE_EXPIRY,
+            ),
+            'http2': http2,
+        },
+    }
+
+
+def get_openai_client():
+    """
+    Returns the OpenAI client shared by every synchronous LLM call of the process.
+
+    All calls go through one connection pool, configured by the OPENAI_* connection
+    settings, so connections (and their TLS handshakes) are kept alive and reused.
+    """
+    with _clients_lock:
+        if 'sync' not in _clients:
+            from openai import DefaultHttpxClient, OpenAI
+
+            options = _client_options()
+            _clients['sync'] = OpenAI(
+                api_key=options['api_key'],
+                base_url=options['base_url'],
+                max_retries=options['max_retries'],
+                timeout=options['timeout'],
+                http_client=DefaultHttpxClient(**options['http_client_options']),
+            )
+        return _clients['sync']
+
+
+def get_async_openai_client():
+    """
+    Returns the AsyncOpenAI client shared by every async LLM call of the process.
+    """
+    with _clients_lock:
+        if 'async' not in _clients:
+            from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+            options = _client_options()
+            _clients['async'] = AsyncOpenAI(
+                api_key=options['api_key'],
+                base_url=options['base_url'],
+                max_retries=options['max_retries'],
+                timeout=options['timeout'],
+                http_client=DefaultAsyncHttpxClient(**options['http_client_options']),
+            )
+        return _clients['async']
+
+
+def _call_timeout(timeout):
+    import httpx
+    import openai
+
+    if timeout is None:
+        return openai.NOT_GIVEN
+    return httpx.Timeout(timeout, connect=settings.OPENAI_CONNECT_TIMEOUT)
+
+
+def completion_cache_key(model, messages, response_format, temperature):
+    """
+    Builds the response cache key of a structured completion request.
+
+    Args:
+        model (str): The model name.
+        messages (list): The chat messages, including the system prompt.
+        response_format (type): The Pydantic model the response is parsed into.
+        temperature (float): The sampling temperature.
+
+    Returns:
+        str: A key derived from the SHA-256 of the canonical request.
+    """
+    payload = json.dumps(
+        {
+            'model': model,
+            'messages': messages,
+            'schema': response_format.model_json_schema(),
+            'temperature': temperature,
+        },
+        sort_keys=True,
+        separators=(',', ':'),
+    )
+    return f"completion:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+
+def get_cached_completion(model, messages, response_format, temperature):
+    """
+    Returns the cached parsed response of a request, or None when there is none or
+    the response cache is disabled.
+    """
+    if not settings.LLM_RESPONSE_CACHE_ENABLED:
+        return None
+    cached = caches['llm_responses'].get(completion_cache_key(model, messages, response_format, temperature))
+    if cached is None:
+        return None
+    logger.debug(f"LLM response cache hit for {response_format.__name__}.")
+    return response_format.model_validate(cached)
+
+
+def cache_completion(model, messages, response_format, temperature, parsed):
+    """
+    Stores a parsed response in the response cache, if it is enabled.
+    """
+    if settings.LLM_RESPONSE_CACHE_ENABLED:
+        key = completion_cache_key(model, messages, response_format, temperature)
+        caches['llm_responses'].set(key, parsed.model_dump())
+
+
+def parse_completion(client, model, messages, response_format, max_tokens, temperature, bypass_cache=False,
+                     timeout=None):
+    """
+    Requests a structured completion and returns the parsed response.
+
+    When settings.LLM_RESPONSE_CACHE_ENABLED is set, responses are stored in the
+    'llm_responses' cache and identical requests are answered from it. Pass
+    bypass_cache=True to always call the API (the fresh response still replaces the
+    cached one).
+
+    Args:
+        client (OpenAI): The client used for the API call.
+        model (str): The model name.
+        messages (list): The chat messages.
+        response_format (type): The Pydantic model the response is parsed into.
+        max_tokens (int): The completion token limit.
+        temperature (float): The sampling temperature.
+        bypass_cache (bool): Skip the cache lookup for this call.
+        timeout (float): The deadline of the API call in seconds; the client's default if None.
+
+    Returns:
+        BaseModel: An instance of response_format.
+    """
+    if not bypass_cache:
+        cached = get_cached_completion(model, messages, response_format, temperature)
+        if cached is not None:
+            return cached
+
+    # Sent within the shared rate limit budgets, retried on 429 and 5xx
+    start = time.perf_counter()
+    with span('completion'):
+        response = call_with_rate_limit(
+            lambda: client.beta.chat.completions.parse(
+                model=model,
+                messages=messages,
+                response_format=response_format,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                timeout=_call_timeout(timeout),
+            ),
+            messages,
+            max_tokens,
+        )
+    record_completion(model, response_format, getattr(response, 'usage', None))
+    record_usage(model, response_format, getattr(response, 'usage', None), time.perf_counter() - start)
+
+    # Extract the parsed response using the Pydantic model
+    parsed = response.choices[0].message.parsed
+
+    cache_completion(model, messages, response_format, temperature, parsed)
+    return parsed
+
+
+async def aparse_completion(async_client, model, messages, response_format, max_tokens, temperature,
+                            bypass_cache=False, timeout=None):
+    """
+    Async version of parse_completion, for use with an AsyncOpenAI client.
+    """
+    if not bypass_cache:
+        cached = await sync_to_async(get_cached_completion, thread_sensitive=False)(
+            model, messages, response_format, temperature
+        )
+        if cached is not None:
+            return cached
+
+    start = time.perf_counter()
+    with span('completion'):
+        response = await acall_with_rate_limit(
+            lambda: async_client.beta.chat.completions.parse(
+                model=model,
+                messages=messages,
+                response_format=response_format,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                timeout=_call_timeout(timeout),
+            ),
+            messages,
+            max_tokens,
+        )
+    record_completion(model, response_format, getattr(response, 'usage', None))
+    record_usage(model, response_format, getattr(response, 'usage', None), time.perf_counter() - start)
+
+    # Extract the parsed response using the Pydantic model
+    parsed = response.choices[0].message.parsed
+
+    await sync_to_async(cache_completion, thread_sensitive=False)(model, messages, response_format, temperature, parsed)
+    return parsed
+
+
+async def astream_completion(async_client, model, messages, response_format, max_tokens, temperature,
+                             bypass_cache=False, timeout=None):
+    """
+    Streams a structured completion.
+
+    Yields ('delta', text) for every chunk of generated content, then a final
+    ('parsed', response) with the parsed response. A cached response is yielded
+    directly as ('parsed', response), without deltas.
+
+    Args:
+        async_client (AsyncOpenAI): The client used for the API call.
+        (The other arguments are those of parse_completion.)
+    """
+    if not bypass_cache:
+        cached = await sync_to_async(get_cached_completion, thread_sensitive=False)(
+            model, messages, response_format, temperature
+        )
+        if cached is not None:
+            yield 'parsed', cached
+            return
+
+    # Only the time spent awaiting the stream (rate limit waits and retries included)
+    # is recorded; the time the consumer takes between deltas is left out
+    seconds = 0.0
+    completion = None
+    resumed = time.perf_counter()
+    async for kind, value in astream_with_rate_limit(
+        lambda: async_client.beta.chat.completions.stream(
+            model=model,
+            messages=messages,
+            response_format=response_format,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            timeout=_call_timeout(timeout),
+            # The usage comes in a last chunk, for core.usage
+            stream_options={'include_usage': True},
+        ),
+        lambda stream: stream.get_final_completion(),
+        messages,
+        max_tokens,
+    ):
+        seconds += time.perf_counter() - resumed
+        if kind == 'result':
+            completion = value
+        elif value.type == 'content.delta':
+            yield 'delta', value.delta
+        resumed = time.perf_counter()
+    seconds += time.perf_counter() - resumed
+
+    record_span('completion', seconds)
+    record_completion(model, response_format, getattr(completion, 'usage', None))
+    record_usage(model, response_format, getattr(completion, 'usage', None), seconds)
+    parsed = completion.choices[0].message.parsed
+    await sync_to_async(cache_completion, thread_sensitive=False)(model, messages, response_format, temperature, parsed)
+    yield 'parsed', parsed
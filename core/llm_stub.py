@@ -0,0 +1,238 @@
+# core/llm_stub.py
+
+import json
+import logging
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .batch_api import placeholder_completion
+from .templates import cv_template, cover_letter_template
+
+logger = logging.getLogger(__name__)
+
+# Canned answers of the stub, by response format (the Pydantic model name of the request)
+STUB_JOB_DETAILS = {'job_title': 'Data Analyst', 'company': 'Acme Corp'}
+
+STUB_CV_CONTENT = {
+    'summary': (
+        "Data analyst with experience turning customer data into decisions, from SQL pipelines "
+        "to dashboards and A/B tests that changed how products are built."
+    ),
+    'experience': [
+        {'index': 0, 'bullets': [
+            "Built Tableau dashboards used by 40 stakeholders, cutting weekly reporting time by 60%.",
+            "Designed and analyzed A/B tests on onboarding flows, lifting activation by 8%.",
+        ]},
+    ],
+    'flexible_title': 'Projects',
+    'flexible_items': [
+        {'label': 'Churn Model', 'content': "Predicted customer churn with gradient boosting (AUC 0.87)."},
+    ],
+}
+
+STUB_COVER_LETTER_CONTENT = {
+    'recipient': 'Hiring Manager',
+    'company': 'Acme Corp',
+    'paragraphs': [
+        "I am excited to apply for the Data Analyst position at Acme Corp.",
+        "In my current role I build dashboards and run experiments that shape product decisions.",
+        "I would welcome the chance to bring the same rigour to your analytics team.",
+    ],
+}
+
+
+def stub_completion(body):
+    """
+    Returns the content of the stub's answer to a chat completion request: a canned
+    document or job details matching the requested response format, and a placeholder
+    for any other format.
+
+    Args:
+        body (dict): The JSON body of the request.
+
+    Returns:
+        str: The JSON content of the assistant message.
+    """
+    response_format = body.get('response_format') or {}
+    name = response_format.get('json_schema', {}).get('name', '')
+    user_prompt = ' '.join(str(message.get('content', '')) for message in body.get('messages', [])[1:])
+    # The document prompts say which document they ask for in their first lines
+    is_cover_letter = 'cover letter' in user_prompt[:400].lower()
+
+    if name == 'JobDetails':
+        return json.dumps(STUB_JOB_DETAILS)
+    if name in ('LatexOutput', 'FastLatexOutput'):
+        content = {'latex_code': cover_letter_template if is_cover_letter else cv_template}
+    elif name in ('CVContent', 'FastCVContent'):
+        content = dict(STUB_CV_CONTENT)
+    elif name in ('CoverLetterContent', 'FastCoverLetterContent'):
+        content = dict(STUB_COVER_LETTER_CONTENT)
+    else:
+        return placeholder_completion(body)
+    if name.startswith('Fast'):
+        content.update(STUB_JOB_DETAILS)
+    return json.dumps(content)
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logger.debug(f"LLM stub: {format % args}")
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._send_json(400, {'error': {'message': "Invalid JSON body.", 'type': 'invalid_request_error'}})
+            return
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': f"Unknown path {self.path}.", 'type': 'invalid_request_error'}})
+            return
+        self.server.stub.handle_completion(self, body)
+
+
+class StubLLMServer:
+    """
+    A local OpenAI-compatible server answering chat completions with canned responses,
+    for running the generation pipeline without network or API costs.
+
+    Each answer is delayed like a model's: `latency` seconds until the first token,
+    then the completion's tokens at `tokens_per_second` (0 answers at once). Streamed
+    requests get their content in chunks at that rate.
+
+    Usage:
+        with StubLLMServer(latency=0.5, tokens_per_second=80) as stub:
+            # Point settings.OPENAI_BASE_URL at stub.base_url
+            ...
+    """
+
+    def __init__(self, latency=0.5, tokens_per_second=80.0, host='127.0.0.1', port=0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self._server = ThreadingHTTPServer((host, port), _StubHandler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread = None
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='llm-stub', daemon=True)
+        self._thread.start()
+        logger.info(f"LLM stub listening on {self.base_url}.")
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def stats(self):
+        """
+        Returns the number of requests answered and the most served at once.
+        """
+        with self._lock:
+            return {'requests': self.requests, 'max_in_flight': self.max_in_flight}
+
+    def _generation_seconds(self, completion_tokens):
+        if not self.tokens_per_second:
+            return 0.0
+        return completion_tokens / self.tokens_per_second
+
+    def handle_completion(self, handler, body):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            content = stub_completion(body)
+            # Same estimate as core.ratelimit: about four characters per token
+            prompt_tokens = sum(len(str(message.get('content', ''))) for message in body.get('messages', [])) // 4
+            completion_tokens = max(1, len(content) // 4)
+            completion_id = f"chatcmpl-stub-{uuid.uuid4().hex[:12]}"
+            usage = {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+            }
+            time.sleep(self.latency)
+            if body.get('stream'):
+                self._stream(handler, body, completion_id, content, usage)
+            else:
+                time.sleep(self._generation_seconds(completion_tokens))
+                handler._send_json(200, {
+                    'id': completion_id,
+                    'object': 'chat.completion',
+                    'created': int(time.time()),
+                    'model': body.get('model', 'stub'),
+                    'choices': [{
+                        'index': 0,
+                        'message': {'role': 'assistant', 'content': content, 'refusal': None},
+                        'finish_reason': 'stop',
+                        'logprobs': None,
+                    }],
+                    'usage': usage,
+                })
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def _stream(self, handler, body, completion_id, content, usage):
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'text/event-stream')
+        handler.send_header('Connection', 'close')
+        handler.end_headers()
+        handler.close_connection = True
+
+        def send_chunk(delta, finish_reason=None, chunk_usage=None):
+            chunk = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': body.get('model', 'stub'),
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason, 'logprobs': None}]
+                if delta is not None else [],
+            }
+            if chunk_usage is not None:
+                chunk['usage'] = chunk_usage
+            handler.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            handler.wfile.flush()
+
+        # Chunks of about ten tokens
+        chunk_chars = 40
+        send_chunk({'role': 'assistant', 'content': ''})
+        for start in range(0, len(content), chunk_chars):
+            piece = content[start:start + chunk_chars]
+            time.sleep(self._generation_seconds(len(piece) / 4))
+            send_chunk({'content': piece})
+        send_chunk({}, finish_reason='stop')
+        if (body.get('stream_options') or {}).get('include_usage'):
+            send_chunk(None, chunk_usage=usage)
+        handler.wfile.write(b"data: [DONE]\n\n")
+        handler.wfile.flush()
@@ -0,0 +1,115 @@
+# core/log.py
+
+import atexit
+import copy
+import json
+import logging
+import queue
+import random
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from django.conf import settings
+
+
+def truncate_payload(text, limit=None):
+    """
+    Cuts a large payload (compiler output, LaTeX code, a model response) for logging.
+
+    Args:
+        text (str): The payload.
+        limit (int): The characters kept; settings.LOG_PAYLOAD_MAX_CHARS by default.
+
+    Returns:
+        str: The payload, or its beginning followed by the number of characters cut.
+    """
+    limit = settings.LOG_PAYLOAD_MAX_CHARS if limit is None else limit
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... [{len(text) - limit} more characters]"
+
+
+def log_payload(logger, level, message, payload):
+    """
+    Logs a message with a large payload, truncated unless the record is sampled.
+
+    Nothing is decoded or formatted when the level is disabled. A share of
+    settings.LOG_PAYLOAD_SAMPLE_RATE of the payloads is logged in full.
+
+    Args:
+        logger (Logger): The logger.
+        level (int): The level, e.g. logging.DEBUG.
+        message (str): What the payload is.
+        payload (str or bytes): The payload; bytes are decoded as UTF-8.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    if isinstance(payload, bytes):
+        payload = payload.decode('utf-8', errors='replace')
+    if random.random() >= settings.LOG_PAYLOAD_SAMPLE_RATE:
+        payload = truncate_payload(payload)
+    logger.log(level, f"{message} ({len(payload)} characters):\n{payload}")
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as one JSON object per line, for log collectors.
+    """
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'thread': record.threadName,
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class QueueStreamHandler(QueueHandler):
+    """
+    Writes records to a stream from a background thread, so logging never blocks the
+    thread that logs on console or pipe I/O.
+
+    Records are formatted on the background thread too. When the queue is full (the
+    stream cannot keep up), records are dropped rather than waited for, and counted
+    in `dropped`.
+    """
+
+    def __init__(self, stream=None, maxsize=10000):
+        super().__init__(queue.Queue(maxsize))
+        self.target = logging.StreamHandler(stream)
+        self.dropped = 0
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+        self._started = True
+        atexit.register(self.close)
+
+    def setFormatter(self, fmt):
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Only merge the arguments now: formatting is left to the listener's thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        # Called by logging.shutdown and atexit: only the first call stops the listener
+        if self._started:
+            self._started = False
+            try:
+                self.listener.stop()
+            except queue.Full:
+                pass
+        super().close()
@@ -0,0 +1,75 @@
+# core/management/commands/benchmark_generation.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmarks import SCENARIOS, run_load_scenario, stub_llm, throwaway_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs load scenarios against the generation pipeline, with a local stub in place of "
+        "the OpenAI API, and reports latency percentiles, throughput and worker utilization."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'scenarios',
+            nargs='*',
+            help=f"Scenarios to run, among {', '.join(SCENARIOS)} (default: all).",
+        )
+        parser.add_argument('--requests', type=int, default=10, help="Generations of the single and bulk scenarios.")
+        parser.add_argument('--users', type=int, default=50, help="Simultaneous users of the concurrent scenario.")
+        parser.add_argument('--concurrency', type=int, help="Worker threads of the bulk scenario.")
+        parser.add_argument('--fast-mode', action='store_true', help="Use the low-latency pipeline.")
+        parser.add_argument('--cv-only', action='store_true', help="Generate CVs only, without cover letters.")
+        parser.add_argument('--latency', type=float, default=0.5, help="Stub seconds until the first token.")
+        parser.add_argument('--tokens-per-second', type=float, default=80.0, help="Stub output rate (0: instant).")
+        parser.add_argument('--rpm', type=int, help="Requests per minute budget during the run (0: unlimited).")
+        parser.add_argument('--tpm', type=int, help="Tokens per minute budget during the run (0: unlimited).")
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['users'] < 1:
+            raise CommandError("--requests and --users must be at least 1.")
+        scenarios = options['scenarios'] or list(SCENARIOS)
+        unknown = [scenario for scenario in scenarios if scenario not in SCENARIOS]
+        if unknown:
+            raise CommandError(f"Unknown scenario(s): {', '.join(unknown)}.")
+        generation_types = ['cv'] if options['cv_only'] else ['cv', 'cover_letter']
+
+        results = []
+        with stub_llm(
+            latency=options['latency'],
+            tokens_per_second=options['tokens_per_second'],
+            requests_per_minute=options['rpm'],
+            tokens_per_minute=options['tpm'],
+        ) as stub:
+            self.stdout.write(f"LLM stub at {stub.base_url}")
+            for scenario in scenarios:
+                self.stdout.write(f"Running {scenario}...")
+                # Each scenario starts from an empty database, destroyed once it is measured
+                with throwaway_database():
+                    results.append(run_load_scenario(
+                        scenario,
+                        requests=options['requests'],
+                        users=options['users'],
+                        concurrency=options['concurrency'],
+                        generation_types=generation_types,
+                        fast_mode=options['fast_mode'],
+                    ))
+            stats = stub.stats()
+
+        self.stdout.write(
+            f"{'Scenario':<12} {'Requests':>8} {'Errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+            f"{'Req/s':>7} {'Workers':>8}"
+        )
+        for result in results:
+            self.stdout.write(
+                f"{result['scenario']:<12} {result['requests']:>8} {result['errors']:>6} "
+                f"{result['p50_ms']:>8.0f} {result['p95_ms']:>8.0f} {result['p99_ms']:>8.0f} "
+                f"{result['requests_per_second']:>7.2f} {result['worker_utilization']:>8.0%}"
+            )
+            if 'queue_p50_ms' in result:
+                self.stdout.write(f"{'':<12} median wait for a worker: {result['queue_p50_ms']:.0f} ms")
+        self.stdout.write(
+            f"LLM stub: {stats['requests']} request(s), at most {stats['max_in_flight']} at once."
+        )
@@ -0,0 +1,81 @@
+# core/management/commands/benchmark_latex.py
+
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmarks import COMPILE_MODES, compare_to_baseline, compile_corpus, measure_compile
+
+
+class Command(BaseCommand):
+    help = (
+        "Compiles a fixed corpus of LaTeX documents in each compile mode, reports wall time, "
+        "CPU time, peak RSS and PDF size, and fails on regressions against a stored baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=3, help="Timed compilations per document and mode (median).")
+        parser.add_argument(
+            '--documents',
+            nargs='*',
+            help="Corpus documents to compile (default: all of them).",
+        )
+        parser.add_argument(
+            '--modes',
+            nargs='*',
+            default=list(COMPILE_MODES),
+            help="Compile modes, or LatexBackend class paths (default: %(default)s).",
+        )
+        parser.add_argument(
+            '--baseline',
+            default=os.path.join(settings.BASE_DIR, 'latex_benchmark_baseline.json'),
+            help="The baseline file (default: %(default)s).",
+        )
+        parser.add_argument('--save-baseline', action='store_true', help="Store the results as the new baseline.")
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.2,
+            help="Growth over the baseline, as a fraction, that counts as a regression (default: %(default)s).",
+        )
+
+    def handle(self, *args, **options):
+        if options['runs'] < 1:
+            raise CommandError("--runs must be at least 1.")
+        corpus = list(compile_corpus())
+        unknown = [name for name in options['documents'] or [] if name not in corpus]
+        if unknown:
+            raise CommandError(f"Unknown document(s): {', '.join(unknown)}. The corpus has: {', '.join(corpus)}.")
+
+        try:
+            results = measure_compile(options['documents'], options['modes'], options['runs'])
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(f"{'Document/mode':<42} {'Wall ms':>8} {'CPU ms':>8} {'RSS MB':>7} {'PDF KB':>7}")
+        for key, result in results.items():
+            if 'error' in result:
+                self.stdout.write(f"{key:<42} failed: {result['error']}")
+                continue
+            self.stdout.write(
+                f"{key:<42} {result['wall_ms']:>8.0f} {result['cpu_ms']:>8.0f} "
+                f"{result['peak_rss_kb'] / 1024:>7.1f} {result['pdf_bytes'] / 1024:>7.1f}"
+            )
+
+        if options['save_baseline']:
+            with open(options['baseline'], 'w', encoding='utf-8') as baseline_file:
+                json.dump(results, baseline_file, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f"Saved the baseline to {options['baseline']}."))
+            return
+
+        if not os.path.exists(options['baseline']):
+            self.stdout.write(f"No baseline at {options['baseline']}; run with --save-baseline to store one.")
+            return
+        with open(options['baseline'], encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare_to_baseline(results, baseline, options['threshold'])
+        if regressions:
+            raise CommandError("Compilation regressed:\n" + "\n".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regression against the baseline."))
@@ -0,0 +1,48 @@
+# core/management/commands/benchmark_startup.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmarks import LAZY_MODULES, measure_startup
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the import time of a Django process boot with `python -X importtime`, "
+        "and fails if it exceeds a budget or imports modules that should load lazily."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help="Fresh interpreters started; the median is reported.")
+        parser.add_argument('--top', type=int, default=15, help="Number of slowest modules listed.")
+        parser.add_argument('--max-ms', type=float, help="Fail if the median import time exceeds this many milliseconds.")
+        parser.add_argument(
+            '--lazy',
+            nargs='*',
+            default=list(LAZY_MODULES),
+            help="Modules that must not be imported at boot (default: %(default)s).",
+        )
+
+    def handle(self, *args, **options):
+        if options['runs'] < 1:
+            raise CommandError("--runs must be at least 1.")
+        try:
+            result = measure_startup(runs=options['runs'])
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+        runs = ", ".join(f"{total_ms:.0f}" for total_ms in result['runs_ms'])
+        self.stdout.write(f"Import time: {result['total_ms']:.1f} ms (median of {options['runs']} run(s): {runs} ms)")
+        self.stdout.write("Slowest modules (cumulative):")
+        slowest = sorted(result['modules'].items(), key=lambda item: item[1], reverse=True)[:options['top']]
+        for name, cumulative_ms in slowest:
+            self.stdout.write(f"  {cumulative_ms:8.1f} ms  {name}")
+
+        problems = []
+        imported = [name for name in options['lazy'] if name in result['modules']]
+        if imported:
+            problems.append(f"Imported at boot: {', '.join(imported)}")
+        if options['max_ms'] is not None and result['total_ms'] > options['max_ms']:
+            problems.append(f"Import time {result['total_ms']:.1f} ms exceeds the budget of {options['max_ms']:.1f} ms")
+        if problems:
+            raise CommandError("; ".join(problems))
+        self.stdout.write(self.style.SUCCESS("Startup within budget."))
@@ -0,0 +1,95 @@
+# core/management/commands/generate_bulk.py
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from core.bulk import (
+    INPUT_FORMATS,
+    BulkInputError,
+    create_generation_batch,
+    detect_input_format,
+    parse_job_descriptions,
+    run_batch,
+    write_batch_zip,
+)
+from core.batch_api import submit_batch
+from core.usage import TokenBudgetExceeded, check_token_budget
+
+
+class Command(BaseCommand):
+    help = "Generates documents for every job description in a text, CSV or JSON Lines file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help="The user whose profile is used.")
+        parser.add_argument('path', help="The file with the job descriptions.")
+        parser.add_argument(
+            '--format',
+            choices=INPUT_FORMATS,
+            help="The input format (detected from the file extension by default).",
+        )
+        parser.add_argument('--concurrency', type=int, help="Jobs generated at the same time.")
+        parser.add_argument('--no-cv', action='store_true', help="Do not generate CVs.")
+        parser.add_argument('--no-cover-letter', action='store_true', help="Do not generate cover letters.")
+        parser.add_argument('--fast-mode', action='store_true', help="Use the low-latency pipeline.")
+        parser.add_argument(
+            '--batch-api',
+            action='store_true',
+            help="Submit the batch to the OpenAI Batch API (see the openai_batch command).",
+        )
+        parser.add_argument(
+            '--enqueue',
+            action='store_true',
+            help="Only queue the batch for the generation workers instead of running it here.",
+        )
+        parser.add_argument('--zip', help="Write the compiled PDFs to this ZIP file once done.")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['username']}.")
+        if options['no_cv'] and options['no_cover_letter']:
+            raise CommandError("Nothing to generate.")
+
+        try:
+            with open(options['path'], encoding='utf-8-sig') as input_file:
+                content = input_file.read()
+            job_descriptions = parse_job_descriptions(content, options['format'] or detect_input_format(options['path']))
+        except (OSError, BulkInputError) as e:
+            raise CommandError(str(e))
+        if not job_descriptions:
+            raise CommandError("No job descriptions found.")
+        try:
+            check_token_budget(user)
+        except TokenBudgetExceeded as e:
+            raise CommandError(str(e))
+
+        batch = create_generation_batch(
+            user,
+            job_descriptions,
+            generate_cv=not options['no_cv'],
+            generate_cover_letter=not options['no_cover_letter'],
+            fast_mode=options['fast_mode'],
+            concurrency=options['concurrency'],
+            use_batch_api=options['batch_api'],
+        )
+        self.stdout.write(f"Batch {batch.id}: {len(job_descriptions)} job(s) queued.")
+        if options['batch_api']:
+            try:
+                submit_batch(batch)
+            except TokenBudgetExceeded as e:
+                # The whole batch does not fit in the user's budget: don't keep it
+                batch_id = batch.id
+                batch.delete()
+                raise CommandError(f"Batch {batch_id}: not submitted. {e}")
+            self.stdout.write(f"Batch {batch.id}: submitted as {batch.remote_batch_id}; run `openai_batch poll` to collect it.")
+            return
+        if options['enqueue']:
+            return
+
+        progress = run_batch(batch)
+        self.stdout.write(f"Batch {batch.id}: {progress['done']} done, {progress['failed']} failed.")
+        if options['zip']:
+            with open(options['zip'], 'wb') as archive:
+                count = write_batch_zip(batch, archive)
+            self.stdout.write(f"Wrote {count} PDF(s) to {options['zip']}.")
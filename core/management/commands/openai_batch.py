@@ -0,0 +1,48 @@
+# core/management/commands/openai_batch.py
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.batch_api import pending_batches, poll_batch, submit_batch
+from core.usage import TokenBudgetExceeded
+
+
+class Command(BaseCommand):
+    help = "Submits pending Batch API generation batches, or polls submitted ones and stores their documents."
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['submit', 'poll'])
+        parser.add_argument(
+            '--wait',
+            action='store_true',
+            help="With poll: keep polling until every submitted batch has finished.",
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=60.0,
+            help="Seconds between polls with --wait.",
+        )
+
+    def handle(self, *args, **options):
+        to_submit, submitted = pending_batches()
+        if options['action'] == 'submit':
+            for batch in to_submit:
+                try:
+                    submit_batch(batch)
+                except TokenBudgetExceeded as e:
+                    # Stays pending, to be submitted once the budget allows it
+                    self.stdout.write(self.style.WARNING(f"Batch {batch.id}: not submitted. {e}"))
+                    continue
+                self.stdout.write(f"Batch {batch.id}: submitted as {batch.remote_batch_id}.")
+            return
+
+        while True:
+            for batch in submitted:
+                status = poll_batch(batch)
+                self.stdout.write(f"Batch {batch.id}: {status}")
+            submitted = pending_batches()[1]
+            if not options['wait'] or not submitted.exists():
+                break
+            time.sleep(options['interval'])
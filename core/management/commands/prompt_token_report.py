@@ -0,0 +1,37 @@
+# core/management/commands/prompt_token_report.py
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from core.tokens import SAMPLE_JOB_DESCRIPTION, prompt_token_report, tokenizer_name
+
+
+class Command(BaseCommand):
+    help = "Counts the input tokens of every prompt sent for a user's profile, compared with the former prompt format."
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help="The user whose profile is used.")
+        parser.add_argument('--job-description', help="A file with the job description (a sample posting by default).")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['username']}.")
+
+        job_description = SAMPLE_JOB_DESCRIPTION
+        if options['job_description']:
+            try:
+                with open(options['job_description'], encoding='utf-8-sig') as input_file:
+                    job_description = input_file.read()
+            except OSError as e:
+                raise CommandError(str(e))
+
+        self.stdout.write(f"Tokenizer: {tokenizer_name()}")
+        self.stdout.write(f"{'Prompt':<34} {'Tokens':>8} {'Before':>8} {'Saved':>7} {'Max out':>8}")
+        for row in prompt_token_report(user, job_description):
+            baseline = row['baseline_tokens']
+            before = f"{baseline:>8}" if baseline is not None else f"{'-':>8}"
+            saved = f"{1 - row['tokens'] / baseline:>7.0%}" if baseline else f"{'-':>7}"
+            max_tokens = f"{row['max_tokens']:>8}" if row['max_tokens'] is not None else f"{'-':>8}"
+            self.stdout.write(f"{row['prompt']:<34} {row['tokens']:>8} {before} {saved} {max_tokens}")
@@ -0,0 +1,52 @@
+# core/management/commands/run_generation_worker.py
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.jobs import claim_next_job, run_job
+from core.metrics import serve_metrics
+
+
+class Command(BaseCommand):
+    help = "Processes queued document generation jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help="Seconds to wait between polls when the queue is empty.",
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help="Process the jobs currently queued, then exit.",
+        )
+        parser.add_argument(
+            '--metrics-port',
+            type=int,
+            help="Serve this worker's pipeline metrics (Prometheus format) on this port.",
+        )
+
+    def handle(self, *args, **options):
+        poll_interval = options['poll_interval']
+        self.stdout.write("Generation worker started.")
+        if options['metrics_port']:
+            serve_metrics(options['metrics_port'])
+            self.stdout.write(f"Serving metrics on port {options['metrics_port']}.")
+        try:
+            while True:
+                close_old_connections()
+                job = claim_next_job()
+                if job is None:
+                    if options['once']:
+                        break
+                    time.sleep(poll_interval)
+                    continue
+                job = run_job(job)
+                self.stdout.write(f"Job {job.id}: {job.status}")
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write("Generation worker stopped.")
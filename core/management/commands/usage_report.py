@@ -0,0 +1,44 @@
+# core/management/commands/usage_report.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.usage import REPORT_GROUPS, usage_report
+
+
+class Command(BaseCommand):
+    help = (
+        "Reports the tokens, latency and cost of the LLM calls of the last days, grouped by "
+        "user, day, purpose (prompt) or model, the most expensive first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help="Days covered, today included (default: %(default)s).")
+        parser.add_argument(
+            '--by',
+            choices=list(REPORT_GROUPS),
+            default='user',
+            help="What to group the calls by (default: %(default)s).",
+        )
+        parser.add_argument('--user', help="Only report this user's calls.")
+
+    def handle(self, *args, **options):
+        if options['days'] < 1:
+            raise CommandError("--days must be at least 1.")
+        report = usage_report(options['days'], options['by'], options['user'])
+        if not report:
+            self.stdout.write("No LLM calls recorded in this period.")
+            return
+
+        self.stdout.write(
+            f"{options['by'].title():<30} {'Calls':>6} {'Prompt':>10} {'Completion':>10} {'Total':>10} "
+            f"{'Cost USD':>10} {'Avg ms':>7}"
+        )
+        for row in report:
+            cost = f"{row['cost']:.4f}" if row['cost'] is not None else 'n/a'
+            self.stdout.write(
+                f"{str(row['group']):<30} {row['calls']:>6} {row['prompt_tokens']:>10} "
+                f"{row['completion_tokens']:>10} {row['total_tokens']:>10} {cost:>10} {row['avg_latency_ms']:>7.0f}"
+            )
+        total_cost = sum(row['cost'] or 0 for row in report)
+        total_tokens = sum(row['total_tokens'] for row in report)
+        self.stdout.write(f"Total: {total_tokens} tokens, {total_cost:.4f} USD.")
@@ -0,0 +1,18 @@
+# core/management/commands/warm_latex_formats.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.latex import LatexCompilationError, warm_latex_formats
+
+
+class Command(BaseCommand):
+    help = "Builds the precompiled pdflatex formats of the bundled CV and cover letter preambles."
+
+    def handle(self, *args, **options):
+        try:
+            names = warm_latex_formats()
+        except LatexCompilationError as e:
+            raise CommandError(str(e))
+        for name in names:
+            self.stdout.write(f"Format ready: {name}")
+        self.stdout.write(f"{len(names)} format(s) available.")
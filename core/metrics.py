@@ -0,0 +1,224 @@
+# core/metrics.py
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds of the duration histograms' buckets, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# The metrics of the app: name -> (type, help)
+METRICS = {
+    'autocv_stage_duration_seconds': (
+        'histogram', "Duration of the stages of the generation and PDF pipelines."),
+    'autocv_stage_errors_total': (
+        'counter', "Pipeline stages that raised an exception."),
+    'autocv_llm_requests_total': (
+        'counter', "Completion calls made to the LLM API, by model and response format."),
+    'autocv_llm_tokens_total': (
+        'counter', "Tokens used by completion calls, by model and type (prompt or completion)."),
+    'autocv_http_request_duration_seconds': (
+        'histogram', "Duration of HTTP requests, by URL name and status code."),
+}
+
+# The (stage, milliseconds) spans of the request being served, for the Server-Timing
+# header. Threads and tasks started with a copy of the request's context share the list.
+request_timings = contextvars.ContextVar('request_timings', default=None)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(label_key, extra=()):
+    pairs = list(label_key) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+class MetricsRegistry:
+    """
+    In-process counters and histograms, rendered in the Prometheus text format.
+
+    Each process (web server, generation worker) has its own registry; scrape each of
+    them.
+    """
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters = {}  # (name, label key) -> value
+        self._histograms = {}  # (name, label key) -> [bucket counts, sum, count]
+
+    def inc(self, name, value=1, **labels):
+        """
+        Adds value to a counter.
+        """
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """
+        Records an observation (e.g. a duration in seconds) in a histogram.
+        """
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def value(self, name, **labels):
+        """
+        Returns the value of a counter, or the observation count of a histogram.
+        """
+        key = (name, _label_key(labels))
+        with self._lock:
+            if key in self._histograms:
+                return self._histograms[key][2]
+            return self._counters.get(key, 0)
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self):
+        """
+        Returns every metric in the Prometheus text exposition format (version 0.0.4).
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (list(buckets), total, count) for key, (buckets, total, count) in self._histograms.items()}
+
+        lines = []
+        for name, (metric_type, help_text) in METRICS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            if metric_type == 'counter':
+                for (metric_name, label_key), value in sorted(counters.items()):
+                    if metric_name == name:
+                        lines.append(f"{name}{_format_labels(label_key)} {value}")
+                continue
+            for (metric_name, label_key), (buckets, total, count) in sorted(histograms.items()):
+                if metric_name != name:
+                    continue
+                for bound, bucket_count in zip(self.buckets, buckets):
+                    lines.append(f"{name}_bucket{_format_labels(label_key, [('le', bound)])} {bucket_count}")
+                lines.append(f"{name}_bucket{_format_labels(label_key, [('le', '+Inf')])} {count}")
+                lines.append(f"{name}_sum{_format_labels(label_key)} {total}")
+                lines.append(f"{name}_count{_format_labels(label_key)} {count}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def record_span(stage, seconds, failed=False):
+    """
+    Records the duration of a pipeline stage, and adds it to the current request's timings.
+    """
+    registry.observe('autocv_stage_duration_seconds', seconds, stage=stage)
+    if failed:
+        registry.inc('autocv_stage_errors_total', stage=stage)
+    timings = request_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds * 1000))
+
+
+@contextmanager
+def span(stage):
+    """
+    Times the block as a pipeline stage (see record_span). Also usable around awaits
+    in async code.
+
+    Stages: profile, prompt_build, job_details, completion, db_write, latex_compile,
+    latex_queue and pdf_read.
+    """
+    start = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        record_span(stage, time.perf_counter() - start, failed)
+
+
+def record_completion(model, response_format, usage):
+    """
+    Counts a completion call and its tokens.
+
+    Args:
+        model (str): The model name.
+        response_format (type): The Pydantic model the response was parsed into.
+        usage (CompletionUsage): The usage reported by the API, if any.
+    """
+    registry.inc('autocv_llm_requests_total', model=model, response_format=response_format.__name__)
+    for token_type in ('prompt', 'completion'):
+        tokens = getattr(usage, f'{token_type}_tokens', None)
+        if isinstance(tokens, int):
+            registry.inc('autocv_llm_tokens_total', tokens, model=model, type=token_type)
+
+
+def server_timing_header(timings, total_ms=None):
+    """
+    Builds a Server-Timing header value from (stage, milliseconds) spans.
+
+    Spans of the same stage are summed, in the order the stages first ran; concurrent
+    stages (e.g. the completion calls of one generation) can add up to more than the total.
+    """
+    durations = {}
+    counts = {}
+    for stage, duration_ms in timings:
+        durations[stage] = durations.get(stage, 0.0) + duration_ms
+        counts[stage] = counts.get(stage, 0) + 1
+    entries = []
+    for stage, duration_ms in durations.items():
+        entry = f"{stage};dur={duration_ms:.1f}"
+        if counts[stage] > 1:
+            entry += f';desc="{counts[stage]} calls"'
+        entries.append(entry)
+    if total_ms is not None:
+        entries.append(f"total;dur={total_ms:.1f}")
+    return ', '.join(entries)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        data = registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def serve_metrics(port, host='0.0.0.0'):
+    """
+    Serves the registry on its own port from a background thread, for processes
+    without a web server (e.g. the generation worker).
+
+    Returns:
+        ThreadingHTTPServer: The server; call shutdown() to stop it.
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    return server
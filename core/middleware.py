@@ -0,0 +1,51 @@
+# core/middleware.py
+
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+
+from .metrics import registry, request_timings, server_timing_header
+
+
+def _finish_request(request, response, timings, start):
+    elapsed = time.perf_counter() - start
+    match = getattr(request, 'resolver_match', None)
+    view = match.view_name if match else 'unmatched'
+    registry.observe('autocv_http_request_duration_seconds', elapsed, view=view, status=response.status_code)
+    if settings.SERVER_TIMING_ENABLED:
+        response['Server-Timing'] = server_timing_header(timings, total_ms=elapsed * 1000)
+    return response
+
+
+@sync_and_async_middleware
+def timing_middleware(get_response):
+    """
+    Collects the pipeline spans (core.metrics.span) of each request, records the
+    request's duration, and sends the spans as a Server-Timing header when
+    settings.SERVER_TIMING_ENABLED is set.
+
+    For streamed responses, the header only has the spans before the first byte.
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            start = time.perf_counter()
+            timings = []
+            token = request_timings.set(timings)
+            try:
+                response = await get_response(request)
+            finally:
+                request_timings.reset(token)
+            return _finish_request(request, response, timings, start)
+    else:
+        def middleware(request):
+            start = time.perf_counter()
+            timings = []
+            token = request_timings.set(timings)
+            try:
+                response = get_response(request)
+            finally:
+                request_timings.reset(token)
+            return _finish_request(request, response, timings, start)
+    return middleware
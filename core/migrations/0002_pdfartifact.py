@@ -0,0 +1,26 @@
+# Generated by Django 4.2.16 on 2026-10-18 20:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PDFArtifact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pdf_file', models.FileField(upload_to='artifacts/%Y/%m/')),
+                ('size_bytes', models.PositiveIntegerField()),
+                ('compile_duration_ms', models.PositiveIntegerField()),
+                ('source_hash', models.CharField(db_index=True, max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('generation', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='artifact', to='core.generation')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-18 20:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_generationjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generationjob',
+            name='bypass_cache',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.16 on 2026-10-18 20:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_generationbatch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generationbatch',
+            name='remote_batch_id',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='generationbatch',
+            name='remote_status',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='generationbatch',
+            name='submitted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='generationbatch',
+            name='use_batch_api',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.16 on 2026-10-18 20:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_generationbatch_batch_api'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenerationSection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=20)),
+                ('position', models.PositiveSmallIntegerField()),
+                ('latex', models.TextField()),
+                ('input_hash', models.CharField(blank=True, max_length=64)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('generation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sections', to='core.generation')),
+            ],
+            options={
+                'ordering': ['position'],
+                'unique_together': {('generation', 'key')},
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.16 on 2026-10-18 21:07
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0007_generationsection'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UsageRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('purpose', models.CharField(max_length=50)),
+                ('model', models.CharField(max_length=100)),
+                ('prompt_tokens', models.PositiveIntegerField()),
+                ('completion_tokens', models.PositiveIntegerField()),
+                ('total_tokens', models.PositiveIntegerField()),
+                ('latency_ms', models.PositiveIntegerField()),
+                ('cost', models.DecimalField(blank=True, decimal_places=6, max_digits=12, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('generation', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='usage_records', to='core.generation')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usage_records', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.16 on 2026-10-18 21:29
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def copy_created_at(apps, schema_editor):
+    # Existing artifacts were compiled when they were created
+    PDFArtifact = apps.get_model('core', 'PDFArtifact')
+    PDFArtifact.objects.update(compiled_at=models.F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_usagerecord'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfartifact',
+            name='compiled_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(copy_created_at, migrations.RunPython.noop),
+    ]
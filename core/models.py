@@ -2,6 +2,7 @@
 
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -63,4 +64,112 @@ class Generation(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"{self.get_generation_type_display()} for {self.user.username}"
\ No newline at end of file
+        return f"{self.get_generation_type_display()} for {self.user.username}"
+
+    @property
+    def has_pdf_artifact(self):
+        return hasattr(self, 'artifact')
+
+class GenerationSection(models.Model):
+    """
+    One addressable part of a generated CV's LaTeX code, regenerated on its own when its inputs change.
+    """
+    generation = models.ForeignKey(Generation, on_delete=models.CASCADE, related_name='sections')
+    key = models.CharField(max_length=20)  # e.g. 'preamble', 'summary', 'experience', 'closing'
+    position = models.PositiveSmallIntegerField()
+    latex = models.TextField()
+    input_hash = models.CharField(max_length=64, blank=True)  # SHA-256 of the profile parts it was written from
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['position']
+        unique_together = [('generation', 'key')]
+
+    def __str__(self):
+        return f"{self.key} of {self.generation}"
+
+class PDFArtifact(models.Model):
+    generation = models.OneToOneField(Generation, on_delete=models.CASCADE, related_name='artifact')
+    pdf_file = models.FileField(upload_to='artifacts/%Y/%m/')
+    size_bytes = models.PositiveIntegerField()
+    compile_duration_ms = models.PositiveIntegerField()
+    source_hash = models.CharField(max_length=64, db_index=True)  # SHA-256 of the compiled LaTeX source
+    compiled_at = models.DateTimeField(default=timezone.now)  # When the current PDF was compiled; updated on recompiles
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"PDF for {self.generation}"
+
+class GenerationBatch(models.Model):
+    """
+    Many job descriptions submitted at once, each generated by its own GenerationJob.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='generation_batches')
+    user_info = models.TextField()  # The formatted profile, built once and shared by every job
+    concurrency = models.PositiveIntegerField(default=3)  # Maximum jobs of this batch running at once
+    use_batch_api = models.BooleanField(default=False)  # Generated through the OpenAI Batch API, not the workers
+    remote_batch_id = models.CharField(max_length=100, blank=True)  # Batch ID at the batch service once submitted
+    remote_status = models.CharField(max_length=20, blank=True)  # Last status reported by the batch service
+    submitted_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Generation batch {self.id} for {self.user.username}"
+
+class GenerationJob(models.Model):
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='generation_jobs')
+    batch = models.ForeignKey(GenerationBatch, on_delete=models.CASCADE, related_name='jobs', blank=True, null=True)
+    job_description = models.TextField()
+    generate_cv = models.BooleanField(default=True)
+    generate_cover_letter = models.BooleanField(default=True)
+    fast_mode = models.BooleanField(default=False)
+    bypass_cache = models.BooleanField(default=False)  # Ignore cached LLM responses
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED, db_index=True)
+    result = models.JSONField(blank=True, null=True)  # {'documents': [...], 'errors': [...]} once finished
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Generation job {self.id} for {self.user.username} ({self.status})"
+
+    @property
+    def generation_types(self):
+        generation_types = []
+        if self.generate_cv:
+            generation_types.append('cv')
+        if self.generate_cover_letter:
+            generation_types.append('cover_letter')
+        return generation_types
+
+class UsageRecord(models.Model):
+    """
+    The tokens, latency and cost of one LLM completion call.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='usage_records')
+    # The document the call produced; kept when the document is deleted, so totals stay right
+    generation = models.ForeignKey(
+        Generation, on_delete=models.SET_NULL, related_name='usage_records', blank=True, null=True
+    )
+    purpose = models.CharField(max_length=50)  # The response format, e.g. 'JobDetails', 'CVContent'
+    model = models.CharField(max_length=100)
+    prompt_tokens = models.PositiveIntegerField()
+    completion_tokens = models.PositiveIntegerField()
+    total_tokens = models.PositiveIntegerField()
+    latency_ms = models.PositiveIntegerField()
+    cost = models.DecimalField(max_digits=12, decimal_places=6, blank=True, null=True)  # USD; null if the model has no price
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.purpose} call for {self.user.username} ({self.total_tokens} tokens)"
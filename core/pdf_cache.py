@@ -0,0 +1,173 @@
+# core/pdf_cache.py
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def latex_source_hash(latex_code):
+    """
+    Computes the content address of a LaTeX document.
+
+    Args:
+        latex_code (str): The cleaned LaTeX source, exactly as it is handed to pdflatex.
+
+    Returns:
+        str: The hex SHA-256 digest of the source.
+    """
+    return hashlib.sha256(latex_code.encode('utf-8')).hexdigest()
+
+
+class PDFCache:
+    """
+    On-disk cache of compiled PDFs keyed by the hash of their LaTeX source.
+
+    Entries are stored as ``<sha256>.pdf`` files in ``directory``. The cache is
+    bounded by ``max_bytes``; when a new entry pushes it over the limit the least
+    recently used entries are evicted. A file's mtime is bumped on every hit, so
+    the LRU order survives process restarts and is shared between workers that
+    point at the same directory.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = str(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._index = None  # OrderedDict of key -> size, least recently used first
+        self._total_bytes = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.pdf")
+
+    def _load_index(self):
+        """Builds the in-memory LRU index from the files on disk (lock must be held)."""
+        if self._index is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith('.pdf'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name[:-len('.pdf')], stat.st_size))
+        entries.sort()
+        self._index = OrderedDict((key, size) for _, key, size in entries)
+        self._total_bytes = sum(self._index.values())
+
+    def get(self, latex_code):
+        """
+        Returns the cached PDF for the given LaTeX source, or None on a miss.
+        """
+        key = latex_source_hash(latex_code)
+        path = self._path(key)
+        with self._lock:
+            self._load_index()
+            try:
+                with open(path, 'rb') as pdf_file:
+                    pdf_content = pdf_file.read()
+                os.utime(path)
+            except FileNotFoundError:
+                # Evicted by another worker, or never stored.
+                if key in self._index:
+                    self._total_bytes -= self._index.pop(key)
+                self.misses += 1
+                return None
+
+            if key in self._index:
+                self._index.move_to_end(key)
+            else:
+                # Written by another worker sharing the directory.
+                self._index[key] = len(pdf_content)
+                self._total_bytes += len(pdf_content)
+            self.hits += 1
+        logger.debug(f"PDF cache hit for {key[:12]}.")
+        return pdf_content
+
+    def set(self, latex_code, pdf_content):
+        """
+        Stores a compiled PDF and evicts least recently used entries beyond the size bound.
+        """
+        key = latex_source_hash(latex_code)
+        if len(pdf_content) > self.max_bytes:
+            logger.warning(f"PDF for {key[:12]} ({len(pdf_content)} bytes) exceeds the cache size; not caching.")
+            return
+        with self._lock:
+            self._load_index()
+            # Write to a temporary file first so readers never see a partial PDF.
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as tmp_file:
+                tmp_file.write(pdf_content)
+            os.replace(tmp_path, self._path(key))
+
+            if key in self._index:
+                self._total_bytes -= self._index.pop(key)
+            self._index[key] = len(pdf_content)
+            self._total_bytes += len(pdf_content)
+            self._evict()
+
+    def _evict(self):
+        """Removes least recently used entries until the cache fits (lock must be held)."""
+        while self._total_bytes > self.max_bytes and self._index:
+            key, size = self._index.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            self.evictions += 1
+            logger.debug(f"Evicted {key[:12]} from the PDF cache.")
+
+    def get_or_compile(self, latex_code, compile_func):
+        """
+        Returns the PDF for ``latex_code``, compiling and caching it on a miss.
+
+        Args:
+            latex_code (str): The cleaned LaTeX source.
+            compile_func (callable): Called with ``latex_code`` on a miss; must return the PDF bytes.
+
+        Returns:
+            bytes: The PDF content.
+        """
+        pdf_content = self.get(latex_code)
+        if pdf_content is None:
+            pdf_content = compile_func(latex_code)
+            self.set(latex_code, pdf_content)
+        return pdf_content
+
+    def clear(self):
+        """Deletes every cached PDF and resets the counters."""
+        with self._lock:
+            self._load_index()
+            for key in list(self._index):
+                try:
+                    os.remove(self._path(key))
+                except FileNotFoundError:
+                    pass
+            self._index.clear()
+            self._total_bytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """Returns the hit/miss counters and current size of the cache."""
+        with self._lock:
+            self._load_index()
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._index),
+                'size_bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+
+pdf_cache = PDFCache(settings.PDF_CACHE_DIR, settings.PDF_CACHE_MAX_BYTES)
@@ -0,0 +1,130 @@
+# core/pdf_serving.py
+
+import logging
+import re
+import time
+from calendar import timegm
+
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .metrics import record_span
+
+logger = logging.getLogger(__name__)
+
+RANGE_CHUNK_SIZE = 64 * 1024
+
+_range_re = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def parse_range(range_header, size):
+    """
+    Parses a single-range HTTP Range header.
+
+    Args:
+        range_header (str): The Range header value, e.g. 'bytes=0-1023'.
+        size (int): The size of the file in bytes.
+
+    Returns:
+        tuple: (start, end) with an inclusive end, None if the header should be ignored
+        (malformed or multi-range, so the whole file is served), or False if the range
+        cannot be satisfied.
+    """
+    match = _range_re.match(range_header.strip())
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # Suffix range: the last N bytes
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    if start >= size:
+        return False
+    end = int(end) if end else size - 1
+    if start > end:
+        return None
+    return start, min(end, size - 1)
+
+
+def _read_range(pdf_file, start, length):
+    # Only the reads are timed (as pdf_read), not the client consuming the chunks
+    read_seconds = 0.0
+    try:
+        read_start = time.perf_counter()
+        pdf_file.seek(start)
+        while length > 0:
+            chunk = pdf_file.read(min(RANGE_CHUNK_SIZE, length))
+            read_seconds += time.perf_counter() - read_start
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+            read_start = time.perf_counter()
+    finally:
+        pdf_file.close()
+        record_span('pdf_read', read_seconds)
+
+
+def pdf_artifact_response(request, artifact, filename, as_attachment=False):
+    """
+    Serves a stored PDF artifact without reading it into memory.
+
+    Sets ETag (the hash of the LaTeX source) and Last-Modified (the last compile time),
+    answers If-None-Match / If-Modified-Since with 304 Not Modified, and answers
+    single-range Range requests with 206 Partial Content.
+
+    Args:
+        request (HttpRequest): The request.
+        artifact (PDFArtifact): The artifact to serve.
+        filename (str): The filename given in Content-Disposition.
+        as_attachment (bool): Ask the browser to download the file instead of displaying it.
+
+    Returns:
+        HttpResponse: A 200, 206, 304 or 416 response.
+    """
+    etag = quote_etag(artifact.source_hash)
+    last_modified = timegm(artifact.compiled_at.utctimetuple())
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        size = artifact.pdf_file.size
+        byte_range = None
+        range_header = request.headers.get('Range')
+        # A stale If-Range means the client's partial copy is outdated: send the whole file
+        if range_header and request.headers.get('If-Range', etag) == etag:
+            byte_range = parse_range(range_header, size)
+
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+        elif byte_range is not None:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                _read_range(artifact.pdf_file.open('rb'), start, end - start + 1),
+                status=206,
+                content_type='application/pdf',
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(end - start + 1)
+            disposition = 'attachment' if as_attachment else 'inline'
+            response['Content-Disposition'] = f'{disposition}; filename="{filename}"'
+        else:
+            response = FileResponse(
+                artifact.pdf_file.open('rb'),
+                as_attachment=as_attachment,
+                filename=filename,
+                content_type='application/pdf',
+            )
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Accept-Ranges'] = 'bytes'
+    # Browsers keep the PDF but revalidate it, which costs a 304 when it is unchanged
+    response['Cache-Control'] = 'private, no-cache'
+    return response
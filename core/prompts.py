@@ -160,3 +160,114 @@ You are an expert AI assistant specializing in creating world-class, one-page pr
 
 """
 
+
+def generate_cv_prompt_fast(user_info, job_description, cv_template_skeleton):
+    return f"""
+Write a one-page LaTeX CV tailored to the job description, using only the user's information.
+
+**User Information:**
+
+{user_info}
+
+**Job Description:**
+
+{job_description}
+
+**LaTeX Skeleton:**
+
+{cv_template_skeleton}
+
+**Instructions:**
+- Fill the skeleton, repeating blocks as needed; keep its preamble and formatting unchanged.
+- Sections: Summary, Education, Experience (3-5 bullets per role, action verbs, metrics), Skills, and a last section with Projects and/or Publications, whichever fits the job.
+- Do not invent information. Escape LaTeX special characters (%, #, &, _). The code must compile with pdflatex.
+- Also return the job title and company name from the job description.
+"""
+
+def generate_cover_letter_prompt_fast(user_info, job_description, cover_letter_template_skeleton):
+    return f"""
+Write a one-page LaTeX cover letter tailored to the job description, using only the user's information.
+
+**User Information:**
+
+{user_info}
+
+**Job Description:**
+
+{job_description}
+
+**LaTeX Skeleton:**
+
+{cover_letter_template_skeleton}
+
+**Instructions:**
+- Fill the skeleton; keep its preamble and formatting unchanged.
+- 3-4 concise paragraphs: why this role and company, 1-2 specific examples matching the requirements, a closing that thanks the reader.
+- Formal tone. Do not invent information. Escape LaTeX special characters (%, #, &, _). The code must compile with pdflatex.
+- Also return the job title and company name from the job description.
+"""
+
+def generate_cv_section_prompt(section_title, section_info, job_description, current_section):
+    return f"""
+Rewrite one section of a one-page LaTeX CV tailored to the job description, using only the user's information below.
+
+**Section:** {section_title}
+
+**User Information (for this section):**
+
+{section_info}
+
+**Job Description:**
+
+{job_description}
+
+**Current LaTeX of the Section:**
+
+{current_section}
+
+**Instructions:**
+- Return only the LaTeX of this section, in the same structure and formatting as the current version (same heading, commands and environments). Do not return a preamble, other sections or \\begin{{document}}.
+- Update the content to match the user information; keep what is still accurate.
+- Use action verbs and metrics where the information allows. Do not invent information.
+- Escape LaTeX special characters (%, #, &, _). The section must compile with pdflatex within the existing document.
+"""
+
+def generate_cv_content_prompt(user_info, job_description, include_job_details=False):
+    job_details = "\n- Also return the job title and company name from the job description." if include_job_details else ""
+    return f"""
+Write the tailored content of a one-page CV for the job description, using only the user's information. The layout, contact details, education, dates and skills are filled in from the profile; write only the parts below, as plain text (no LaTeX).
+
+**User Information:**
+
+{user_info}
+
+**Job Description:**
+
+{job_description}
+
+**Instructions:**
+- summary: a 2-4 sentence professional summary aimed at this role.
+- experience: for each entry of the user's experience list, its index (0 for the first entry) and 3-5 bullets starting with an action verb, with metrics where the information allows; more bullets for the most relevant roles.
+- flexible_title and flexible_items: the last section, Projects, Publications or both (e.g. "Projects and Publications"), whichever fits the job; each item has a short label (e.g. "Projects") and its content.
+- Do not invent information.{job_details}
+"""
+
+def generate_cover_letter_content_prompt(user_info, job_description, include_job_details=False):
+    job_details = "\n- Also return the job title from the job description." if include_job_details else ""
+    return f"""
+Write the body of a one-page cover letter for the job description, using only the user's information. The letterhead, salutation and closing are filled in from the profile; write only the parts below, as plain text (no LaTeX).
+
+**User Information:**
+
+{user_info}
+
+**Job Description:**
+
+{job_description}
+
+**Instructions:**
+- recipient: the contact person named in the job description, or "Hiring Manager".
+- company: the company name.
+- paragraphs: 3-4 concise paragraphs: why this role and company, 1-2 specific examples matching the requirements, and a closing that thanks the reader.
+- Formal tone. Do not invent information.{job_details}
+"""
@@ -0,0 +1,332 @@
+# core/ratelimit.py
+
+import asyncio
+import contextvars
+import itertools
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from .metrics import record_span
+
+logger = logging.getLogger(__name__)
+
+# The user on whose behalf LLM calls are made, used to share the budget fairly
+current_user_key = contextvars.ContextVar('rate_limit_user_key', default=None)
+
+# Seconds between checks of an async waiter that is not at the front of the queue
+ASYNC_POLL_INTERVAL = 0.05
+
+
+@contextmanager
+def rate_limit_user(user_key):
+    """
+    Attributes the LLM calls made inside the block to a user, for fair queuing.
+
+    Context variables are not inherited by ThreadPoolExecutor threads: submit work
+    with contextvars.copy_context().run to keep the attribution.
+    """
+    token = current_user_key.set(user_key)
+    try:
+        yield
+    finally:
+        current_user_key.reset(token)
+
+
+def estimate_tokens(messages, max_tokens):
+    """
+    Estimates the tokens a request counts against the tokens-per-minute budget:
+    roughly one token per four characters of prompt, plus the completion limit.
+    """
+    prompt_chars = sum(len(message.get('content') or '') for message in messages)
+    return prompt_chars // 4 + max_tokens
+
+
+class _Ticket:
+    __slots__ = ('user_key', 'tokens')
+
+    def __init__(self, user_key, tokens):
+        self.user_key = user_key
+        self.tokens = tokens
+
+
+class RateLimiter:
+    """
+    Shares requests-per-minute and tokens-per-minute budgets between all LLM calls of
+    the process.
+
+    Both budgets are token buckets that refill continuously. Waiting calls are queued
+    per user and served round-robin across users, so one user's bulk run cannot starve
+    everyone else. A budget of 0 disables that limit.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute, clock=time.monotonic):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._clock = clock
+        self._condition = threading.Condition()
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._refilled_at = clock()
+        self._paused_until = 0.0
+        # user key -> queue of waiting tickets, in the order users take turns
+        self._queues = OrderedDict()
+        self._anonymous = itertools.count()
+
+    def _refill(self, now):
+        elapsed = now - self._refilled_at
+        self._refilled_at = now
+        if self.requests_per_minute:
+            self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+        if self.tokens_per_minute:
+            self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    def _enqueue(self, user_key, tokens):
+        if user_key is None:
+            # Calls without a user each get their own turn
+            user_key = f"anonymous-{next(self._anonymous)}"
+        if self.tokens_per_minute:
+            # A request larger than the whole budget would never fit; let it through once the bucket is full
+            tokens = min(tokens, self.tokens_per_minute)
+        ticket = _Ticket(user_key, tokens)
+        self._queues.setdefault(user_key, deque()).append(ticket)
+        return ticket
+
+    def _dequeue(self, ticket):
+        queue = self._queues[ticket.user_key]
+        queue.remove(ticket)
+        del self._queues[ticket.user_key]
+        if queue:
+            # The user had more waiting calls: they go to the back of the round
+            self._queues[ticket.user_key] = queue
+
+    def _try_grant(self, ticket):
+        """
+        Grants the ticket if it is its turn and the budgets allow it.
+
+        Returns:
+            float: 0 if granted, otherwise the seconds until the budgets could allow it,
+            or None if other tickets are ahead of it.
+        """
+        now = self._clock()
+        self._refill(now)
+        first_user = next(iter(self._queues))
+        if first_user != ticket.user_key or self._queues[first_user][0] is not ticket:
+            return None
+        if now < self._paused_until:
+            return self._paused_until - now
+
+        wait = 0.0
+        if self.requests_per_minute and self._requests < 1:
+            wait = max(wait, (1 - self._requests) * 60 / self.requests_per_minute)
+        if self.tokens_per_minute and self._tokens < ticket.tokens:
+            wait = max(wait, (ticket.tokens - self._tokens) * 60 / self.tokens_per_minute)
+        if wait > 0:
+            return wait
+
+        if self.requests_per_minute:
+            self._requests -= 1
+        if self.tokens_per_minute:
+            self._tokens -= ticket.tokens
+        self._dequeue(ticket)
+        self._condition.notify_all()
+        return 0
+
+    def acquire(self, user_key, tokens):
+        """
+        Blocks until a request of the given estimated size may be sent.
+
+        Returns:
+            float: The seconds spent waiting.
+        """
+        start = self._clock()
+        with self._condition:
+            ticket = self._enqueue(user_key, tokens)
+            try:
+                while True:
+                    wait = self._try_grant(ticket)
+                    if wait == 0:
+                        return self._clock() - start
+                    self._condition.wait(wait if wait is not None else 1.0)
+            except BaseException:
+                if ticket in self._queues.get(ticket.user_key, ()):
+                    self._dequeue(ticket)
+                    self._condition.notify_all()
+                raise
+
+    async def aacquire(self, user_key, tokens):
+        """
+        Async version of acquire, which waits without blocking the event loop.
+        """
+        start = self._clock()
+        with self._condition:
+            ticket = self._enqueue(user_key, tokens)
+        try:
+            while True:
+                with self._condition:
+                    wait = self._try_grant(ticket)
+                if wait == 0:
+                    return self._clock() - start
+                await asyncio.sleep(wait if wait is not None else ASYNC_POLL_INTERVAL)
+        except BaseException:
+            with self._condition:
+                if ticket in self._queues.get(ticket.user_key, ()):
+                    self._dequeue(ticket)
+                    self._condition.notify_all()
+            raise
+
+    def pause(self, seconds):
+        """
+        Holds back every call for the given time, e.g. after the API answered 429.
+        """
+        with self._condition:
+            self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+
+limiter = RateLimiter(settings.OPENAI_REQUESTS_PER_MINUTE, settings.OPENAI_TOKENS_PER_MINUTE)
+
+
+def retry_delay(error, attempt):
+    """
+    Returns the seconds to wait before retrying a failed API call, or None if it
+    should not be retried.
+
+    429 and 5xx responses are retried with full-jitter exponential backoff, waiting
+    at least as long as the Retry-After header asks for.
+    """
+    # Imported here to keep openai out of the startup path (see core.llm)
+    import openai
+
+    if not isinstance(error, openai.APIStatusError):
+        return None
+    if error.status_code != 429 and error.status_code < 500:
+        return None
+    if attempt >= settings.OPENAI_MAX_RETRIES:
+        return None
+    delay = random.uniform(0, min(settings.OPENAI_BACKOFF_MAX, settings.OPENAI_BACKOFF_BASE * 2 ** attempt))
+    try:
+        delay = max(delay, float(error.response.headers.get('retry-after', 0)))
+    except ValueError:
+        pass
+    return delay
+
+
+def _log_retry(error, attempt, delay):
+    logger.warning(
+        f"OpenAI call failed with status {error.status_code}; retry {attempt + 1} of "
+        f"{settings.OPENAI_MAX_RETRIES} in {delay:.1f} s."
+    )
+
+
+def _backoff(error, attempt):
+    """
+    Applies the retry policy to a failed call.
+
+    A 429 holds back the whole process (see RateLimiter.pause), not only this call,
+    to avoid an error storm; the next acquire waits for it.
+
+    Returns:
+        float: The seconds the caller should sleep before retrying (0 after a 429),
+        or None if the error is not retried.
+    """
+    delay = retry_delay(error, attempt)
+    if delay is None:
+        return None
+    _log_retry(error, attempt, delay)
+    if error.status_code == 429:
+        limiter.pause(delay)
+        return 0.0
+    return delay
+
+
+def _acquire(tokens):
+    waiting_since = time.perf_counter()
+    limiter.acquire(current_user_key.get(), tokens)
+    record_span('rate_limit_wait', time.perf_counter() - waiting_since)
+
+
+async def _aacquire(tokens):
+    waiting_since = time.perf_counter()
+    await limiter.aacquire(current_user_key.get(), tokens)
+    record_span('rate_limit_wait', time.perf_counter() - waiting_since)
+
+
+def call_with_rate_limit(func, messages, max_tokens):
+    """
+    Calls func (an API request) within the shared budgets, retrying on 429 and 5xx.
+
+    Args:
+        func (callable): Makes the request; called again on retries.
+        messages (list): The request's messages, to estimate its size.
+        max_tokens (int): The request's completion limit.
+
+    Returns:
+        The result of func.
+    """
+    tokens = estimate_tokens(messages, max_tokens)
+    for attempt in itertools.count():
+        _acquire(tokens)
+        try:
+            return func()
+        except Exception as e:
+            delay = _backoff(e, attempt)
+            if delay is None:
+                raise
+            time.sleep(delay)
+
+
+async def acall_with_rate_limit(func, messages, max_tokens):
+    """
+    Async version of call_with_rate_limit; func returns an awaitable.
+    """
+    tokens = estimate_tokens(messages, max_tokens)
+    for attempt in itertools.count():
+        await _aacquire(tokens)
+        try:
+            return await func()
+        except Exception as e:
+            delay = _backoff(e, attempt)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+
+
+async def astream_with_rate_limit(open_stream, finish, messages, max_tokens):
+    """
+    Streaming version of acall_with_rate_limit.
+
+    Yields ('event', event) for every event of the stream as it arrives, then
+    ('result', result) with what finish returns for the stream. An attempt is only
+    retried if it failed before its first event was yielded.
+
+    Args:
+        open_stream (callable): Returns an async context manager over the stream of
+            events, e.g. the SDK's chat.completions.stream; called again on retries.
+        finish (callable): Returns an awaitable of the result of a consumed stream,
+            e.g. its final completion.
+        messages (list): The request's messages, to estimate its size.
+        max_tokens (int): The request's completion limit.
+    """
+    tokens = estimate_tokens(messages, max_tokens)
+    for attempt in itertools.count():
+        await _aacquire(tokens)
+        streamed = False
+        try:
+            async with open_stream() as stream:
+                async for event in stream:
+                    streamed = True
+                    yield 'event', event
+                result = await finish(stream)
+        except Exception as e:
+            delay = None if streamed else _backoff(e, attempt)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+            continue
+        yield 'result', result
+        return
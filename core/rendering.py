@@ -0,0 +1,223 @@
+# core/rendering.py
+
+import logging
+import re
+
+from .latex import split_preamble
+from .templates import cv_template_skeleton, cover_letter_template_skeleton
+from .utils import escape_latex_special_chars
+
+logger = logging.getLogger(__name__)
+
+# The CV sections rendered from the profile alone, without the LLM
+LOCAL_SECTIONS = ('header', 'education', 'skills')
+
+# The preambles of the templates, ending with \begin{document}
+_cv_preamble = split_preamble(cv_template_skeleton)[0].strip() + '\n\\begin{document}\n'
+_cover_letter_preamble = split_preamble(cover_letter_template_skeleton)[0].strip() + '\n\\begin{document}\n'
+
+
+# LaTeX escapes of special characters, which the model may copy from the (escaped) profile
+_escaped_char_re = re.compile(r'\\([&%$#_{}])')
+
+
+def _latex_text(text):
+    """
+    Escapes plain text written by the model for LaTeX, without escaping it twice.
+    """
+    return escape_latex_special_chars(_escaped_char_re.sub(r'\1', text.strip()))
+
+
+def _itemize(items):
+    items = [item for item in items if item]
+    if not items:
+        return ''
+    lines = ''.join(f"    \\item {item}\n" for item in items)
+    return f"\\begin{{itemize}}[left=0em]\n{lines}\\end{{itemize}}\n"
+
+
+def _date_range(entry):
+    return ' - '.join(date for date in (entry.get('start_date'), entry.get('end_date')) if date)
+
+
+def _contact_line(user_info):
+    contacts = []
+    if user_info.get('phone'):
+        contacts.append(user_info['phone'])
+    if user_info.get('email'):
+        contacts.append(f"\\href{{mailto:{user_info['email']}}}{{{user_info['email']}}}")
+    return ' | '.join(contacts)
+
+
+def render_header(user_info):
+    """
+    Renders the name and contact details at the top of the CV.
+
+    Args:
+        user_info (dict): The user information from build_user_info_dict (already escaped).
+
+    Returns:
+        str: The LaTeX of the header.
+    """
+    return (
+        "\\pagestyle{empty}\n"
+        "\\begin{center}\n"
+        f"    {{\\LARGE \\textbf{{{user_info.get('name', '')}}}}} \\\\\n"
+        "    \\vspace{0.2cm}\n"
+        f"    {_contact_line(user_info)}\n"
+        "\\end{center}\n\n"
+    )
+
+
+def render_education(user_info):
+    """
+    Renders the Education section from the user's education entries.
+    """
+    entries = []
+    for education in user_info.get('education', []):
+        degree = education.get('education_level', '')
+        if education.get('specialization'):
+            degree = f"{degree} in {education['specialization']}"
+        details = [
+            f"Thesis: {education['thesis']}" if education.get('thesis') else '',
+            f"Relevant subjects: {education['relevant_subjects']}" if education.get('relevant_subjects') else '',
+        ]
+        entries.append(
+            f"\\textbf{{{education.get('university', '')}}} \\\\\n"
+            f"\\textbf{{{degree}}} \\hfill {_date_range(education)}\n"
+            f"{_itemize(details)}"
+        )
+    if not entries:
+        return ''
+    return "\\section*{Education}\n" + '\n'.join(entries) + '\n'
+
+
+def render_experience(user_info, bullets_by_index=None):
+    """
+    Renders the Professional Experience section from the user's experience entries.
+
+    Args:
+        user_info (dict): The user information from build_user_info_dict.
+        bullets_by_index (dict): Tailored bullets (plain text) per entry index; entries
+            without them keep the bullets of their description.
+    """
+    bullets_by_index = bullets_by_index or {}
+    entries = []
+    for index, experience in enumerate(user_info.get('experience', [])):
+        company = ', '.join(part for part in (experience.get('company'), experience.get('city')) if part)
+        if index in bullets_by_index:
+            bullets = [_latex_text(bullet) for bullet in bullets_by_index[index]]
+        else:
+            bullets = experience.get('description', [])
+        entries.append(
+            f"\\textbf{{{company}}} \\\\\n"
+            f"\\textbf{{{experience.get('title', '')}}} \\hfill {_date_range(experience)}\n"
+            f"{_itemize(bullets)}"
+        )
+    if not entries:
+        return ''
+    return "\\section*{Professional Experience}\n" + '\n'.join(entries) + '\n'
+
+
+def render_skills(user_info):
+    """
+    Renders the Skills section from the user's skills list.
+    """
+    skills = [skill for skill in user_info.get('skills', []) if skill]
+    if not skills:
+        return ''
+    return f"\\section*{{Skills}}\n\\textbf{{Skills:}} {', '.join(skills)}\n\n"
+
+
+def render_summary(summary):
+    """
+    Renders the Professional Summary section from the model's plain text summary.
+    """
+    return f"\\section*{{Professional Summary}}\n{_latex_text(summary)}\n\n"
+
+
+def render_flexible(title, items):
+    """
+    Renders the last CV section (e.g. Projects or Publications) from the model's plain text items.
+
+    Args:
+        title (str): The section title.
+        items (list): FlexibleItem entries.
+    """
+    lines = [
+        f"\\textbf{{{_latex_text(item.label)}:}} {_latex_text(item.content)} \\\\\n"
+        for item in items
+        if item.content.strip()
+    ]
+    if not lines:
+        return ''
+    return f"\\section*{{{_latex_text(title)}}}\n" + ''.join(lines) + '\n'
+
+
+def render_section(section_key, user_info):
+    """
+    Renders one of LOCAL_SECTIONS from the user information.
+    """
+    renderers = {'header': render_header, 'education': render_education, 'skills': render_skills}
+    return renderers[section_key](user_info)
+
+
+def render_cv(user_info, content):
+    """
+    Renders a complete CV: the structure from the profile, the prose from the model.
+
+    The sections follow the template's order and headings, so core.sections can split
+    the result.
+
+    Args:
+        user_info (dict): The user information from build_user_info_dict.
+        content (CVContent): The model's summary, experience bullets and last section.
+
+    Returns:
+        str: The LaTeX code of the CV.
+    """
+    bullets_by_index = {entry.index: entry.bullets for entry in content.experience}
+    return (
+        _cv_preamble
+        + render_header(user_info)
+        + render_summary(content.summary)
+        + render_education(user_info)
+        + render_experience(user_info, bullets_by_index)
+        + render_skills(user_info)
+        + render_flexible(content.flexible_title, content.flexible_items)
+        + "\\end{document}\n"
+    )
+
+
+def render_cover_letter(user_info, content):
+    """
+    Renders a complete cover letter: the letterhead, salutation and closing from the
+    profile, the recipient and the paragraphs from the model.
+
+    Args:
+        user_info (dict): The user information from build_user_info_dict.
+        content (CoverLetterContent): The model's recipient, company and paragraphs.
+
+    Returns:
+        str: The LaTeX code of the cover letter.
+    """
+    recipient = _latex_text(content.recipient) or 'Hiring Manager'
+    paragraphs = [_latex_text(paragraph) for paragraph in content.paragraphs if paragraph.strip()]
+    return (
+        _cover_letter_preamble
+        + "\\begin{center}\n"
+        f"    {{\\LARGE \\textbf{{{user_info.get('name', '')}}}}} \\\\\n"
+        "    \\vspace{0.2cm}\n"
+        f"    {_contact_line(user_info)}\n"
+        "\\end{center}\n"
+        "\\vspace{0.5cm}\n\n"
+        f"{recipient} \\\\\n"
+        f"{_latex_text(content.company)}\n\n"
+        "\\vspace{0.5cm}\n\n"
+        f"\\textbf{{Dear {recipient},}}\n\n"
+        + ' \\par\\vspace{0.5cm}\\par\n\n'.join(paragraphs)
+        + "\n\n\\vspace{0.5cm}\n\n"
+        "\\textbf{Sincerely,} \\\\\n"
+        f"\\textbf{{{user_info.get('name', '')}}}\n\n"
+        "\\end{document}\n"
+    )
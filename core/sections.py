@@ -0,0 +1,175 @@
+# core/sections.py
+
+import hashlib
+import json
+import logging
+import re
+
+from django.db import transaction
+
+from .models import GenerationSection
+from .utils import clean_latex, prune_empty
+
+logger = logging.getLogger(__name__)
+
+# The CV sections that can be regenerated on their own, in document order
+CV_SECTIONS = ('header', 'summary', 'education', 'experience', 'skills', 'flexible')
+
+SECTION_TITLES = {
+    'header': "Header (name and contact details)",
+    'summary': "Professional Summary",
+    'education': "Education",
+    'experience': "Professional Experience",
+    'skills': "Skills",
+    'flexible': "Projects / Publications",
+}
+
+# The user information keys (see build_user_info_dict) each section is written from
+SECTION_INPUTS = {
+    'header': ('name', 'email', 'phone'),
+    'summary': ('education', 'experience', 'skills'),
+    'education': ('education',),
+    'experience': ('experience',),
+    'skills': ('skills',),
+    'flexible': ('projects', 'publications', 'interests'),
+}
+
+_begin_document = '\\begin{document}'
+_end_document = '\\end{document}'
+_section_heading_re = re.compile(r'^[ \t]*\\section\*\{([^}]*)\}', re.MULTILINE)
+
+
+class SectionParseError(ValueError):
+    """
+    Raised when LaTeX code does not have the structure of a CV generated from the template.
+    """
+
+
+def section_key(title):
+    """
+    Maps a \\section* title to its section key; the sections not in the template are 'flexible'.
+    """
+    title = title.lower()
+    for key, word in (('summary', 'summary'), ('education', 'education'), ('experience', 'experience'), ('skills', 'skill')):
+        if word in title:
+            return key
+    return 'flexible'
+
+
+def split_cv_sections(latex_code):
+    """
+    Splits a CV's LaTeX code into its sections.
+
+    The preamble runs up to \\begin{document}, the header up to the first \\section*, each
+    section up to the next one, and the closing from \\end{document} on. Joining the
+    parts in order gives back the code.
+
+    Args:
+        latex_code (str): The LaTeX code of the CV.
+
+    Returns:
+        list: (key, latex) pairs, from 'preamble' to 'closing'.
+
+    Raises:
+        SectionParseError: If the code has no document body or a section appears twice.
+    """
+    latex_code = clean_latex(latex_code)
+    begin = latex_code.find(_begin_document)
+    end = latex_code.rfind(_end_document)
+    if begin == -1 or end < begin:
+        raise SectionParseError("The LaTeX code has no document body.")
+    body_start = begin + len(_begin_document)
+    body = latex_code[body_start:end]
+
+    headings = list(_section_heading_re.finditer(body))
+    if not headings:
+        raise SectionParseError("The LaTeX code has no sections.")
+
+    parts = [('preamble', latex_code[:body_start]), ('header', body[:headings[0].start()])]
+    for heading, next_heading in zip(headings, headings[1:] + [None]):
+        key = section_key(heading.group(1))
+        if any(key == part_key for part_key, _ in parts):
+            raise SectionParseError(f"The CV has more than one {key} section.")
+        parts.append((key, body[heading.start():next_heading.start() if next_heading else len(body)]))
+    parts.append(('closing', latex_code[end:]))
+    return parts
+
+
+def assemble_sections(sections):
+    """
+    Joins GenerationSection rows (or (key, latex) pairs) back into the CV's LaTeX code.
+    """
+    return ''.join(section.latex if isinstance(section, GenerationSection) else section[1] for section in sections)
+
+
+def section_input_hashes(user_info_str):
+    """
+    Hashes the part of the user information each section is written from.
+
+    Args:
+        user_info_str (str): The formatted user information from build_user_info.
+
+    Returns:
+        dict: The SHA-256 hex digest of each key of CV_SECTIONS.
+    """
+    user_info = json.loads(user_info_str)
+    hashes = {}
+    for key, inputs in SECTION_INPUTS.items():
+        # Pruned, so hashes do not depend on whether the prompt leaves out empty fields
+        payload = json.dumps(prune_empty({name: user_info.get(name) for name in inputs}), sort_keys=True)
+        hashes[key] = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    return hashes
+
+
+def store_cv_sections(generation, user_info_str=None):
+    """
+    Splits a CV generation's LaTeX code and stores its sections, replacing any stored before.
+
+    Args:
+        generation (Generation): The CV.
+        user_info_str (str): The user information the CV was written from. Without it the
+            sections have no input hash, so they all count as stale.
+
+    Returns:
+        list: The stored GenerationSection rows, in document order.
+
+    Raises:
+        SectionParseError: If the LaTeX code cannot be split.
+    """
+    parts = split_cv_sections(generation.json_output.get('latex_code', ''))
+    hashes = section_input_hashes(user_info_str) if user_info_str else {}
+    sections = [
+        GenerationSection(generation=generation, key=key, position=position, latex=latex, input_hash=hashes.get(key, ''))
+        for position, (key, latex) in enumerate(parts)
+    ]
+    with transaction.atomic():
+        generation.sections.all().delete()
+        GenerationSection.objects.bulk_create(sections)
+    return sections
+
+
+def get_cv_sections(generation):
+    """
+    Returns a CV generation's sections, splitting its LaTeX code first for generations
+    stored before sections were.
+
+    Raises:
+        SectionParseError: If the sections are not stored and the LaTeX code cannot be split.
+    """
+    sections = list(generation.sections.all())
+    if not sections:
+        logger.info(f"No sections stored for Generation ID {generation.id}; splitting its LaTeX code now.")
+        sections = store_cv_sections(generation)
+    return sections
+
+
+def stale_sections(sections, user_info_str):
+    """
+    Returns the keys of the sections whose inputs changed since they were written.
+
+    Args:
+        sections (list): The GenerationSection rows of a CV.
+        user_info_str (str): The current user information from build_user_info.
+    """
+    hashes = section_input_hashes(user_info_str)
+    return [section.key for section in sections if section.key in CV_SECTIONS and section.input_hash != hashes[section.key]]
@@ -1,10 +1,10 @@
 # core/signals.py
 
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
 from allauth.account.signals import user_signed_up
-from .models import UserProfile
+from .models import UserProfile, PDFArtifact
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -30,3 +30,10 @@ def populate_user_profile(request, user, **kwargs):
             user.userprofile.linkedin_link = extra_data.get('link', '')  # Adjust based on actual keys
             user.userprofile.summary = extra_data.get('about', '')  # Adjust based on actual keys
             user.userprofile.save()
+
+@receiver(post_delete, sender=PDFArtifact)
+def delete_pdf_artifact_file(sender, instance, **kwargs):
+    """
+    Remove the stored PDF when its artifact row is deleted.
+    """
+    instance.pdf_file.delete(save=False)
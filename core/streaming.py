@@ -0,0 +1,132 @@
+# core/streaming.py
+
+import asyncio
+import json
+import time
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .generation import build_user_info, document_output, document_request, save_document
+from .llm import astream_completion, get_async_openai_client
+from .ratelimit import rate_limit_user
+from .usage import collect_usage, save_usage
+from .utils import aextract_job_details
+
+logger = logging.getLogger(__name__)
+
+# Minimum number of seconds between two 'tokens' progress events of the same document
+TOKEN_EVENT_INTERVAL = 0.25
+
+
+def sse_event(event, data):
+    """
+    Formats one Server-Sent Event with a JSON payload.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _extract_job_details(job_description, queue, usage_records):
+    with collect_usage(usage_records):
+        job_details = await aextract_job_details(job_description)
+    await queue.put(sse_event('job_details', job_details.model_dump()))
+    return job_details
+
+
+async def _stream_document(user, job_description, gen_type, user_info_str, job_details_task, job_details_usage,
+                           queue, bypass_cache=False, fast_mode=False):
+    """
+    Streams one document from the LLM, then stores it and compiles its PDF, reporting
+    progress on the queue. Always ends by putting None on the queue.
+
+    The first document stored takes the usage records of the job details call.
+    """
+    label = gen_type.replace('_', ' ').title()
+    # The document runs in its own task, so the collector only sees this document's calls
+    with collect_usage() as usage_records:
+        try:
+            request_kwargs = document_request(job_description, gen_type, user_info_str, fast_mode)
+            tokens = 0
+            last_event = 0.0
+            latex_output = None
+            async for kind, value in astream_completion(get_async_openai_client(), bypass_cache=bypass_cache, **request_kwargs):
+                if kind == 'delta':
+                    tokens += 1  # Each streamed chunk carries roughly one token
+                    now = time.monotonic()
+                    if now - last_event >= TOKEN_EVENT_INTERVAL:
+                        last_event = now
+                        await queue.put(sse_event('tokens', {
+                            'type': label,
+                            'tokens': tokens,
+                            'max_tokens': request_kwargs['max_tokens'],
+                        }))
+                else:
+                    latex_output = value
+            await queue.put(sse_event('generated', {'type': label, 'tokens': tokens}))
+
+            latex_output, job_details = document_output(gen_type, latex_output, user_info_str)
+            if not fast_mode:
+                job_details = await job_details_task
+                usage_records.extend(job_details_usage)
+                job_details_usage.clear()
+
+            document = await sync_to_async(save_document)(
+                user, job_description, gen_type, job_details, latex_output, user_info_str, usage_records
+            )
+            await queue.put(sse_event('compiled', document))
+        except Exception as e:
+            logger.error(f"Error generating {gen_type}: {e}")
+            await queue.put(sse_event('error', {'type': label, 'error': f"Error generating {gen_type}: {e}"}))
+            await sync_to_async(save_usage)(user, usage_records)
+        finally:
+            await queue.put(None)
+
+
+async def stream_generation(user, job_description, generation_types, bypass_cache=False, fast_mode=False):
+    """
+    Generates the requested documents and yields Server-Sent Events as they progress.
+
+    Events: 'started', 'job_details', 'tokens' (throttled per document), 'generated'
+    (LLM response complete), 'compiled' (stored with its PDF; carries the document
+    info), 'error' (one document failed) and finally 'done' with the elapsed time.
+    Documents are streamed concurrently.
+    """
+    start = time.perf_counter()
+    queue = asyncio.Queue()
+
+    yield sse_event('started', {'documents': [gen_type.replace('_', ' ').title() for gen_type in generation_types]})
+    user_info_str = await sync_to_async(build_user_info)(user)
+
+    job_details_usage = []
+    # The tasks inherit the user attribution for the rate limiter
+    with rate_limit_user(user.id):
+        job_details_task = None
+        if not fast_mode:
+            job_details_task = asyncio.ensure_future(_extract_job_details(job_description, queue, job_details_usage))
+        tasks = [
+            asyncio.ensure_future(_stream_document(
+                user, job_description, gen_type, user_info_str, job_details_task, job_details_usage, queue,
+                bypass_cache=bypass_cache, fast_mode=fast_mode,
+            ))
+            for gen_type in generation_types
+        ]
+
+    try:
+        pending = len(tasks)
+        while pending:
+            event = await queue.get()
+            if event is None:
+                pending -= 1
+                continue
+            yield event
+    finally:
+        # Stop generating if the client went away
+        for task in tasks + [job_details_task]:
+            if task is not None and not task.done():
+                task.cancel()
+
+    # Left when every document failed
+    await sync_to_async(save_usage)(user, job_details_usage)
+    elapsed_ms = int((time.perf_counter() - start) * 1000)
+    yield sse_event('done', {'elapsed_ms': elapsed_ms, 'fast_mode': fast_mode})
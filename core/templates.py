@@ -134,4 +134,71 @@ Thank you for considering my application. I look forward to the possibility of c
 \end{document}
 
 
-                    """
\ No newline at end of file
+                    """
+
+# Compact skeletons used by Fast Mode: the same preamble and structure as the
+# templates above, with placeholders instead of the example content.
+
+cv_template_skeleton = r"""
+\documentclass[a4paper,9pt]{article}
+\usepackage{hyperref}
+\usepackage[margin=0.7in]{geometry}
+\usepackage{enumitem}
+\usepackage{titlesec}
+\titleformat{\section}{\bfseries\Large}{}{0em}{}[\titlerule]
+\titleformat{\subsection}{\bfseries\large}{}{0em}{}
+\begin{document}
+\pagestyle{empty}
+\begin{center}
+    {\LARGE \textbf{<Name>}} \\
+    \vspace{0.2cm}
+    <City, Country> | <Phone> | \href{mailto:<Email>}{<Email>} | \href{<LinkedIn URL>}{LinkedIn}
+\end{center}
+\section*{Professional Summary}
+<Summary>
+\section*{Education}
+\textbf{<University>} \\
+\textbf{<Degree>} \hfill <Start> - <End>
+\begin{itemize}[left=0em]
+    \item <Detail>
+\end{itemize}
+\section*{Professional Experience}
+\textbf{<Company, City, Country>} \\
+\textbf{<Title>} \hfill <Start> - <End>
+\begin{itemize}[left=0em]
+    \item <Achievement>
+\end{itemize}
+\section*{Skills}
+\textbf{<Category>:} <Skills> \\
+\section*{<Projects | Publications | Projects and Publications>}
+\textbf{<Label>:} <Content> \\
+\end{document}
+"""
+
+cover_letter_template_skeleton = r"""
+\documentclass[a4paper,12pt]{article}
+\usepackage{hyperref}
+\usepackage[margin=1in]{geometry}
+\usepackage{enumitem}
+\usepackage{titlesec}
+\titleformat{\section}{\bfseries\Large}{}{0em}{}[\titlerule]
+\titleformat{\subsection}{\bfseries\large}{}{0em}{}
+\pagestyle{empty}
+\begin{document}
+\begin{center}
+    {\LARGE \textbf{<Name>}} \\
+    \vspace{0.2cm}
+    <City, State> | <Phone> | \href{mailto:<Email>}{<Email>} \\
+    \href{<LinkedIn URL>}{LinkedIn}
+\end{center}
+\vspace{0.5cm}
+<Contact Name or Hiring Manager> \\
+<Company>
+\vspace{0.5cm}
+\textbf{Dear <Contact Name or Hiring Manager>,}
+<Paragraph> \par\vspace{0.5cm}\par
+\vspace{0.5cm}
+\textbf{Sincerely,} \\
+\textbf{<Name>}
+\end{document}
+"""
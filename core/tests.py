@@ -1,7 +1,64 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import logging
+import os
+import tempfile
+import uuid
+import zipfile
+from contextlib import asynccontextmanager
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
+import httpx
+import openai
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+
+from . import utils
+from .utils import extract_job_details, JobDetails, LatexOutput, FastLatexOutput, FastCVContent, ExperienceBullets
+from . import generation
+from .generation import build_user_info, run_generation
+from . import benchmarks, llm, log, metrics, usage
+from .llm import parse_completion
+from .pdf_cache import PDFCache
+from . import latex
+from .templates import cv_template
+from .models import Experience, Generation, GenerationJob, GenerationBatch, PDFArtifact, UsageRecord
+from .sections import assemble_sections, split_cv_sections, store_cv_sections
+from .bulk import BulkInputError, batch_progress, create_generation_batch, parse_job_descriptions
+from .batch_api import LocalBatchBackend, poll_batch, response_format_param, submit_batch
+from .jobs import claim_next_job
+from .ratelimit import RateLimiter, astream_with_rate_limit, call_with_rate_limit, estimate_tokens
+from .artifacts import create_pdf_artifact
+
+
+class TemporaryDirectoryMixin:
+    """
+    Gives the tests temporary directories, removed after each test.
+    """
+
+    def temporary_directory(self, setting=None):
+        """
+        Returns the path of a new temporary directory. When `setting` is given, the
+        setting points at the directory for the rest of the test.
+        """
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        if setting:
+            settings_override = override_settings(**{setting: directory.name})
+            settings_override.enable()
+            self.addCleanup(settings_override.disable)
+        return directory.name
 
-from .utils import extract_job_details, JobDetails
 
 class ExtractJobDetailsTestCase(TestCase):
     def test_extract_job_details(self):
@@ -13,4 +70,1184 @@ class ExtractJobDetailsTestCase(TestCase):
         
         self.assertIsInstance(job_details, JobDetails)
         self.assertEqual(job_details.job_title, "Senior Software Engineer")
-        self.assertEqual(job_details.company, "Tech Innovators Inc.")
\ No newline at end of file
+        self.assertEqual(job_details.company, "Tech Innovators Inc.")
+
+class PDFCacheTestCase(TemporaryDirectoryMixin, TestCase):
+    def setUp(self):
+        self.temp_dir = self.temporary_directory()
+        self.cache = PDFCache(self.temp_dir, max_bytes=10)
+
+    def test_get_or_compile_compiles_once(self):
+        calls = []
+
+        def compile_func(latex_code):
+            calls.append(latex_code)
+            return b'%PDF'
+
+        self.assertEqual(self.cache.get_or_compile('doc', compile_func), b'%PDF')
+        self.assertEqual(self.cache.get_or_compile('doc', compile_func), b'%PDF')
+        self.assertEqual(calls, ['doc'])
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertEqual(self.cache.stats()['misses'], 1)
+
+    def test_evicts_least_recently_used(self):
+        self.cache.set('a', b'1111')
+        self.cache.set('b', b'2222')
+        self.cache.get('a')  # 'b' is now the least recently used entry
+        self.cache.set('c', b'3333')
+
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('c'))
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+        self.assertLessEqual(self.cache.stats()['size_bytes'], 10)
+
+    def test_index_is_rebuilt_from_disk(self):
+        self.cache.set('doc', b'%PDF')
+        other_worker = PDFCache(self.temp_dir, max_bytes=10)
+        self.assertEqual(other_worker.get('doc'), b'%PDF')
+
+
+class PDFArtifactTestCase(TemporaryDirectoryMixin, TestCase):
+    def setUp(self):
+        self.temporary_directory('MEDIA_ROOT')
+        self.user = User.objects.create_user('jane', 'jane@example.com', 'password')
+        self.generation = Generation.objects.create(
+            user=self.user,
+            job_description='Data Analyst at Acme',
+            generation_type='cv',
+            job_title='Data Analyst',
+            company='Acme',
+            json_output={'latex_code': '\\documentclass[a4paper,10pt]{article}\\begin{document}Hi\\end{document}'},
+        )
+
+    @mock.patch('core.artifacts.get_pdf', return_value=b'%PDF-1.5 test')
+    def test_create_pdf_artifact(self, get_pdf):
+        artifact = create_pdf_artifact(self.generation)
+
+        self.assertEqual(artifact.size_bytes, len(b'%PDF-1.5 test'))
+        self.assertEqual(len(artifact.source_hash), 64)
+        with artifact.pdf_file.open('rb') as pdf_file:
+            self.assertEqual(pdf_file.read(), b'%PDF-1.5 test')
+        self.assertTrue(Generation.objects.get(id=self.generation.id).has_pdf_artifact)
+
+    @mock.patch('core.artifacts.get_pdf', return_value=b'%PDF-1.5 test')
+    def test_download_reads_stored_artifact(self, get_pdf):
+        create_pdf_artifact(self.generation)
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse('download_pdf', args=[self.generation.id]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.5 test')
+        self.assertTrue(response['Content-Disposition'].startswith('attachment'))
+        self.assertEqual(get_pdf.call_count, 1)
+
+    @mock.patch('core.artifacts.get_pdf', return_value=b'%PDF-1.5 test')
+    def test_serve_pdf_revalidates_with_etag(self, get_pdf):
+        create_pdf_artifact(self.generation)
+        self.client.force_login(self.user)
+        url = reverse('serve_pdf', args=[self.generation.id])
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Disposition'].startswith('inline'))
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    @mock.patch('core.artifacts.get_pdf', return_value=b'%PDF-1.5 test')
+    def test_serve_pdf_range_requests(self, get_pdf):
+        create_pdf_artifact(self.generation)
+        metrics.registry.clear()
+        self.addCleanup(metrics.registry.clear)
+        self.client.force_login(self.user)
+        url = reverse('serve_pdf', args=[self.generation.id])
+
+        response = self.client.get(url, HTTP_RANGE='bytes=0-3')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 0-3/13')
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF')
+
+        response = self.client.get(url, HTTP_RANGE='bytes=-4')
+        self.assertEqual(b''.join(response.streaming_content), b'test')
+
+        response = self.client.get(url, HTTP_RANGE='bytes=100-')
+        self.assertEqual(response.status_code, 416)
+        # Timed once per streamed range
+        self.assertEqual(metrics.registry.value('autocv_stage_duration_seconds', stage='pdf_read'), 2)
+
+    @mock.patch('core.artifacts.get_pdf', return_value=b'%PDF-1.5 test')
+    def test_render_latex_embeds_pdf_by_url(self, get_pdf):
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse('render_latex', args=[self.generation.id]))
+
+        self.assertContains(response, reverse('serve_pdf', args=[self.generation.id]))
+        self.assertNotContains(response, 'base64')
+
+
+class LatexFormatTestCase(TemporaryDirectoryMixin, TestCase):
+    def setUp(self):
+        self.temporary_directory('LATEX_FORMAT_DIR')
+        self.backend = latex.PdflatexBackend('pdflatex', preload_formats=True)
+        self.calls = []
+
+    def fake_run(self, command, cwd, **kwargs):
+        """Stands in for pdflatex: writes the format or PDF a real run would produce."""
+        source_name = command[-1]
+        with open(os.path.join(cwd, source_name), encoding='utf-8') as tex_file:
+            self.calls.append((command, tex_file.read()))
+        if '-ini' in command:
+            jobname = next(arg for arg in command if arg.startswith('-jobname='))[len('-jobname='):]
+            output_path = os.path.join(cwd, f"{jobname}.fmt")
+        else:
+            output_path = os.path.join(cwd, 'document.pdf')
+        with open(output_path, 'wb') as output_file:
+            output_file.write(b'%PDF')
+        return mock.Mock(stdout=b'', stderr=b'')
+
+    def test_template_preamble_is_compiled_with_format(self):
+        with mock.patch('core.latex.subprocess.run', side_effect=self.fake_run):
+            self.assertEqual(self.backend.compile(cv_template).pdf, b'%PDF')
+            self.backend.compile(cv_template)
+
+        # The format is built once, then reused; the documents only carry their body
+        self.assertEqual(sum('-ini' in command for command, _ in self.calls), 1)
+        self.assertTrue(self.calls[0][1].rstrip().endswith('\\dump'))
+        for command, source in self.calls[1:]:
+            self.assertTrue(any(arg.startswith('-fmt=preamble-') for arg in command))
+            self.assertTrue(source.startswith('\\begin{document}'))
+
+    def test_other_preamble_is_compiled_without_format(self):
+        source = '\\documentclass{article}\n\\usepackage{tikz}\n\\begin{document}Hi\\end{document}'
+        with mock.patch('core.latex.subprocess.run', side_effect=self.fake_run):
+            self.backend.compile(source)
+
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(self.calls[0][1], source)
+        self.assertFalse(any(arg.startswith('-fmt=') for arg in self.calls[0][0]))
+
+
+class LatexEngineTestCase(TestCase):
+    class EchoBackend(latex.LatexBackend):
+        name = 'echo'
+
+        def compile(self, latex_code):
+            return latex.CompileResult(pdf=latex_code.encode(), log='ok', timings={'compile_ms': 0}, backend=self.name)
+
+    def test_engine_runs_backend_and_reports_timings(self):
+        engine = latex.LatexEngine(self.EchoBackend(), max_workers=1)
+
+        result = engine.compile('doc')
+
+        self.assertEqual(result.pdf, b'doc')
+        self.assertEqual(result.log, 'ok')
+        self.assertEqual(result.backend, 'echo')
+        self.assertIn('queue_ms', result.timings)
+        self.assertIn('total_ms', result.timings)
+
+    @mock.patch('core.latex.PDFLATEX_PATH', None)
+    def test_missing_pdflatex_raises_compilation_error(self):
+        with self.assertRaises(latex.LatexCompilationError):
+            latex.PdflatexBackend(pdflatex_path=None).compile('\\documentclass{article}')
+
+
+class GenerationJobTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('jane', 'jane@example.com', 'password')
+        self.client.force_login(self.user)
+
+    def test_generate_documents_queues_job(self):
+        response = self.client.post(reverse('generate_documents'), {
+            'job_description': 'Data Analyst at Acme',
+            'generate_cv': 'on',
+        })
+
+        self.assertEqual(response.status_code, 202)
+        job = GenerationJob.objects.get(id=response.json()['job_id'])
+        self.assertEqual(job.status, GenerationJob.STATUS_QUEUED)
+        self.assertEqual(job.generation_types, ['cv'])
+        self.assertEqual(response.json()['status_url'], reverse('job_status', args=[job.id]))
+
+    @mock.patch('core.jobs.run_generation', return_value={'documents': [{'type': 'Cv'}], 'errors': []})
+    def test_worker_runs_queued_jobs(self, run_generation):
+        job = GenerationJob.objects.create(user=self.user, job_description='Data Analyst at Acme')
+
+        call_command('run_generation_worker', '--once', stdout=mock.MagicMock())
+
+        response = self.client.get(reverse('job_status', args=[job.id]))
+        self.assertEqual(response.json()['status'], GenerationJob.STATUS_DONE)
+        self.assertEqual(response.json()['documents'], [{'type': 'Cv'}])
+        run_generation.assert_called_once_with(
+            self.user, 'Data Analyst at Acme', ['cv', 'cover_letter'], bypass_cache=False, fast_mode=False,
+            user_info_str=None,
+        )
+
+    @override_settings(GENERATION_JOB_TIMEOUT=600)
+    def test_stale_claims_are_queued_again(self):
+        batch = GenerationBatch.objects.create(user=self.user, user_info='Jane', concurrency=1)
+        crashed = GenerationJob.objects.create(
+            user=self.user, job_description='Data Analyst at Acme', batch=batch,
+            status=GenerationJob.STATUS_RUNNING, started_at=timezone.now() - timedelta(minutes=11),
+        )
+        GenerationJob.objects.create(user=self.user, job_description='Engineer at Initech', batch=batch)
+        api_batch = GenerationBatch.objects.create(user=self.user, user_info='Jane', use_batch_api=True)
+        submitted = GenerationJob.objects.create(
+            user=self.user, job_description='Analyst at Globex', batch=api_batch,
+            status=GenerationJob.STATUS_RUNNING, started_at=timezone.now() - timedelta(hours=5),
+        )
+
+        # The crashed worker's job is claimed again, ahead of the batch's other job
+        self.assertEqual(claim_next_job(), crashed)
+        self.assertIsNone(claim_next_job())
+        submitted.refresh_from_db()
+        self.assertEqual(submitted.status, GenerationJob.STATUS_RUNNING)
+
+    @mock.patch('core.jobs.run_generation', side_effect=Exception("Error generating cv: boom"))
+    def test_failed_job_reports_error(self, run_generation):
+        job = GenerationJob.objects.create(user=self.user, job_description='Data Analyst at Acme')
+
+        call_command('run_generation_worker', '--once', stdout=mock.MagicMock())
+
+        response = self.client.get(reverse('job_status', args=[job.id]))
+        self.assertEqual(response.json()['status'], GenerationJob.STATUS_FAILED)
+        self.assertEqual(response.json()['error'], "Error generating cv: boom")
+
+
+class BulkGenerationTestCase(TemporaryDirectoryMixin, TestCase):
+    def setUp(self):
+        self.temporary_directory('MEDIA_ROOT')
+        self.user = User.objects.create_user('jane', 'jane@example.com', 'password')
+        self.client.force_login(self.user)
+
+    def test_parse_job_descriptions(self):
+        self.assertEqual(parse_job_descriptions('Analyst at Acme\n---\nEngineer at Initech\n', 'text'),
+                         ['Analyst at Acme', 'Engineer at Initech'])
+        self.assertEqual(parse_job_descriptions('company,job_description\nAcme,"Analyst, Acme"\n', 'csv'),
+                         ['Analyst, Acme'])
+        self.assertEqual(parse_job_descriptions('{"job_description": "Analyst"}\n\n"Engineer"\n', 'jsonl'),
+                         ['Analyst', 'Engineer'])
+        with self.assertRaises(BulkInputError):
+            parse_job_descriptions('{not json}', 'jsonl')
+
+    def test_bulk_view_queues_batch(self):
+        response = self.client.post(reverse('bulk_generate'), {
+            'job_descriptions': 'Analyst at Acme\n---\nEngineer at Initech\n---\nManager at Hooli',
+            'input_format': 'auto',
+            'generate_cv': 'on',
+            'concurrency': 2,
+        })
+
+        batch = GenerationBatch.objects.get(user=self.user)
+        self.assertRedirects(response, reverse('batch_status', args=[batch.id]))
+        self.assertEqual(batch.jobs.count(), 3)
+        self.assertEqual(batch.concurrency, 2)
+        self.assertIn('jane@example.com', batch.user_info)
+
+    def test_claim_respects_batch_concurrency(self):
+        batch = create_generation_batch(self.user, ['Analyst at Acme', 'Engineer at Initech'], concurrency=1)
+        standalone = GenerationJob.objects.create(user=self.user, job_description='Manager at Hooli')
+
+        first = claim_next_job()
+        self.assertEqual(first.batch_id, batch.id)
+        # The batch is at its limit, so the next claim skips its other job
+        self.assertEqual(claim_next_job().id, standalone.id)
+        self.assertIsNone(claim_next_job())
+
+    @mock.patch('core.artifacts.get_pdf', return_value=b'%PDF-1.5 test')
+    def test_batch_jobs_share_user_info_and_zip(self, get_pdf):
+        batch = create_generation_batch(self.user, ['Analyst at Acme', 'Engineer at Acme'], generate_cover_letter=False)
+
+        def fake_run_generation(user, job_description, generation_types, **kwargs):
+            self.assertEqual(kwargs['user_info_str'], batch.user_info)
+            generation = Generation.objects.create(
+                user=user, job_description=job_description, generation_type='cv',
+                job_title='Analyst', company='Acme', json_output={'latex_code': '\\documentclass{article}'},
+            )
+            create_pdf_artifact(generation)
+            return {'documents': [{'generation_id': generation.id, 'type': 'Cv'}], 'errors': []}
+
+        with mock.patch('core.jobs.run_generation', side_effect=fake_run_generation):
+            call_command('run_generation_worker', '--once', stdout=mock.MagicMock())
+
+        response = self.client.get(reverse('batch_status', args=[batch.id]))
+        self.assertContains(response, 'Download all PDFs (2)')
+
+        response = self.client.get(reverse('batch_zip', args=[batch.id]))
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as archive:
+            self.assertEqual(archive.namelist(), ['001-CV--Acme.pdf', '002-CV--Acme.pdf'])
+
+
+@override_settings(OPENAI_BATCH_BACKEND='core.batch_api.LocalBatchBackend')
+class BatchAPITestCase(TemporaryDirectoryMixin, TestCase):
+    def setUp(self):
+        self.temporary_directory('MEDIA_ROOT')
+        self.batch_dir = self.temporary_directory('OPENAI_BATCH_LOCAL_DIR')
+        self.user = User.objects.create_user('jane', 'jane@example.com', 'password')
+        self.batch = create_generation_batch(
+            self.user, ['Analyst at Acme', 'Engineer at Initech'], generate_cover_letter=False, use_batch_api=True
+        )
+
+    @mock.patch('core.artifacts.get_pdf', return_value=b'%PDF-1.5 test')
+    def test_submit_and_poll_with_local_backend(self, get_pdf):
+        # Batch API jobs are not picked up by the workers
+        self.assertIsNone(claim_next_job())
+
+        call_command('openai_batch', 'submit', stdout=mock.MagicMock())
+        self.batch.refresh_from_db()
+        self.assertTrue(self.batch.remote_batch_id)
+        with open(os.path.join(self.batch_dir, self.batch.remote_batch_id, 'input.jsonl')) as input_file:
+            custom_ids = [json.loads(line)['custom_id'] for line in input_file]
+        job_ids = list(self.batch.jobs.order_by('id').values_list('id', flat=True))
+        self.assertEqual(custom_ids, [f"job-{job_ids[0]}-details", f"job-{job_ids[0]}-cv",
+                                      f"job-{job_ids[1]}-details", f"job-{job_ids[1]}-cv"])
+
+        call_command('openai_batch', 'poll', stdout=mock.MagicMock())
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.remote_status, 'completed')
+        self.assertEqual(batch_progress(self.batch)['done'], 2)
+        self.assertEqual(Generation.objects.filter(user=self.user, company='<company>').count(), 2)
+
+        # Each request is billed at the batch price, the job details with the job's CV
+        for cv in Generation.objects.filter(user=self.user):
+            records = {record.purpose: record for record in cv.usage_records.all()}
+            self.assertEqual(set(records), {'JobDetails', generation.document_response_format('cv').__name__})
+            for record in records.values():
+                self.assertGreater(record.prompt_tokens, 0)
+                expected = usage.completion_cost(record.model, record.prompt_tokens, record.completion_tokens, batch=True)
+                self.assertEqual(record.cost, expected.quantize(Decimal('0.000001')))
+        self.assertEqual(UsageRecord.objects.filter(user=self.user).count(), 4)
+
+    @override_settings(USER_DAILY_TOKEN_BUDGET=1000)
+    def test_submission_checks_token_budget(self):
+        # Two postings need more than 1000 tokens at the document completion limits
+        with self.assertRaises(usage.TokenBudgetExceeded):
+            submit_batch(self.batch, LocalBatchBackend())
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.remote_batch_id, '')
+        self.assertEqual(batch_progress(self.batch)['queued'], 2)
+
+        out = io.StringIO()
+        call_command('openai_batch', 'submit', stdout=out)
+        self.assertIn('not submitted', out.getvalue())
+
+    @override_settings(USER_DAILY_TOKEN_BUDGET=1000)
+    def test_bulk_command_does_not_keep_a_batch_over_budget(self):
+        path = os.path.join(self.temporary_directory(), 'postings.txt')
+        with open(path, 'w') as postings:
+            postings.write('Analyst at Acme\n---\nEngineer at Initech\n')
+
+        with self.assertRaisesMessage(CommandError, 'not submitted'):
+            call_command('generate_bulk', 'jane', path, '--batch-api', stdout=io.StringIO())
+        self.assertEqual(GenerationBatch.objects.count(), 1)
+
+        UsageRecord.objects.create(user=self.user, purpose='JobDetails', model='gpt-4o', prompt_tokens=1000,
+                                   completion_tokens=0, total_tokens=1000, latency_ms=0)
+        with self.assertRaisesMessage(CommandError, 'daily budget'):
+            call_command('generate_bulk', 'jane', path, '--batch-api', stdout=io.StringIO())
+        self.assertEqual(GenerationBatch.objects.count(), 1)
+
+    def test_response_format_matches_the_sdk(self):
+        # The SDK's own conversion is private; compare with it while it is there
+        try:
+            from openai.lib._parsing._completions import type_to_response_format_param
+        except ImportError:
+            self.skipTest("The installed openai version has no type_to_response_format_param.")
+        for response_format in (JobDetails, LatexOutput, FastLatexOutput, utils.CVContent, FastCVContent,
+                                utils.CoverLetterContent, utils.FastCoverLetterContent):
+            self.assertEqual(response_format_param(response_format), type_to_response_format_param(response_format))
+
+    @mock.patch('core.artifacts.get_pdf', return_value=b'%PDF-1.5 test')
+    def test_interrupted_ingest_is_not_stored_twice(self, get_pdf):
+        submit_batch(self.batch, LocalBatchBackend())
+        # The process dies after the first job's CV is saved, before the job is finished
+        with mock.patch('core.batch_api.save_usage', side_effect=RuntimeError('killed')):
+            with self.assertRaises(RuntimeError):
+                poll_batch(self.batch, LocalBatchBackend())
+        self.assertEqual(batch_progress(self.batch)['running'], 2)
+        self.assertFalse(Generation.objects.filter(user=self.user).exists())
+
+        poll_batch(self.batch, LocalBatchBackend())
+        self.assertEqual(batch_progress(self.batch)['done'], 2)
+        self.assertEqual(Generation.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(UsageRecord.objects.filter(user=self.user).count(), 4)
+
+    def test_failed_requests_fail_their_job(self):
+        submit_batch(self.batch, LocalBatchBackend())
+        first, second = self.batch.jobs.order_by('id')
+        with open(os.path.join(self.batch_dir, self.batch.remote_batch_id, 'output.jsonl'), 'w') as output_file:
+            for job in (first, second):
+                output_file.write(json.dumps({
+                    'custom_id': f"job-{job.id}-details",
+                    'response': {'status_code': 200, 'body': {'choices': [{'message': {
+                        'content': '{"job_title": "Analyst", "company": "Acme"}'
+                    }}]}},
+                    'error': None,
+                }) + '\n')
+                output_file.write(json.dumps({
+                    'custom_id': f"job-{job.id}-cv",
+                    'response': {'status_code': 429, 'body': {'error': 'rate limited'}},
+                    'error': None,
+                }) + '\n')
+
+        poll_batch(self.batch, LocalBatchBackend())
+
+        first.refresh_from_db()
+        self.assertEqual(first.status, GenerationJob.STATUS_FAILED)
+        self.assertIn('rate limited', first.error)
+
+
+class RunGenerationTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('jane', 'jane@example.com', 'password')
+
+    def fake_request_document(self, job_description, gen_type, user_info_str, bypass_cache=False, fast_mode=False):
+        if gen_type == 'cover_letter':
+            raise Exception("boom")
+        return LatexOutput(latex_code='\\documentclass{article}')
+
+    @mock.patch('core.generation.extract_job_details', return_value=JobDetails(job_title='Data Analyst', company='Acme'))
+    @mock.patch('core.generation.create_pdf_artifact')
+    def test_failed_document_does_not_abort_others(self, create_pdf_artifact, extract_job_details):
+        with mock.patch('core.generation.request_document', side_effect=self.fake_request_document):
+            result = run_generation(self.user, 'Data Analyst at Acme', ['cv', 'cover_letter'])
+
+        self.assertEqual([doc['type'] for doc in result['documents']], ['Cv'])
+        self.assertEqual(result['errors'], [{'type': 'Cover Letter', 'error': "Error generating cover_letter: boom"}])
+        self.assertEqual(Generation.objects.filter(user=self.user).count(), 1)
+
+    @override_settings(FAST_MODE_MODEL='fast-model', LOCAL_LATEX_RENDERING=False)
+    @mock.patch('core.generation.extract_job_details')
+    @mock.patch('core.generation.create_pdf_artifact')
+    def test_fast_mode_skips_job_details_extraction(self, create_pdf_artifact, extract_job_details):
+        fast_output = FastLatexOutput(job_title='Data Analyst', company='Acme', latex_code='\\documentclass{article}')
+        with mock.patch('core.generation.parse_completion', return_value=fast_output) as parse_completion:
+            result = run_generation(self.user, 'Data Analyst at Acme', ['cv'], fast_mode=True)
+
+        extract_job_details.assert_not_called()
+        self.assertEqual(parse_completion.call_args.kwargs['model'], 'fast-model')
+        self.assertIs(parse_completion.call_args.kwargs['response_format'], FastLatexOutput)
+        self.assertNotIn('Jane Doe', parse_completion.call_args.kwargs['messages'][1]['content'])
+        generation = Generation.objects.get(user=self.user)
+        self.assertEqual(generation.company, 'Acme')
+        self.assertEqual(generation.json_output, {'latex_code': '\\documentclass{article}'})
+        self.assertIn('elapsed_ms', result)
+        self.assertIn('llm_ms', result['documents'][0])
+
+    @override_settings(LOCAL_LATEX_RENDERING=True)
+    @mock.patch('core.generation.extract_job_details')
+    @mock.patch('core.generation.create_pdf_artifact')
+    def test_local_rendering_asks_only_for_prose(self, create_pdf_artifact, extract_job_details):
+        profile = self.user.userprofile
+        profile.name = 'Jane Doe'
+        profile.skills = 'SQL, Python'
+        profile.save()
+        Experience.objects.create(profile=profile, company='R&D Labs', title='Analyst', start_date=date(2022, 1, 1))
+        content = FastCVContent(
+            job_title='Data Analyst',
+            company='Acme',
+            summary='Analyst with 3 years of R\\&D experience.',
+            experience=[ExperienceBullets(index=0, bullets=['Cut report time by 40%.'])],
+            flexible_title='Projects',
+            flexible_items=[],
+        )
+        with mock.patch('core.generation.parse_completion', return_value=content) as parse_completion:
+            run_generation(self.user, 'Data Analyst at Acme', ['cv'], fast_mode=True)
+
+        self.assertIs(parse_completion.call_args.kwargs['response_format'], FastCVContent)
+        self.assertNotIn('\\documentclass', parse_completion.call_args.kwargs['messages'][1]['content'])
+        latex_code = Generation.objects.get(user=self.user).json_output['latex_code']
+        self.assertIn('\\textbf{R\\&D Labs} \\\\', latex_code)
+        self.assertIn('Analyst with 3 years of R\\&D experience.', latex_code)
+        self.assertIn('\\item Cut report time by 40\\%.', latex_code)
+        self.assertIn('\\textbf{Skills:} SQL, Python', latex_code)
+        # An empty last section is left out
+        self.assertNotIn('Projects', latex_code)
+        self.assertEqual(
+            [key for key, _ in split_cv_sections(latex_code)],
+            ['preamble', 'header', 'summary', 'experience', 'skills', 'closing'],
+        )
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'job_details': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'job-details-tests'},
+})
+class JobDetailsMemoizationTestCase(TestCase):
+    def setUp(self):
+        utils._job_details_lru.clear()
+        caches['job_details'].clear()
+
+    @mock.patch('core.utils._extract_job_details_uncached', return_value=JobDetails(job_title='Data Analyst', company='Acme'))
+    def test_posting_is_extracted_once(self, extract_uncached):
+        first = extract_job_details("Data Analyst at Acme.\n\nSQL required.")
+        second = extract_job_details("  Data Analyst at Acme. SQL   required. ")
+
+        self.assertEqual(first, second)
+        self.assertEqual(extract_uncached.call_count, 1)
+
+    @override_settings(JOB_DETAILS_MODEL='extraction-model')
+    def test_request_uses_the_configured_model(self):
+        self.assertEqual(utils.job_details_request("Data Analyst at Acme")['model'], 'extraction-model')
+
+    @mock.patch('core.utils._extract_job_details_uncached', return_value=JobDetails(job_title='Data Analyst', company='Acme'))
+    def test_shared_cache_backs_the_in_process_lru(self, extract_uncached):
+        extract_job_details("Data Analyst at Acme")
+        # As a worker process would, with its own (empty) LRU
+        utils._job_details_lru.clear()
+
+        self.assertEqual(extract_job_details("Data Analyst at Acme").company, 'Acme')
+        self.assertEqual(extract_uncached.call_count, 1)
+
+
+@override_settings(
+    LLM_RESPONSE_CACHE_ENABLED=True,
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'llm_responses': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'llm-tests'},
+    },
+)
+class LLMResponseCacheTestCase(TestCase):
+    def setUp(self):
+        caches['llm_responses'].clear()
+        self.client_mock = mock.MagicMock()
+        self.client_mock.beta.chat.completions.parse.return_value.choices = [
+            mock.MagicMock(message=mock.MagicMock(parsed=LatexOutput(latex_code='cached')))
+        ]
+
+    def parse(self, prompt, **kwargs):
+        return parse_completion(
+            self.client_mock,
+            model='gpt-4o-2024-08-06',
+            messages=[{'role': 'user', 'content': prompt}],
+            response_format=LatexOutput,
+            max_tokens=100,
+            temperature=0.7,
+            **kwargs
+        )
+
+    def test_identical_requests_are_served_from_cache(self):
+        self.assertEqual(self.parse('same prompt').latex_code, 'cached')
+        self.assertEqual(self.parse('same prompt').latex_code, 'cached')
+        self.parse('different prompt')
+
+        self.assertEqual(self.client_mock.beta.chat.completions.parse.call_count, 2)
+
+    def test_bypass_cache_calls_the_api(self):
+        self.parse('same prompt')
+        self.parse('same prompt', bypass_cache=True)
+
+        self.assertEqual(self.client_mock.beta.chat.completions.parse.call_count, 2)
+
+    @override_settings(LLM_RESPONSE_CACHE_ENABLED=False)
+    def test_cache_is_opt_in(self):
+        self.parse('same prompt')
+        self.parse('same prompt')
+
+        self.assertEqual(self.client_mock.beta.chat.completions.parse.call_count, 2)
+
+
+class RateLimiterTestCase(TestCase):
+    def api_error(self, status_code):
+        response = httpx.Response(status_code, request=httpx.Request('POST', 'https://api.openai.com/v1/chat/completions'))
+        error_class = openai.RateLimitError if status_code == 429 else openai.APIStatusError
+        return error_class("error", response=response, body=None)
+
+    def test_users_take_turns(self):
+        now = [0.0]
+        limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=0, clock=lambda: now[0])
+        with limiter._condition:
+            limiter._requests = 0  # Start with an empty budget
+            first_a = limiter._enqueue('a', 1)
+            second_a = limiter._enqueue('a', 1)
+            first_b = limiter._enqueue('b', 1)
+
+            self.assertAlmostEqual(limiter._try_grant(first_a), 1.0)
+            now[0] += 1
+            self.assertEqual(limiter._try_grant(first_a), 0)
+            # User b is served before user a's second call
+            self.assertIsNone(limiter._try_grant(second_a))
+            now[0] += 1
+            self.assertEqual(limiter._try_grant(first_b), 0)
+            now[0] += 1
+            self.assertEqual(limiter._try_grant(second_a), 0)
+
+    def test_token_budget_uses_prompt_estimate(self):
+        messages = [{'role': 'user', 'content': 'x' * 400}]
+        self.assertEqual(estimate_tokens(messages, 50), 150)
+
+        now = [0.0]
+        limiter = RateLimiter(requests_per_minute=0, tokens_per_minute=200, clock=lambda: now[0])
+        self.assertEqual(limiter.acquire('a', 150), 0)
+        with limiter._condition:
+            # 100 more tokens need the 50 missing ones to refill: 15 seconds at 200 per minute
+            self.assertAlmostEqual(limiter._try_grant(limiter._enqueue('a', 100)), 15.0)
+
+    @override_settings(OPENAI_BACKOFF_BASE=0, OPENAI_MAX_RETRIES=3)
+    def test_retries_rate_limited_and_server_errors(self):
+        func = mock.Mock(side_effect=[self.api_error(429), self.api_error(503), 'ok'])
+        self.assertEqual(call_with_rate_limit(func, [], 10), 'ok')
+        self.assertEqual(func.call_count, 3)
+
+        func = mock.Mock(side_effect=self.api_error(400))
+        with self.assertRaises(openai.APIStatusError):
+            call_with_rate_limit(func, [], 10)
+        self.assertEqual(func.call_count, 1)
+
+
+    @override_settings(OPENAI_BACKOFF_BASE=0.01)
+    def test_stream_retries_only_before_its_first_event(self):
+        attempts = []
+
+        def open_stream(events, error):
+            @asynccontextmanager
+            async def stream():
+                attempts.append(error)
+
+                async def iterate():
+                    for event in events:
+                        yield event
+                    if error is not None:
+                        raise error
+                yield iterate()
+            return stream
+
+        async def finish(stream):
+            return 'done'
+
+        async def consume(streams):
+            streams = iter(streams)
+            return [item async for item in astream_with_rate_limit(lambda: next(streams)(), finish, [], 10)]
+
+        metrics.registry.clear()
+        items = asyncio.run(consume([open_stream([], self.api_error(503)), open_stream(['a', 'b'], None)]))
+        self.assertEqual(items, [('event', 'a'), ('event', 'b'), ('result', 'done')])
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual(metrics.registry.value('autocv_stage_duration_seconds', stage='rate_limit_wait'), 2)
+
+        # Events were already yielded: the error is raised, not retried
+        with self.assertRaises(openai.APIStatusError):
+            asyncio.run(consume([open_stream(['a'], self.api_error(503)), open_stream(['a'], None)]))
+        metrics.registry.clear()
+
+
+class OpenAIClientTestCase(TestCase):
+    def setUp(self):
+        patcher = mock.patch.dict(llm._clients, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @override_settings(OPENAI_MAX_CONNECTIONS=7, OPENAI_CONNECT_TIMEOUT=2.0, OPENAI_READ_TIMEOUT=30.0)
+    def test_client_is_shared(self):
+        client = llm.get_openai_client()
+        self.assertIs(llm.get_openai_client(), client)
+        self.assertIsNot(llm.get_async_openai_client(), client)
+        self.assertEqual(client.max_retries, 0)
+        self.assertEqual(client.timeout.connect, 2.0)
+        self.assertEqual(client.timeout.read, 30.0)
+        self.assertEqual(client._client._transport._pool._max_connections, 7)
+
+    @override_settings(OPENAI_GENERATION_TIMEOUT=45.0)
+    def test_generation_calls_use_their_timeout(self):
+        client = mock.Mock()
+        client.beta.chat.completions.parse.return_value.choices = [mock.Mock(message=mock.Mock(parsed=LatexOutput(latex_code='x')))]
+        with mock.patch('core.generation.get_openai_client', return_value=client):
+            generation.request_document("A posting", 'cv', '{}', bypass_cache=True)
+        timeout = client.beta.chat.completions.parse.call_args.kwargs['timeout']
+        self.assertEqual(timeout.read, 45.0)
+
+
+class CVSectionsTestCase(TemporaryDirectoryMixin, TestCase):
+    def setUp(self):
+        self.temporary_directory('MEDIA_ROOT')
+        self.user = User.objects.create_user('jane', 'jane@example.com', 'password')
+        self.generation = Generation.objects.create(
+            user=self.user,
+            job_description='Data Analyst at Acme',
+            generation_type='cv',
+            job_title='Data Analyst',
+            company='Acme',
+            json_output={'latex_code': cv_template},
+        )
+
+    def test_split_and_assemble(self):
+        parts = split_cv_sections(cv_template)
+        self.assertEqual(
+            [key for key, _ in parts],
+            ['preamble', 'header', 'summary', 'education', 'experience', 'skills', 'flexible', 'closing'],
+        )
+        self.assertTrue(dict(parts)['skills'].lstrip().startswith('\\section*{Skills}'))
+        self.assertEqual(assemble_sections(parts), cv_template)
+
+    @mock.patch('core.artifacts.get_pdf', return_value=b'%PDF-1.5 test')
+    def test_regenerates_only_stale_sections(self, get_pdf):
+        store_cv_sections(self.generation, build_user_info(self.user))
+        Experience.objects.create(
+            profile=self.user.userprofile, company='Acme', title='Analyst', start_date=date(2022, 1, 1)
+        )
+
+        def fake_parse_completion(client, bypass_cache=False, **request_kwargs):
+            prompt = request_kwargs['messages'][1]['content']
+            # Only the profile parts the section is written from are sent
+            self.assertNotIn('"publications"', prompt)
+            heading = 'Professional Summary' if '**Section:** Professional Summary' in prompt else 'Professional Experience'
+            return LatexOutput(latex_code=f'\\section*{{{heading}}}\nRewritten {heading}.')
+
+        self.client.force_login(self.user)
+        with mock.patch('core.generation.parse_completion', side_effect=fake_parse_completion) as parse_completion:
+            response = self.client.post(reverse('regenerate_sections', args=[self.generation.id]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['regenerated'], ['summary', 'experience'])
+        self.assertEqual(parse_completion.call_count, 2)
+        latex_code = Generation.objects.get(id=self.generation.id).json_output['latex_code']
+        self.assertIn('Rewritten Professional Experience.', latex_code)
+        self.assertNotIn('XYZ Corporation', latex_code)
+        self.assertIn('New York University', latex_code)
+        self.assertTrue(Generation.objects.get(id=self.generation.id).has_pdf_artifact)
+
+        # Nothing changed since: no LLM call
+        with mock.patch('core.generation.parse_completion') as parse_completion:
+            response = self.client.post(reverse('regenerate_sections', args=[self.generation.id]))
+        self.assertEqual(response.json()['regenerated'], [])
+        parse_completion.assert_not_called()
+
+    def test_failed_recompile_keeps_previous_pdf(self):
+        store_cv_sections(self.generation, build_user_info(self.user))
+        with mock.patch('core.artifacts.get_pdf', return_value=b'%PDF-1.5 previous'):
+            create_pdf_artifact(self.generation)
+        generation_with_artifact = Generation.objects.select_related('artifact').get(id=self.generation.id)
+
+        with mock.patch('core.generation.parse_completion',
+                        return_value=LatexOutput(latex_code='\\section*{Professional Summary}\nRewritten.')), \
+                mock.patch('core.artifacts.get_pdf', side_effect=latex.LatexCompilationError('Undefined control sequence')):
+            result = generation.regenerate_cv_sections(generation_with_artifact, ['summary'])
+
+        self.assertEqual(result['regenerated'], ['summary'])
+        self.assertFalse(result['pdf_ready'])
+        artifact = Generation.objects.get(id=self.generation.id).artifact
+        with artifact.pdf_file.open('rb') as pdf_file:
+            self.assertEqual(pdf_file.read(), b'%PDF-1.5 previous')
+        self.assertEqual(generation_with_artifact.artifact.id, artifact.id)
+        previous_compiled_at = artifact.compiled_at
+
+        # A successful recompile updates the same artifact and the cached relation
+        with mock.patch('core.generation.parse_completion',
+                        return_value=LatexOutput(latex_code='\\section*{Professional Summary}\nAgain.')), \
+                mock.patch('core.artifacts.get_pdf', return_value=b'%PDF-1.5 new'):
+            result = generation.regenerate_cv_sections(generation_with_artifact, ['summary'])
+        self.assertTrue(result['pdf_ready'])
+        with generation_with_artifact.artifact.pdf_file.open('rb') as pdf_file:
+            self.assertEqual(pdf_file.read(), b'%PDF-1.5 new')
+        artifact = Generation.objects.get(id=self.generation.id).artifact
+        self.assertEqual(artifact.size_bytes, len(b'%PDF-1.5 new'))
+        self.assertGreater(artifact.compiled_at, previous_compiled_at)
+
+    def test_regenerated_pdf_is_modified_since_the_previous_one(self):
+        store_cv_sections(self.generation, build_user_info(self.user))
+        with mock.patch('core.artifacts.get_pdf', return_value=b'%PDF-1.5 previous'):
+            create_pdf_artifact(self.generation)
+        # Compiled an hour ago, so the two compile times fall in different seconds
+        PDFArtifact.objects.filter(generation=self.generation).update(
+            compiled_at=timezone.now() - timedelta(hours=1)
+        )
+        self.client.force_login(self.user)
+        url = reverse('serve_pdf', args=[self.generation.id])
+        last_modified = self.client.get(url)['Last-Modified']
+
+        with mock.patch('core.generation.parse_completion',
+                        return_value=LatexOutput(latex_code='\\section*{Professional Summary}\nRewritten.')), \
+                mock.patch('core.artifacts.get_pdf', return_value=b'%PDF-1.5 new'):
+            generation.regenerate_cv_sections(Generation.objects.get(id=self.generation.id), ['summary'])
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.5 new')
+
+    @override_settings(LOCAL_LATEX_RENDERING=True)
+    @mock.patch('core.artifacts.get_pdf', return_value=b'%PDF-1.5 test')
+    def test_structural_sections_are_rendered_locally(self, get_pdf):
+        store_cv_sections(self.generation, build_user_info(self.user))
+        self.user.userprofile.phone = '+1 555 0100'
+        self.user.userprofile.save()
+
+        self.client.force_login(self.user)
+        with mock.patch('core.generation.parse_completion') as parse_completion:
+            response = self.client.post(reverse('regenerate_sections', args=[self.generation.id]))
+
+        self.assertEqual(response.json()['regenerated'], ['header'])
+        parse_completion.assert_not_called()
+        latex_code = Generation.objects.get(id=self.generation.id).json_output['latex_code']
+        self.assertIn('+1 555 0100', latex_code)
+        self.assertIn('XYZ Corporation', latex_code)
+
+    def test_rejects_unknown_sections(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('regenerate_sections', args=[self.generation.id]), {'sections': ['hobbies']})
+        self.assertEqual(response.status_code, 400)
+
+
+class StartupTestCase(TestCase):
+    def test_parse_importtime(self):
+        output = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       100 |        100 |     json.decoder\n"
+            "import time:       200 |        300 |   json\n"
+            "import time:       500 |        800 | core.urls\n"
+            "import time:        50 |         50 | re\n"
+        )
+        total_ms, modules = benchmarks.parse_importtime(output)
+        self.assertAlmostEqual(total_ms, 0.85)
+        self.assertAlmostEqual(modules['json'], 0.3)
+
+    def test_boot_does_not_import_openai(self):
+        result = benchmarks.measure_startup(runs=1)
+        self.assertIn('core.views', result['modules'])
+        for name in benchmarks.LAZY_MODULES:
+            self.assertNotIn(name, result['modules'])
+
+
+class PromptSizeTestCase(TestCase):
+    def test_compact_user_info_drops_empty_fields(self):
+        user_info = {'name': 'Jane Doe', 'phone': '', 'publications': [], 'experience': [{'title': 'Analyst', 'city': ''}]}
+        compact = utils.user_info_to_prompt_format(user_info)
+        self.assertEqual(json.loads(compact), {'name': 'Jane Doe', 'experience': [{'title': 'Analyst'}]})
+        self.assertNotIn('\n', compact)
+        self.assertLess(len(compact), len(utils.user_info_to_prompt_format(user_info, compact=False)))
+
+    def test_compact_latex_strips_indentation_and_comments(self):
+        latex_code = "% Preamble\n\\begin{itemize}\n\n    \\item 50\\% faster\n\\end{itemize}\n"
+        self.assertEqual(utils.compact_latex(latex_code), "\\begin{itemize}\n\\item 50\\% faster\n\\end{itemize}")
+
+    def test_prompt_token_report(self):
+        User.objects.create_user('jane', 'jane@example.com', 'password')
+        out = io.StringIO()
+        call_command('prompt_token_report', 'jane', stdout=out)
+        rows = {line.split('  ')[0]: line for line in out.getvalue().splitlines()}
+        self.assertIn('CV, full template', rows)
+        self.assertIn('CV section: experience', rows)
+
+
+class GenerationBenchmarkTestCase(TestCase):
+    def test_percentiles(self):
+        result = benchmarks.summarize_latencies([100, 200, 300, 400, 500], wall_seconds=1.0, workers=2)
+        self.assertEqual(result['p50_ms'], 300)
+        self.assertAlmostEqual(result['p95_ms'], 480)
+        self.assertEqual(result['requests_per_second'], 5)
+        self.assertAlmostEqual(result['worker_utilization'], 0.75)
+
+    @mock.patch('core.artifacts.get_pdf', return_value=b'%PDF-1.5 test')
+    def test_single_scenario_against_stub(self, get_pdf):
+        with benchmarks.stub_llm(latency=0, tokens_per_second=0, requests_per_minute=0, tokens_per_minute=0) as stub:
+            result = benchmarks.run_load_scenario('single', requests=2)
+            stats = stub.stats()
+        self.assertEqual((result['requests'], result['errors']), (2, 0))
+        # Job details, CV and cover letter for each posting
+        self.assertEqual(stats['requests'], 6)
+        # PDF compilation is not part of the measurement
+        get_pdf.assert_not_called()
+        self.assertFalse(PDFArtifact.objects.exists())
+        self.assertIsNone(llm._clients.get('sync'))
+
+
+class FakeLatexBackend(latex.LatexBackend):
+    name = 'fake'
+
+    def compile(self, latex_code):
+        return latex.CompileResult(pdf=b'%PDF-1.5 ' + latex_code.encode('utf-8'), backend=self.name)
+
+
+class LatexBenchmarkTestCase(TestCase):
+    def test_corpus(self):
+        corpus = benchmarks.compile_corpus()
+        self.assertIn('example_cv', corpus)
+        self.assertGreater(len(corpus['synthetic_cv_40']), len(corpus['synthetic_cv_10']))
+        self.assertEqual(split_cv_sections(corpus['synthetic_cv_10'])[-2][0], 'flexible')
+
+    def test_compile_runs_with_a_backend_class(self):
+        result = benchmarks.compile_runs('cv_template', 'core.tests.FakeLatexBackend', 2)
+        self.assertGreater(result['pdf_bytes'], len(cv_template))
+        self.assertGreaterEqual(result['wall_ms'], 0)
+
+    def test_compare_to_baseline(self):
+        baseline = {
+            'cv/pdflatex': {'wall_ms': 500, 'cpu_ms': 400, 'peak_rss_kb': 40000, 'pdf_bytes': 30000},
+            'letter/pdflatex': {'wall_ms': 400, 'cpu_ms': 300, 'peak_rss_kb': 40000, 'pdf_bytes': 20000},
+        }
+        results = {
+            # Within the noise floor and the threshold
+            'cv/pdflatex': {'wall_ms': 515, 'cpu_ms': 460, 'peak_rss_kb': 41000, 'pdf_bytes': 30000},
+            'letter/pdflatex': {'error': 'pdflatex failed'},
+            'new/pdflatex': {'wall_ms': 900, 'cpu_ms': 800, 'peak_rss_kb': 40000, 'pdf_bytes': 30000},
+        }
+        self.assertEqual(benchmarks.compare_to_baseline(results, baseline, threshold=0.2), [
+            'letter/pdflatex: compiled in the baseline, now fails: pdflatex failed',
+        ])
+        results['cv/pdflatex']['wall_ms'] = 700
+        self.assertEqual(len(benchmarks.compare_to_baseline(results, baseline, threshold=0.2)), 2)
+
+
+class MetricsTestCase(TestCase):
+    def setUp(self):
+        metrics.registry.clear()
+        self.addCleanup(metrics.registry.clear)
+
+    def test_render_prometheus_format(self):
+        with metrics.span('prompt_build'):
+            pass
+        metrics.registry.inc('autocv_llm_tokens_total', 120, model='gpt-4o', type='prompt')
+        output = metrics.registry.render()
+        self.assertIn('# TYPE autocv_stage_duration_seconds histogram', output)
+        self.assertIn('autocv_stage_duration_seconds_bucket{stage="prompt_build",le="+Inf"} 1', output)
+        self.assertIn('autocv_stage_duration_seconds_count{stage="prompt_build"} 1', output)
+        self.assertIn('autocv_llm_tokens_total{model="gpt-4o",type="prompt"} 120', output)
+
+    def test_server_timing_header(self):
+        header = metrics.server_timing_header([('completion', 900.0), ('profile', 2.0), ('completion', 1100.0)], 1500.0)
+        self.assertEqual(header, 'completion;dur=2000.0;desc="2 calls", profile;dur=2.0, total;dur=1500.0')
+
+    def test_completion_tokens_are_counted(self):
+        with benchmarks.stub_llm(latency=0, tokens_per_second=0) as stub:
+            parse_completion(
+                llm.get_openai_client(), 'gpt-4o', [{'role': 'user', 'content': 'Extract this.'}], JobDetails,
+                max_tokens=100, temperature=0, bypass_cache=True,
+            )
+        self.assertEqual(metrics.registry.value('autocv_stage_duration_seconds', stage='completion'), 1)
+        self.assertEqual(metrics.registry.value('autocv_llm_requests_total', model='gpt-4o', response_format='JobDetails'), 1)
+        self.assertGreater(metrics.registry.value('autocv_llm_tokens_total', model='gpt-4o', type='completion'), 0)
+
+    def test_streamed_completion_time_excludes_the_consumer(self):
+        async def consume():
+            slow = True
+            async for kind, value in llm.astream_completion(
+                llm.get_async_openai_client(), 'gpt-4o', [{'role': 'user', 'content': 'Write this.'}], LatexOutput,
+                max_tokens=100, temperature=0, bypass_cache=True,
+            ):
+                if kind == 'delta' and slow:
+                    await asyncio.sleep(0.3)  # A slow client reading the first delta
+                    slow = False
+
+        with benchmarks.stub_llm(latency=0, tokens_per_second=0), usage.collect_usage() as records:
+            asyncio.run(consume())
+        self.assertEqual(metrics.registry.value('autocv_stage_duration_seconds', stage='completion'), 1)
+        self.assertLess(records[0]['latency_ms'], 300)
+
+    @override_settings(SERVER_TIMING_ENABLED=True)
+    def test_server_timing_on_responses(self):
+        user = User.objects.create_user('jane', 'jane@example.com', 'password')
+        self.client.force_login(user)
+        response = self.client.get(reverse('view_profile'))
+        self.assertIn('total;dur=', response['Server-Timing'])
+        self.assertEqual(metrics.registry.value('autocv_http_request_duration_seconds', view='view_profile', status=200), 1)
+
+    def test_metrics_endpoint_is_off_by_default(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+        with override_settings(METRICS_ENABLED=True, METRICS_AUTH_TOKEN='', DEBUG=False):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+
+    @override_settings(METRICS_ENABLED=True, METRICS_AUTH_TOKEN='secret')
+    def test_metrics_endpoint(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'# TYPE autocv_llm_tokens_total counter', response.content)
+
+
+class LoggingTestCase(TestCase):
+    @override_settings(LOG_PAYLOAD_MAX_CHARS=10, LOG_PAYLOAD_SAMPLE_RATE=0.0)
+    def test_payloads_are_truncated(self):
+        self.assertEqual(log.truncate_payload('short'), 'short')
+        self.assertEqual(log.truncate_payload('x' * 25), 'x' * 10 + '... [15 more characters]')
+
+        logger = logging.getLogger('core.tests.payload')
+        with self.assertLogs(logger, 'DEBUG') as logs:
+            log.log_payload(logger, logging.DEBUG, "pdflatex stdout", b'y' * 1000)
+        self.assertNotIn('y' * 11, logs.output[0])
+        self.assertIn('[990 more characters]', logs.output[0])
+
+    @override_settings(LOG_PAYLOAD_MAX_CHARS=10, LOG_PAYLOAD_SAMPLE_RATE=1.0)
+    def test_sampled_payloads_are_complete(self):
+        logger = logging.getLogger('core.tests.payload')
+        with self.assertLogs(logger, 'DEBUG') as logs:
+            log.log_payload(logger, logging.DEBUG, "pdflatex stdout", 'y' * 1000)
+        self.assertIn('y' * 1000, logs.output[0])
+
+    def test_queue_handler_writes_json_lines(self):
+        stream = io.StringIO()
+        handler = log.QueueStreamHandler(stream)
+        handler.setFormatter(log.JsonFormatter())
+        logger = logging.getLogger('core.tests.queue')
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+        logger.warning("Compiled %s in %d ms", 'cv', 812)
+        handler.close()
+        entry = json.loads(stream.getvalue())
+        self.assertEqual((entry['level'], entry['message']), ('WARNING', 'Compiled cv in 812 ms'))
+
+    def test_queue_handler_drops_records_when_full(self):
+        handler = log.QueueStreamHandler(io.StringIO(), maxsize=1)
+        # Nothing consumes the queue once the listener is stopped
+        handler.close()
+        record = logging.LogRecord('core', logging.INFO, __file__, 1, "message", None, None)
+        handler.handle(record)
+        handler.handle(record)
+        self.assertEqual(handler.dropped, 1)
+        # As on exit, after logging.shutdown closed it
+        handler.close()
+
+
+class UsageTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('jane', 'jane@example.com', 'password')
+
+    def test_completion_cost(self):
+        self.assertEqual(usage.completion_cost('gpt-4o-2024-08-06', 1_000_000, 100_000), Decimal('3.5'))
+        self.assertIsNone(usage.completion_cost('unknown-model', 1000, 1000))
+
+    @mock.patch('core.artifacts.get_pdf', return_value=b'%PDF-1.5 test')
+    def test_generation_usage_is_linked(self, get_pdf):
+        # A new posting, so the job details are not memoized from another test
+        job_description = f"Data Analyst at Acme Corp ({uuid.uuid4().hex})"
+        with benchmarks.stub_llm(latency=0, tokens_per_second=0, requests_per_minute=0, tokens_per_minute=0):
+            result = run_generation(self.user, job_description, ['cv', 'cover_letter'])
+
+        cv, cover_letter = (Generation.objects.get(id=doc['generation_id']) for doc in result['documents'])
+        self.assertEqual(
+            sorted(record.purpose for record in cv.usage_records.all()),
+            sorted(['JobDetails', generation.document_response_format('cv').__name__]),
+        )
+        self.assertEqual(cover_letter.usage_records.count(), 1)
+        records = UsageRecord.objects.filter(user=self.user)
+        self.assertEqual(records.count(), 3)
+        for record in records:
+            self.assertGreater(record.prompt_tokens, 0)
+            self.assertEqual(record.total_tokens, record.prompt_tokens + record.completion_tokens)
+            self.assertGreater(record.cost, 0)
+        self.assertEqual(usage.tokens_used_today(self.user), sum(record.total_tokens for record in records))
+
+    @mock.patch('core.generation.create_pdf_artifact', side_effect=OSError('disk full'))
+    def test_usage_is_stored_once_when_saving_fails(self, create_pdf_artifact):
+        job_description = f"Data Analyst at Acme Corp ({uuid.uuid4().hex})"
+        with benchmarks.stub_llm(latency=0, tokens_per_second=0, requests_per_minute=0, tokens_per_minute=0):
+            result = run_generation(self.user, job_description, ['cv', 'cover_letter'])
+
+        self.assertEqual(len(result['errors']), 2)
+        # The documents were stored before their PDF failed, with their calls
+        records = UsageRecord.objects.filter(user=self.user)
+        self.assertEqual(records.count(), 3)
+        self.assertFalse(records.filter(generation=None).exists())
+
+    @override_settings(USER_DAILY_TOKEN_BUDGET=1000)
+    def test_token_budget(self):
+        usage.check_token_budget(self.user)
+        usage.save_usage(self.user, [
+            {'purpose': 'CVContent', 'model': 'gpt-4o-2024-08-06', 'prompt_tokens': 900, 'completion_tokens': 200,
+             'latency_ms': 1500},
+        ])
+        with self.assertRaises(usage.TokenBudgetExceeded):
+            usage.check_token_budget(self.user)
+        with self.assertRaises(usage.TokenBudgetExceeded):
+            run_generation(self.user, 'Data Analyst at Acme', ['cv'])
+
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('generate_documents'), {
+            'job_description': 'Data Analyst at Acme',
+            'generate_cv': 'on',
+        })
+        self.assertEqual(response.status_code, 429)
+        self.assertFalse(GenerationJob.objects.filter(user=self.user).exists())
+
+    def test_usage_report_command(self):
+        usage.save_usage(self.user, [
+            {'purpose': 'JobDetails', 'model': 'gpt-4o-2024-08-06', 'prompt_tokens': 200, 'completion_tokens': 20,
+             'latency_ms': 800},
+            {'purpose': 'CVContent', 'model': 'gpt-4o-2024-08-06', 'prompt_tokens': 1500, 'completion_tokens': 900,
+             'latency_ms': 9000},
+        ])
+        report = usage.usage_report(group_by='purpose')
+        self.assertEqual([row['group'] for row in report], ['CVContent', 'JobDetails'])
+        self.assertEqual(report[0]['total_tokens'], 2400)
+
+        out = io.StringIO()
+        call_command('usage_report', '--by', 'user', stdout=out)
+        self.assertIn('jane', out.getvalue())
+        self.assertIn('Total: 2620 tokens', out.getvalue())
+
+
+class GenerationStreamTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('jane', 'jane@example.com', 'password')
+        self.async_client.force_login(self.user)
+
+    async def fake_astream_completion(self, async_client, bypass_cache=False, **request_kwargs):
+        for chunk in ['\\document', 'class{article}']:
+            yield 'delta', chunk
+        yield 'parsed', LatexOutput(latex_code='\\documentclass{article}')
+
+    @mock.patch('core.streaming.aextract_job_details', return_value=JobDetails(job_title='Data Analyst', company='Acme'))
+    @mock.patch('core.generation.create_pdf_artifact')
+    async def test_stream_reports_progress_events(self, create_pdf_artifact, aextract_job_details):
+        with mock.patch('core.streaming.astream_completion', new=self.fake_astream_completion):
+            response = await self.async_client.post(reverse('generate_documents_stream'), {
+                'job_description': 'Data Analyst at Acme',
+                'generate_cv': 'on',
+                'generate_cover_letter': 'on',
+            })
+            body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = [line[len('event: '):] for line in body.splitlines() if line.startswith('event: ')]
+        self.assertEqual(events[0], 'started')
+        self.assertIn('job_details', events)
+        self.assertIn('tokens', events)
+        self.assertEqual(events.count('compiled'), 2)
+        self.assertEqual(events[-1], 'done')
+        count = await sync_to_async(Generation.objects.filter(user=self.user, company='Acme').count)()
+        self.assertEqual(count, 2)
+
+    def test_stream_requires_login(self):
+        response = self.client.post(reverse('generate_documents_stream'), {'job_description': 'x'})
+        self.assertEqual(response.status_code, 401)
+
+
+class AsyncGenerationTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('jane', 'jane@example.com', 'password')
+        self.async_client.force_login(self.user)
+
+    @mock.patch('core.generation.aextract_job_details', return_value=JobDetails(job_title='Data Analyst', company='Acme'))
+    @mock.patch('core.generation.arequest_document', return_value=LatexOutput(latex_code='\\documentclass{article}'))
+    @mock.patch('core.generation.create_pdf_artifact')
+    async def test_async_view_generates_documents(self, create_pdf_artifact, arequest_document, aextract_job_details):
+        response = await self.async_client.post(reverse('generate_documents_async'), {
+            'job_description': 'Data Analyst at Acme',
+            'generate_cv': 'on',
+            'generate_cover_letter': 'on',
+        })
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([doc['type'] for doc in data['documents']], ['Cv', 'Cover Letter'])
+        self.assertEqual(data['errors'], [])
+        self.assertEqual(arequest_document.await_count, 2)
+        aextract_job_details.assert_awaited_once()
+
+    @mock.patch('core.generation.aextract_job_details', return_value=JobDetails(job_title='Data Analyst', company='Acme'))
+    @mock.patch('core.generation.create_pdf_artifact')
+    async def test_async_view_reports_failed_documents(self, create_pdf_artifact, aextract_job_details):
+        async def fake_arequest_document(job_description, gen_type, *args):
+            if gen_type == 'cover_letter':
+                raise RuntimeError('rate limited')
+            return LatexOutput(latex_code='\\documentclass{article}')
+
+        with mock.patch('core.generation.arequest_document', new=fake_arequest_document):
+            response = await self.async_client.post(reverse('generate_documents_async'), {
+                'job_description': 'Data Analyst at Acme',
+                'generate_cv': 'on',
+                'generate_cover_letter': 'on',
+            })
+
+        data = response.json()
+        self.assertEqual(len(data['documents']), 1)
+        self.assertEqual(data['errors'][0]['type'], 'Cover Letter')
@@ -0,0 +1,169 @@
+# core/tokens.py
+
+import importlib.util
+import logging
+
+from .generation import (
+    build_user_info_dict,
+    document_request,
+    section_request,
+)
+from .prompts import (
+    generate_cv_prompt,
+    generate_cover_letter_prompt,
+    generate_cv_prompt_fast,
+    generate_cover_letter_prompt_fast,
+    generate_cv_content_prompt,
+    generate_cover_letter_content_prompt,
+    generate_cv_section_prompt,
+)
+from .sections import CV_SECTIONS, SECTION_INPUTS, SECTION_TITLES, split_cv_sections
+from .templates import cv_template, cover_letter_template, cv_template_skeleton, cover_letter_template_skeleton
+from .utils import escape_latex_special_chars, job_details_request, user_info_to_prompt_format
+
+logger = logging.getLogger(__name__)
+
+# Used by prompt_token_report when no job description is given
+SAMPLE_JOB_DESCRIPTION = """
+Data Analyst - Acme Corp, New York
+
+Acme is looking for a Data Analyst to join its growing analytics team.
+
+Responsibilities:
+- Build and maintain dashboards in Tableau and Power BI.
+- Analyze customer behaviour data and present insights to stakeholders.
+- Design and evaluate A/B tests with the product team.
+
+Requirements:
+- 3+ years of experience with SQL and Python (pandas).
+- Experience with statistical analysis and experiment design.
+- Strong communication skills.
+"""
+
+
+def tokenizer_name():
+    """
+    Returns the name of the tokenizer used by count_tokens.
+    """
+    return 'tiktoken' if importlib.util.find_spec('tiktoken') else 'estimate (4 characters per token)'
+
+
+def count_tokens(text, model=None):
+    """
+    Counts the tokens of a text with tiktoken when it is installed, and otherwise
+    estimates one token per four characters (as the rate limiter does).
+
+    Args:
+        text (str): The text.
+        model (str): The model whose encoding is used.
+
+    Returns:
+        int: The number of tokens.
+    """
+    if not importlib.util.find_spec('tiktoken'):
+        return len(text) // 4
+    import tiktoken
+
+    try:
+        encoding = tiktoken.encoding_for_model(model or '')
+    except KeyError:
+        encoding = tiktoken.get_encoding('o200k_base')
+    return len(encoding.encode(text))
+
+
+def count_message_tokens(messages, model=None):
+    """
+    Counts the input tokens of chat messages, including the few tokens of overhead per message.
+    """
+    return sum(count_tokens(message['content'], model) + 3 for message in messages) + 3
+
+
+def _legacy_messages(system_prompt, prompt):
+    return [{"role": "system", "content": system_prompt}, {"role": "user", "content": prompt}]
+
+
+def prompt_token_report(user, job_description=SAMPLE_JOB_DESCRIPTION):
+    """
+    Counts the input tokens of every prompt sent for a user and a job description.
+
+    Where it applies, the prompt is also counted as it was built before the compact
+    prompt builder (indented profile JSON, full example templates, unnormalized
+    whitespace), as the baseline.
+
+    Args:
+        user (User): The user whose profile is used.
+        job_description (str): The job description.
+
+    Returns:
+        list: One dict per prompt: 'prompt', 'tokens', 'baseline_tokens' (None when there
+        is no baseline) and 'max_tokens' (the completion limit).
+    """
+    user_info = build_user_info_dict(user)
+    user_info_str = user_info_to_prompt_format(user_info)
+    indented_user_info = user_info_to_prompt_format(user_info, compact=False)
+    escaped_job_description = escape_latex_special_chars(job_description)
+    latex_system_prompt = "You are a helpful assistant designed to output LaTeX code in a structured format."
+    content_system_prompt = "You are a helpful assistant designed to write tailored CV and cover letter content in a structured format."
+
+    rows = [{
+        'prompt': "Profile (user information)",
+        'tokens': count_tokens(user_info_str),
+        'baseline_tokens': count_tokens(indented_user_info),
+        'max_tokens': None,
+    }]
+
+    baselines = {
+        ('cv', False, False): _legacy_messages(
+            latex_system_prompt, generate_cv_prompt(indented_user_info, escaped_job_description, cv_template)
+        ),
+        ('cv', True, False): _legacy_messages(
+            latex_system_prompt, generate_cv_prompt_fast(indented_user_info, escaped_job_description, cv_template_skeleton)
+        ),
+        ('cv', False, True): _legacy_messages(
+            content_system_prompt, generate_cv_content_prompt(indented_user_info, escaped_job_description)
+        ),
+        ('cover_letter', False, False): _legacy_messages(
+            latex_system_prompt,
+            generate_cover_letter_prompt(indented_user_info, escaped_job_description, cover_letter_template),
+        ),
+        ('cover_letter', True, False): _legacy_messages(
+            latex_system_prompt,
+            generate_cover_letter_prompt_fast(indented_user_info, escaped_job_description, cover_letter_template_skeleton),
+        ),
+        ('cover_letter', False, True): _legacy_messages(
+            content_system_prompt, generate_cover_letter_content_prompt(indented_user_info, escaped_job_description)
+        ),
+    }
+    for (gen_type, fast_mode, local_rendering), baseline in baselines.items():
+        request_kwargs = document_request(job_description, gen_type, user_info_str, fast_mode, local_rendering)
+        variant = 'local rendering' if local_rendering else 'fast mode' if fast_mode else 'full template'
+        rows.append({
+            'prompt': f"{'CV' if gen_type == 'cv' else 'Cover letter'}, {variant}",
+            'tokens': count_message_tokens(request_kwargs['messages'], request_kwargs['model']),
+            'baseline_tokens': count_message_tokens(baseline, request_kwargs['model']),
+            'max_tokens': request_kwargs['max_tokens'],
+        })
+
+    request_kwargs = job_details_request(job_description)
+    rows.append({
+        'prompt': "Job details extraction",
+        'tokens': count_message_tokens(request_kwargs['messages'], request_kwargs['model']),
+        'baseline_tokens': None,
+        'max_tokens': request_kwargs['max_tokens'],
+    })
+
+    # Section prompts, with the sections of the example CV as the current versions
+    example_sections = dict(split_cv_sections(cv_template))
+    for key in CV_SECTIONS:
+        request_kwargs = section_request(job_description, key, user_info, example_sections[key])
+        section_info = user_info_to_prompt_format({name: user_info.get(name) for name in SECTION_INPUTS[key]}, compact=False)
+        baseline = _legacy_messages(latex_system_prompt, generate_cv_section_prompt(
+            SECTION_TITLES[key], section_info, escaped_job_description, example_sections[key].strip()
+        ))
+        rows.append({
+            'prompt': f"CV section: {key}",
+            'tokens': count_message_tokens(request_kwargs['messages'], request_kwargs['model']),
+            'baseline_tokens': count_message_tokens(baseline, request_kwargs['model']),
+            'max_tokens': request_kwargs['max_tokens'],
+        })
+    return rows
@@ -7,7 +7,16 @@ urlpatterns = [
     path('', views.view_profile, name='view_profile'),
     path('edit-profile/', views.edit_profile, name='edit_profile'),
     path('generate-documents/', views.generate_documents, name='generate_documents'),
+    path('generate-documents/async/', views.generate_documents_async, name='generate_documents_async'),
+    path('generate-documents/stream/', views.generate_documents_stream, name='generate_documents_stream'),
+    path('bulk-generate/', views.bulk_generate, name='bulk_generate'),
+    path('batches/<int:batch_id>/', views.batch_status, name='batch_status'),
+    path('batches/<int:batch_id>/zip/', views.batch_zip, name='batch_zip'),
+    path('jobs/<int:job_id>/', views.job_status, name='job_status'),
     path('documents/', views.document_list, name='document_list'),
     path('render-latex/<int:generation_id>/', views.render_latex, name='render_latex'),
+    path('render-latex/<int:generation_id>/regenerate-sections/', views.regenerate_sections, name='regenerate_sections'),
+    path('pdf/<int:generation_id>/', views.serve_pdf, name='serve_pdf'),
     path('download-pdf/<int:generation_id>/', views.download_pdf, name='download_pdf'),
+    path('metrics', views.metrics, name='metrics'),
 ]
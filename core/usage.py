@@ -0,0 +1,257 @@
+# core/usage.py
+
+import contextvars
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Avg, Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import UsageRecord
+
+# The usage of the completion calls made in the current context, collected until the
+# generation they belong to is stored (see collect_usage). Threads and tasks started
+# with a copy of the context share the list.
+pending_usage = contextvars.ContextVar('pending_usage', default=None)
+
+# Columns usage_report can group by
+REPORT_GROUPS = {
+    'user': 'user__username',
+    'day': 'day',
+    'purpose': 'purpose',
+    'model': 'model',
+}
+
+
+class TokenBudgetExceeded(Exception):
+    """
+    Raised when a user has used up their daily token budget.
+    """
+
+
+def completion_cost(model, prompt_tokens, completion_tokens, batch=False):
+    """
+    Prices a completion call from settings.LLM_PRICES.
+
+    Args:
+        model (str): The model name.
+        prompt_tokens (int): The prompt tokens of the call.
+        completion_tokens (int): The completion tokens of the call.
+        batch (bool): The call was made through the Batch API, priced at
+            settings.LLM_BATCH_PRICE_FACTOR of the regular price.
+
+    Returns:
+        Decimal: The cost in USD, or None if the model has no price.
+    """
+    prices = settings.LLM_PRICES.get(model)
+    if prices is None:
+        return None
+    prompt_price, completion_price = (Decimal(str(price)) for price in prices)
+    cost = (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+    if batch:
+        cost *= Decimal(str(settings.LLM_BATCH_PRICE_FACTOR))
+    return cost
+
+
+def _token_counts(usage):
+    """
+    Returns the (prompt, completion) tokens of a usage object or dict, 0 when missing.
+    """
+    counts = []
+    for token_type in ('prompt', 'completion'):
+        if isinstance(usage, dict):
+            count = usage.get(f'{token_type}_tokens')
+        else:
+            count = getattr(usage, f'{token_type}_tokens', None)
+        counts.append(count if isinstance(count, int) else 0)
+    return tuple(counts)
+
+
+def record_usage(model, response_format, usage, seconds):
+    """
+    Adds the usage of a completion call to the records being collected, if any.
+
+    Args:
+        model (str): The model name.
+        response_format (type): The Pydantic model the response was parsed into.
+        usage (CompletionUsage): The usage reported by the API, if any.
+        seconds (float): The duration of the call, including rate limit waits and retries.
+    """
+    records = pending_usage.get()
+    if records is None:
+        return
+    prompt_tokens, completion_tokens = _token_counts(usage)
+    records.append({
+        'purpose': response_format.__name__,
+        'model': model,
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+        'latency_ms': int(seconds * 1000),
+    })
+
+
+def batch_usage_record(response_format, model, usage):
+    """
+    Builds the usage record of a Batch API request from the usage of its result line,
+    priced at the batch price (see completion_cost).
+
+    Args:
+        response_format (type): The Pydantic model the response is parsed into.
+        model (str): The model name.
+        usage (dict): The 'usage' of the response body.
+
+    Returns:
+        dict: A record for save_usage. Batch requests have no meaningful latency, so it is 0.
+    """
+    prompt_tokens, completion_tokens = _token_counts(usage)
+    return {
+        'purpose': response_format.__name__,
+        'model': model,
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+        'latency_ms': 0,
+        'cost': completion_cost(model, prompt_tokens, completion_tokens, batch=True),
+    }
+
+
+@contextmanager
+def collect_usage(records=None):
+    """
+    Collects the usage of the completion calls made within the block.
+
+    Args:
+        records (list): The list to append the records to; a new one by default.
+
+    Yields:
+        list: The collected records, for save_usage.
+    """
+    records = [] if records is None else records
+    token = pending_usage.set(records)
+    try:
+        yield records
+    finally:
+        pending_usage.reset(token)
+
+
+def call_collecting_usage(records, func, *args, **kwargs):
+    """
+    Calls func, appending the usage of its completion calls to records (kept on errors too).
+    """
+    with collect_usage(records):
+        return func(*args, **kwargs)
+
+
+async def acall_collecting_usage(records, coro):
+    """
+    Async version of call_collecting_usage: awaits coro.
+    """
+    with collect_usage(records):
+        return await coro
+
+
+def save_usage(user, records, generation=None):
+    """
+    Stores collected usage records, priced with completion_cost unless they carry their 'cost'.
+
+    Args:
+        user (User): The user the calls were made for.
+        records (list): Records from collect_usage.
+        generation (Generation): The document the calls produced; None for calls
+            whose document failed.
+
+    Returns:
+        list: The created UsageRecord rows.
+    """
+    if not records:
+        return []
+    return UsageRecord.objects.bulk_create([
+        UsageRecord(
+            user=user,
+            generation=generation,
+            total_tokens=record['prompt_tokens'] + record['completion_tokens'],
+            **{'cost': completion_cost(record['model'], record['prompt_tokens'], record['completion_tokens']), **record},
+        )
+        for record in records
+    ])
+
+
+def tokens_used_today(user):
+    """
+    Returns the tokens used by a user's completion calls since midnight (UTC).
+    """
+    start_of_day = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    used = UsageRecord.objects.filter(user=user, created_at__gte=start_of_day).aggregate(
+        total=Sum('total_tokens')
+    )['total']
+    return used or 0
+
+
+def check_token_budget(user, tokens=0):
+    """
+    Checks that a user has tokens left in settings.USER_DAILY_TOKEN_BUDGET.
+
+    The budget is checked before a generation starts, so the generation that crosses
+    it still completes. Work submitted in bulk (a Batch API batch) passes its
+    estimated tokens, and must fit in what is left.
+
+    Args:
+        user (User): The user.
+        tokens (int): The estimated tokens of the work about to be submitted.
+
+    Raises:
+        TokenBudgetExceeded: If the user's calls of the day used up the budget, or
+            the submitted work does not fit in it.
+    """
+    budget = settings.USER_DAILY_TOKEN_BUDGET
+    if budget <= 0:
+        return
+    used = tokens_used_today(user)
+    if used >= budget:
+        raise TokenBudgetExceeded(
+            f"You have used your daily budget of {budget} tokens ({used} used); it resets at midnight UTC."
+        )
+    if tokens and used + tokens > budget:
+        raise TokenBudgetExceeded(
+            f"This needs about {tokens} tokens, more than the {budget - used} left in your daily budget."
+        )
+
+
+def usage_report(days=7, group_by='user', username=None):
+    """
+    Aggregates the usage records of the last days.
+
+    Args:
+        days (int): The number of days covered, today included.
+        group_by (str): One of REPORT_GROUPS.
+        username (str): Only count this user's calls.
+
+    Returns:
+        list: One dict per group, the most expensive first, with 'group', 'calls',
+        'prompt_tokens', 'completion_tokens', 'total_tokens', 'cost' (USD, None when
+        no call of the group has a price) and 'avg_latency_ms'.
+    """
+    today = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    records = UsageRecord.objects.filter(created_at__gte=today - timedelta(days=days - 1))
+    if username:
+        records = records.filter(user__username=username)
+    column = REPORT_GROUPS[group_by]
+    rows = (
+        records.annotate(day=TruncDate('created_at'))
+        .values(column)
+        .annotate(
+            calls=Count('id'),
+            prompt_tokens=Sum('prompt_tokens'),
+            completion_tokens=Sum('completion_tokens'),
+            total_tokens=Sum('total_tokens'),
+            cost=Sum('cost'),
+            avg_latency_ms=Avg('latency_ms'),
+        )
+        .order_by(column)
+    )
+    report = [{'group': row.pop(column), **row} for row in rows]
+    if group_by != 'day':
+        report.sort(key=lambda row: (row['cost'] or 0, row['total_tokens']), reverse=True)
+    return report
@@ -3,12 +3,17 @@
 import json
 import re
 import logging
-from openai import OpenAI
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from asgiref.sync import sync_to_async
 from pydantic import BaseModel, ValidationError
 import os
 from django.conf import settings
-
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
+from django.core.cache import caches
+from .llm import aparse_completion, get_async_openai_client, get_openai_client, parse_completion
+from .metrics import span
 
 # Configure logger
 logger = logging.getLogger(__name__)
@@ -130,17 +135,88 @@ def format_user_list_field(field_data):
     return [escape_latex_special_chars(item) for item in field_list]
 
 
-def user_info_to_prompt_format(user_info):
+def prune_empty(value):
+    """
+    Removes empty strings, lists, dicts and None values from nested dicts and lists.
+
+    Args:
+        value: A JSON-serializable value.
+
+    Returns:
+        The value without its empty parts.
+    """
+    if isinstance(value, dict):
+        pruned = {key: prune_empty(item) for key, item in value.items()}
+        return {key: item for key, item in pruned.items() if item not in ('', None, [], {})}
+    if isinstance(value, list):
+        pruned = [prune_empty(item) for item in value]
+        return [item for item in pruned if item not in ('', None, [], {})]
+    return value
+
+
+def user_info_to_prompt_format(user_info, compact=True):
     """
     Formats the user_info dictionary into a JSON-formatted string for inclusion in the prompt.
 
+    The JSON is minified, and empty fields are left out when settings.PROMPT_PRUNE_EMPTY_FIELDS
+    is set, to keep the prompt short.
+
     Args:
         user_info (dict): The user information.
+        compact (bool): Use the compact format; False gives indented JSON with every field.
 
     Returns:
         str: The formatted user information as a JSON string.
     """
-    return json.dumps(user_info, indent=2)
+    if not compact:
+        return json.dumps(user_info, indent=2)
+    if settings.PROMPT_PRUNE_EMPTY_FIELDS:
+        user_info = prune_empty(user_info)
+    return json.dumps(user_info, separators=(',', ':'), ensure_ascii=False)
+
+
+_inline_spaces_re = re.compile(r'(?<=\S)[ \t]{2,}')
+_blank_lines_re = re.compile(r'\n{3,}')
+
+
+def compact_text(text):
+    """
+    Normalizes the whitespace of prompt text: trailing spaces, runs of spaces within a
+    line and runs of blank lines. Indentation at the start of a line is kept.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        str: The text with its whitespace normalized.
+    """
+    lines = [_inline_spaces_re.sub(' ', line.rstrip()) for line in text.strip().splitlines()]
+    return _blank_lines_re.sub('\n\n', '\n'.join(lines))
+
+
+def compact_latex(latex_code):
+    """
+    Strips the indentation, comment lines and blank lines of a LaTeX template, for
+    embedding in a prompt.
+
+    Args:
+        latex_code (str): The LaTeX template.
+
+    Returns:
+        str: The compacted template.
+    """
+    lines = (line.strip() for line in latex_code.splitlines())
+    return '\n'.join(line for line in lines if line and not line.startswith('%'))
+
+def sanitize_filename(filename):
+    """
+    Sanitizes the filename by removing or replacing invalid characters.
+    """
+    # Replace spaces with underscores
+    filename = filename.replace(' ', '_')
+    # Remove any character that is not alphanumeric, underscore, hyphen, or dot
+    filename = re.sub(r'[^\w\-.]', '', filename)
+    return filename
 
 def clean_latex(latex_escaped):
     """
@@ -170,11 +246,193 @@ class LatexOutput(BaseModel):
     latex_code: str
 
 
+class FastLatexOutput(BaseModel):
+    """
+    Fast Mode response: the document plus the job details, so no separate extraction call is needed.
+    """
+    job_title: str
+    company: str
+    latex_code: str
+
+
 class JobDetails(BaseModel):
     job_title: str
     company: str
 
+
+# Responses used when the structure of the documents is rendered locally (see core.rendering):
+# the model only writes the tailored prose, as plain text.
+
+class ExperienceBullets(BaseModel):
+    index: int  # Position of the entry in the user's experience list
+    bullets: list[str]
+
+
+class FlexibleItem(BaseModel):
+    label: str
+    content: str
+
+
+class CVContent(BaseModel):
+    summary: str
+    experience: list[ExperienceBullets]
+    flexible_title: str
+    flexible_items: list[FlexibleItem]
+
+
+class FastCVContent(CVContent):
+    """
+    Fast Mode CVContent, with the job details.
+    """
+    job_title: str
+    company: str
+
+
+class CoverLetterContent(BaseModel):
+    recipient: str
+    company: str
+    paragraphs: list[str]
+
+
+class FastCoverLetterContent(CoverLetterContent):
+    """
+    Fast Mode CoverLetterContent, with the job details.
+    """
+    job_title: str
+
+# In-process LRU of extracted job details, in front of the shared 'job_details' cache
+_job_details_lru = OrderedDict()
+_job_details_lru_lock = threading.Lock()
+JOB_DETAILS_LRU_SIZE = 256
+
+
+def job_description_hash(job_description):
+    """
+    Hashes a job description after normalizing its whitespace, so re-pasted postings share a key.
+
+    Args:
+        job_description (str): The job description text.
+
+    Returns:
+        str: The hex SHA-256 digest of the normalized text.
+    """
+    normalized = " ".join(job_description.split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def _get_memoized_job_details(key):
+    now = time.monotonic()
+    with _job_details_lru_lock:
+        entry = _job_details_lru.get(key)
+        if entry is not None:
+            expires_at, job_details = entry
+            if expires_at > now:
+                _job_details_lru.move_to_end(key)
+                return job_details
+            del _job_details_lru[key]
+
+    cached = caches['job_details'].get(f"job-details:{key}")
+    if cached is None:
+        return None
+    job_details = JobDetails(**cached)
+    _memoize_job_details(key, job_details)
+    return job_details
+
+
+def _memoize_job_details(key, job_details, store_in_cache=False):
+    ttl = settings.JOB_DETAILS_CACHE_TTL
+    with _job_details_lru_lock:
+        _job_details_lru[key] = (time.monotonic() + ttl, job_details)
+        _job_details_lru.move_to_end(key)
+        while len(_job_details_lru) > JOB_DETAILS_LRU_SIZE:
+            _job_details_lru.popitem(last=False)
+    if store_in_cache:
+        caches['job_details'].set(f"job-details:{key}", job_details.model_dump(), ttl)
+
+
 def extract_job_details(job_description: str) -> JobDetails:
+    """
+    Returns the job_title and company of a job description, extracting them with GPT
+    only the first time a posting is seen.
+
+    Results are memoized by job_description_hash in an in-process LRU and in the
+    'job_details' cache, shared by the web and worker processes, for
+    settings.JOB_DETAILS_CACHE_TTL seconds.
+
+    Args:
+        job_description (str): The job description text.
+
+    Returns:
+        JobDetails: A Pydantic model containing job_title and company.
+    """
+    key = job_description_hash(job_description)
+    job_details = _get_memoized_job_details(key)
+    if job_details is not None:
+        logger.debug(f"Job details cache hit for {key[:12]}.")
+        return job_details
+
+    with span('job_details'):
+        job_details = _extract_job_details_uncached(job_description)
+    _memoize_job_details(key, job_details, store_in_cache=True)
+    return job_details
+
+
+async def aextract_job_details(job_description: str) -> JobDetails:
+    """
+    Async version of extract_job_details, calling the API with the shared AsyncOpenAI client.
+
+    Shares the memoization of extract_job_details.
+    """
+    key = job_description_hash(job_description)
+    job_details = await sync_to_async(_get_memoized_job_details, thread_sensitive=False)(key)
+    if job_details is not None:
+        logger.debug(f"Job details cache hit for {key[:12]}.")
+        return job_details
+
+    try:
+        with span('job_details'):
+            job_details = await aparse_completion(get_async_openai_client(), **job_details_request(job_description))
+        logger.debug(f"Extracted Text from OpenAI: {job_details}")
+    except Exception as e:
+        logger.error(f"Unexpected error during job details extraction: {e}")
+        raise e
+
+    await sync_to_async(_memoize_job_details, thread_sensitive=False)(key, job_details, store_in_cache=True)
+    return job_details
+
+
+def job_details_request(job_description: str) -> dict:
+    """
+    Builds the keyword arguments of the job details extraction call, shared by the
+    direct calls, the Batch API requests and the prompt size report.
+    """
+    # Define the prompt
+    prompt = (
+            "Extract the job title and company from the following job description.\n\n"
+            "Job Description:\n"
+            f"{compact_text(job_description)}\n\n"
+            "Provide ONLY the JSON output with the following structure and no additional text:\n"
+            "```\n"
+            "{\n"
+            '  "job_title": "",\n'
+            '  "company": ""\n'
+            "}\n"
+            "```"
+    )
+    return {
+        'model': settings.JOB_DETAILS_MODEL,
+        'messages': [
+            {"role": "system", "content": "You are a helpful assistant designed to output Job details in JSON strcutured format."},
+            {"role": "user", "content": prompt}
+        ],
+        'response_format': JobDetails,
+        'max_tokens': 1000,
+        'temperature': 0.7,
+        'timeout': settings.OPENAI_EXTRACTION_TIMEOUT,
+    }
+
+
+def _extract_job_details_uncached(job_description: str) -> JobDetails:
     """
     Uses OpenAI's GPT to extract job_title and company from the job_description.
 
@@ -185,34 +443,8 @@ def extract_job_details(job_description: str) -> JobDetails:
         JobDetails: A Pydantic model containing job_title and company.
     """
     try:
-        # Define the prompt
-        prompt = (
-                "Extract the job title and company from the following job description.\n\n"
-                "Job Description:\n"
-                f"{job_description}\n\n"
-                "Provide ONLY the JSON output with the following structure and no additional text:\n"
-                "```\n"
-                "{\n"
-                '  "job_title": "",\n'
-                '  "company": ""\n'
-                "}\n"
-                "```"
-        )
-        
-        # Call OpenAI's Completion API
-        response = client.beta.chat.completions.parse(
-                        model="gpt-4o-2024-08-06",
-                        messages=[
-                            {"role": "system", "content": "You are a helpful assistant designed to output Job details in JSON strcutured format."},
-                            {"role": "user", "content": prompt}
-                        ],
-                        response_format=JobDetails,
-                        max_tokens=1000,
-                        temperature=0.7
-                    )
-                    
-                    # Extract the parsed response using the Pydantic model
-        JobOutput = response.choices[0].message.parsed
+        # Call OpenAI's Completion API, parsing the response into the Pydantic model
+        JobOutput = parse_completion(get_openai_client(), **job_details_request(job_description))
 
         logger.debug(f"Extracted Text from OpenAI: {JobOutput}")
         
@@ -220,4 +452,4 @@ def extract_job_details(job_description: str) -> JobDetails:
     
     except Exception as e:
         logger.error(f"Unexpected error during job details extraction: {e}")
-        raise e
\ No newline at end of file
+        raise e
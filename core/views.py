@@ -1,35 +1,31 @@
 # core/views.py
-import shutil
-import re
-from openai import OpenAI
-import json
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from .forms import (
     UserProfileForm, 
     EducationFormSet, 
     ExperienceFormSet, 
-    GenerationForm
+    GenerationForm,
+    BulkGenerationForm,
 )
-from .models import UserProfile, Education, Experience, Generation
-from .prompts import generate_cv_prompt, generate_cover_letter_prompt
-from .utils import (
-    escape_latex_special_chars,
-    format_user_experience,
-    format_user_education,
-    format_user_list_field,
-    user_info_to_prompt_format,
-    LatexOutput,  # Import the function schema,
-    clean_latex,
-    extract_job_details
-)
-from .templates import cv_template, cover_letter_template
+from .models import UserProfile, Education, Experience, Generation, GenerationJob, GenerationBatch
+from .bulk import create_generation_batch, batch_progress, batch_generations, write_batch_zip
+from .batch_api import submit_batch
+from .latex import prepare_latex_source, LatexCompilationError
+from .artifacts import get_or_create_pdf_artifact
+from .pdf_serving import pdf_artifact_response
+from .generation import document_filename, arun_generation, build_user_info, regenerate_cv_sections, GenerationError
+from .sections import CV_SECTIONS, SECTION_TITLES, SectionParseError, get_cv_sections, stale_sections
+from .jobs import enqueue_generation_job, job_status_payload
+from .streaming import stream_generation
+from .usage import TokenBudgetExceeded, check_token_budget
+from .log import truncate_payload
+from .metrics import registry
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from django.http import HttpResponse
-import subprocess
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+import hmac
 import tempfile
-import os
-import base64
 import logging
 from django.urls import reverse  # Import reverse
 from django.http import JsonResponse  # Import JsonResponse
@@ -37,9 +33,6 @@ from django.http import JsonResponse  # Import JsonResponse
 # Initialize logging
 logger = logging.getLogger(__name__)
 
-# Initialize the OpenAI client with the API key from settings
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
-
 @login_required
 def view_profile(request):
     profile = request.user.userprofile
@@ -92,16 +85,6 @@ def edit_profile(request):
     }
     return render(request, 'core/edit_profile.html', context)
 
-def sanitize_filename(filename):
-    """
-    Sanitizes the filename by removing or replacing invalid characters.
-    """
-    # Replace spaces with underscores
-    filename = filename.replace(' ', '_')
-    # Remove any character that is not alphanumeric, underscore, hyphen, or dot
-    filename = re.sub(r'[^\w\-.]', '', filename)
-    return filename
-
 @login_required
 def generate_documents(request):
     if request.method == 'POST':
@@ -110,130 +93,236 @@ def generate_documents(request):
             job_description = form.cleaned_data['job_description']
             generate_cv = form.cleaned_data['generate_cv']
             generate_cover_letter = form.cleaned_data['generate_cover_letter']
-            
-            # Escape the job description
-            escaped_job_description = escape_latex_special_chars(job_description)
-            
-            user_profile = request.user.userprofile
-
-            # Retrieve educations and experiences
-            educations = user_profile.educations.all()
-            experiences = user_profile.experiences.all()
-
-            # Prepare user info
-            user_info = {
-                'name': escape_latex_special_chars(user_profile.name),
-                'email': escape_latex_special_chars(request.user.email),
-                'phone': escape_latex_special_chars(user_profile.phone),
-                'education': format_user_education(educations),
-                'experience': format_user_experience(experiences),
-                'skills': format_user_list_field(user_profile.skills),
-                'interests': format_user_list_field(user_profile.interests),
-                'projects': format_user_list_field(user_profile.projects),
-                'publications': format_user_list_field(user_profile.publications),
-            }
-
-            # Convert user_info to a formatted string for the prompt
-            user_info_str = user_info_to_prompt_format(user_info)
-
-            selected_generations = []
-            if generate_cv:
-                selected_generations.append('cv')
-            if generate_cover_letter:
-                selected_generations.append('cover_letter')
-
-            if not selected_generations:
-                return JsonResponse({'error': "Please select at least one document to generate."}, status=400)
 
-            generated_docs = []
-            for gen_type in selected_generations:
-                if gen_type == 'cv':
-                    template = cv_template
-                    prompt = generate_cv_prompt(user_info_str, escaped_job_description, template)
-                elif gen_type == 'cover_letter':
-                    template = cover_letter_template
-                    prompt = generate_cover_letter_prompt(user_info_str, escaped_job_description, template)
-                
-                try:
-                    # Extract job details
-                    job_details = extract_job_details(job_description)
-                    job_title = job_details.job_title
-                    company = job_details.company
-
-                    response = client.beta.chat.completions.parse(
-                        model="gpt-4o-2024-08-06",
-                        messages=[
-                            {"role": "system", "content": "You are a helpful assistant designed to output LaTeX code in a structured format."},
-                            {"role": "user", "content": prompt}
-                        ],
-                        response_format=LatexOutput,
-                        max_tokens=5000,
-                        temperature=0.7
-                    )
-                    
-                    # Extract the parsed response using the Pydantic model
-                    latex_output = response.choices[0].message.parsed
-                    
-                    # Save the generation
-                    generation = Generation.objects.create(
-                        user=request.user,
-                        job_description=job_description,
-                        generation_type=gen_type,
-                        job_title=job_title,
-                        company=company,
-                        json_output=latex_output.dict(),  # Convert Pydantic model to dictionary
-                    )
-
-                    # Determine filename based on generation type
-                    if gen_type == 'cv':
-                        filename = f"CV-{user_profile.name}-{company}.pdf"
-                    elif gen_type == 'cover_letter':
-                        filename = f"COVER-LETTER-{company}.pdf"
-                    # Sanitize filename
-                    filename = sanitize_filename(filename)
-
-                    # Append document info for the response
-                    generated_docs.append({
-                        'type': gen_type.replace('_', ' ').title(),
-                        'view_url': reverse('render_latex', args=[generation.id]),
-                        'download_url': reverse('download_pdf', args=[generation.id]),
-                        'filename': filename
-                    })
+            if not (generate_cv or generate_cover_letter):
+                return JsonResponse({'error': "Please select at least one document to generate."}, status=400)
 
-                except Exception as e:
-                    logger.error(f"Error generating {gen_type}: {e}")
-                    return JsonResponse({'error': f"Error generating {gen_type}: {e}"}, status=500)
-            
-            return JsonResponse({'documents': generated_docs})
+            try:
+                check_token_budget(request.user)
+            except TokenBudgetExceeded as e:
+                return JsonResponse({'error': str(e)}, status=429)
+
+            # Hand the LLM calls off to a worker so this request returns immediately
+            job = enqueue_generation_job(
+                request.user,
+                job_description,
+                generate_cv=generate_cv,
+                generate_cover_letter=generate_cover_letter,
+                fast_mode=form.cleaned_data['fast_mode'],
+                bypass_cache=form.cleaned_data['bypass_cache'],
+            )
+            return JsonResponse({
+                'job_id': job.id,
+                'status': job.status,
+                'status_url': reverse('job_status', args=[job.id]),
+            }, status=202)
         else:
             return JsonResponse({'error': "Invalid form data."}, status=400)
     else:
         # Initialize both 'generate_cv' and 'generate_cover_letter' as True by default
         form = GenerationForm(initial={'generate_cv': True, 'generate_cover_letter': True})
     
-    return render(request, 'core/generate_documents.html', {'form': form})
+    return render(request, 'core/generate_documents.html', {
+        'form': form,
+        'response_cache_enabled': settings.LLM_RESPONSE_CACHE_ENABLED,
+        'streaming_enabled': settings.GENERATION_STREAMING_ENABLED,
+    })
+
+async def _async_generation_request(request):
+    """
+    Authenticates and validates a generation request made to an async view.
+
+    Returns:
+    - tuple: (user, cleaned form data, generation types), or (JsonResponse, None, None) on error
+      (429 when the user has used up their daily token budget).
+    """
+    # Django 4.2's auth decorators do not support async views, so check the user here
+    user = await sync_to_async(lambda: request.user if request.user.is_authenticated else None)()
+    if user is None:
+        return JsonResponse({'error': "Authentication required."}, status=401), None, None
+    if request.method != 'POST':
+        return JsonResponse({'error': "Method not allowed."}, status=405), None, None
+
+    form = GenerationForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'error': "Invalid form data."}, status=400), None, None
+
+    generation_types = []
+    if form.cleaned_data['generate_cv']:
+        generation_types.append('cv')
+    if form.cleaned_data['generate_cover_letter']:
+        generation_types.append('cover_letter')
+    if not generation_types:
+        return JsonResponse({'error': "Please select at least one document to generate."}, status=400), None, None
+
+    try:
+        await sync_to_async(check_token_budget)(user)
+    except TokenBudgetExceeded as e:
+        return JsonResponse({'error': str(e)}, status=429), None, None
+
+    return user, form.cleaned_data, generation_types
+
+async def generate_documents_async(request):
+    """
+    Generates documents within the request and returns the result as JSON.
+
+    This view is async: served through the ASGI application, the LLM calls are awaited
+    on the event loop instead of holding a worker thread. The response has the shape of
+    core.generation.run_generation's result.
+    """
+    user, data, generation_types = await _async_generation_request(request)
+    if data is None:
+        return user
+
+    result = await arun_generation(
+        user,
+        data['job_description'],
+        generation_types,
+        bypass_cache=data['bypass_cache'],
+        fast_mode=data['fast_mode'],
+    )
+    if not result['documents']:
+        return JsonResponse({'error': "No documents could be generated.", **result}, status=502)
+    return JsonResponse(result)
+
+async def generate_documents_stream(request):
+    """
+    Generates documents within the request and streams progress as Server-Sent Events.
+
+    This view is async: served through the ASGI application, a waiting generation does
+    not hold a worker thread. The response is a text/event-stream; see
+    core.streaming.stream_generation for the events.
+    """
+    user, data, generation_types = await _async_generation_request(request)
+    if data is None:
+        return user
+
+    response = StreamingHttpResponse(
+        stream_generation(
+            user,
+            data['job_description'],
+            generation_types,
+            bypass_cache=data['bypass_cache'],
+            fast_mode=data['fast_mode'],
+        ),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Don't let a reverse proxy buffer the events
+    return response
+
+@login_required
+def job_status(request, job_id):
+    """
+    Returns the status of a generation job as JSON, including the generated documents once it is done.
+    """
+    job = get_object_or_404(GenerationJob, id=job_id, user=request.user)
+    return JsonResponse(job_status_payload(job))
+
+@login_required
+def bulk_generate(request):
+    """
+    Queues the generation of documents for many job descriptions at once.
+
+    Parameters:
+    - request: The HTTP request object. A POST carries a BulkGenerationForm.
+
+    Returns:
+    - HttpResponse: The form, or a redirect to the batch status page.
+    """
+    if request.method == 'POST':
+        form = BulkGenerationForm(request.POST, request.FILES)
+        if form.is_valid():
+            try:
+                check_token_budget(request.user)
+            except TokenBudgetExceeded as e:
+                form.add_error(None, str(e))
+                return render(request, 'core/bulk_generate.html', {'form': form}, status=429)
+            batch = create_generation_batch(
+                request.user,
+                form.cleaned_data['job_description_list'],
+                generate_cv=form.cleaned_data['generate_cv'],
+                generate_cover_letter=form.cleaned_data['generate_cover_letter'],
+                fast_mode=form.cleaned_data['fast_mode'],
+                concurrency=form.cleaned_data['concurrency'],
+                use_batch_api=form.cleaned_data['use_batch_api'],
+            )
+            if batch.use_batch_api:
+                try:
+                    submit_batch(batch)
+                except TokenBudgetExceeded as e:
+                    # The whole batch does not fit in the user's budget: don't keep it
+                    batch.delete()
+                    form.add_error(None, str(e))
+                    return render(request, 'core/bulk_generate.html', {'form': form}, status=429)
+                except Exception as e:
+                    # The batch stays pending; `manage.py openai_batch submit` retries it
+                    logger.error(f"Could not submit generation batch {batch.id}: {e}")
+            return redirect('batch_status', batch_id=batch.id)
+    else:
+        form = BulkGenerationForm()
+    return render(request, 'core/bulk_generate.html', {'form': form})
+
+@login_required
+def batch_status(request, batch_id):
+    """
+    Shows the progress of every job of a batch, with links to the generated documents.
+    """
+    batch = get_object_or_404(GenerationBatch, id=batch_id, user=request.user)
+    progress = batch_progress(batch)
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'id': batch.id,
+            'progress': progress,
+            'jobs': [job_status_payload(job) for job in batch.jobs.order_by('id')],
+        })
+    return render(request, 'core/batch_status.html', {
+        'batch': batch,
+        'jobs': batch.jobs.order_by('id'),
+        'progress': progress,
+        'document_count': len(batch_generations(batch)),
+    })
+
+@login_required
+def batch_zip(request, batch_id):
+    """
+    Downloads the compiled PDFs of a batch as one ZIP archive.
+    """
+    batch = get_object_or_404(GenerationBatch, id=batch_id, user=request.user)
+    # Spill to disk for large batches instead of holding the archive in memory
+    archive = tempfile.SpooledTemporaryFile(max_size=10 * 1024 * 1024)
+    count = write_batch_zip(batch, archive)
+    if not count:
+        archive.close()
+        return HttpResponse("No compiled documents in this batch yet.", status=404)
+    archive.seek(0)
+    return FileResponse(archive, as_attachment=True, filename=f"batch-{batch.id}.zip", content_type='application/zip')
 
 @login_required
 def document_list(request):
-    generations = Generation.objects.filter(user=request.user).order_by('-created_at')
+    generations = (
+        Generation.objects.filter(user=request.user)
+        .select_related('artifact')
+        .order_by('-created_at')
+    )
     return render(request, 'core/document_list.html', {'generations': generations})
 
 @login_required
 def render_latex(request, generation_id):
     """
-    Renders the LaTeX code from the Generation model into a PDF and returns it.
+    Renders the LaTeX code of a generation together with a preview of its PDF.
 
     Parameters:
     - request: The HTTP request object.
     - generation_id (int): The ID of the Generation object containing LaTeX code.
 
     Returns:
-    - HttpResponse: A response containing the compiled PDF or an error message.
+    - HttpResponse: The preview page, or an error message.
     """
     logger.debug(f"Rendering LaTeX for Generation ID: {generation_id}")
 
     # Step 1: Retrieve the Generation object
-    generation = get_object_or_404(Generation, id=generation_id, user=request.user)
+    generation = get_object_or_404(Generation.objects.select_related('artifact'), id=generation_id, user=request.user)
 
     # Step 2: Retrieve the LaTeX code from the JSON output
     latex_code_raw = generation.json_output.get('latex_code', '')
@@ -243,300 +332,99 @@ def render_latex(request, generation_id):
         logger.error(f"No LaTeX code found for Generation ID: {generation_id}")
         return HttpResponse("No LaTeX code found for this document.", status=400)
 
-    # Step 3: Clean the LaTeX code
+    # Step 3: Make sure the PDF artifact exists (compiled now only for older generations);
+    # the page embeds it by URL, so the browser fetches and caches it separately
     try:
-        latex_code_clean = clean_latex(latex_code_raw)
-        logger.debug("Successfully cleaned LaTeX code.")
-    except Exception as e:
-        logger.error(f"LaTeX cleaning failed: {e}")
-        return HttpResponse(f"LaTeX cleaning failed: {e}", status=400)
-
-    # Step 4: Ensure the LaTeX preamble includes the inputenc package for Unicode
-    if '\\usepackage[utf8]{inputenc}' not in latex_code_clean:
-        # Insert \usepackage[utf8]{inputenc} after \documentclass
-        latex_code_clean = latex_code_clean.replace(
-            '\\documentclass[a4paper,10pt]{article}',
-            '\\documentclass[a4paper,10pt]{article}\n\\usepackage[utf8]{inputenc}'
-        )
-        logger.debug("Added '\\usepackage[utf8]{inputenc}' to the LaTeX preamble.")
-
-    # Step 5: Locate the pdflatex executable
-    # Option 1: If pdflatex is in PATH
-    pdflatex_path = shutil.which('pdflatex')
-    if not pdflatex_path:
-        # Option 2: Specify the full path to pdflatex
-        pdflatex_path = '/Library/TeX/texbin/pdflatex'
-        if not os.path.exists(pdflatex_path):
-            logger.error("pdflatex executable not found in PATH or at '/Library/TeX/texbin/pdflatex'.")
-            return HttpResponse(
-                "pdflatex executable not found. Please ensure that LaTeX is installed correctly and that 'pdflatex' is in your system's PATH.",
-                status=500
-            )
-        logger.debug(f"Using pdflatex at: {pdflatex_path}")
-    else:
-        logger.debug(f"Using pdflatex at: {pdflatex_path}")
-
-    # Step 6: Create a temporary directory for LaTeX compilation
-    with tempfile.TemporaryDirectory() as temp_dir:
-        tex_file_path = os.path.join(temp_dir, 'document.tex')
-        pdf_file_path = os.path.join(temp_dir, 'document.pdf')
-
-        # Step 7: Write the cleaned LaTeX code to the .tex file
-        try:
-            with open(tex_file_path, 'w', encoding='utf-8') as tex_file:
-                tex_file.write(latex_code_clean)
-            logger.debug(f"Wrote cleaned LaTeX code to {tex_file_path}")
-        except Exception as e:
-            logger.error(f"Failed to write LaTeX code to file: {e}")
-            return HttpResponse("Failed to write LaTeX code to file.", status=500)
-
-        # Optional: Log the written LaTeX code for debugging
-        try:
-            with open(tex_file_path, 'r', encoding='utf-8') as tex_file:
-                written_latex_code = tex_file.read()
-                logger.debug(f"Written LaTeX code:\n{written_latex_code}")
-        except Exception as e:
-            logger.warning(f"Failed to read written LaTeX code for logging: {e}")
+        get_or_create_pdf_artifact(generation)
+    except LatexCompilationError as e:
+        return HttpResponse(str(e), status=500)
 
-        # Step 8: Compile the LaTeX code using pdflatex
-        try:
-            logger.debug("Starting pdflatex subprocess.")
-            result = subprocess.run(
-                [pdflatex_path, '-interaction=nonstopmode', tex_file_path],
-                cwd=temp_dir,
-                check=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                timeout=60  # Increased timeout to handle longer compilations
-            )
-
-            # Capture the standard output and error for debugging
-            stdout = result.stdout.decode('utf-8')
-            stderr = result.stderr.decode('utf-8')
-            logger.debug(f"pdflatex stdout:\n{stdout}")
-            logger.debug(f"pdflatex stderr:\n{stderr}")
-
-        except subprocess.TimeoutExpired:
-            logger.error("pdflatex subprocess timed out.")
-            return HttpResponse("LaTeX compilation timed out.", status=500)
-        except subprocess.CalledProcessError as e:
-            # Capture and log the error message from pdflatex
-            error_message = e.stderr.decode('utf-8') if e.stderr else "No stderr captured."
-            logger.error(f"Error compiling LaTeX: {error_message}")
-            return HttpResponse(f"Error compiling LaTeX: {error_message}", status=500)
-        except Exception as e:
-            logger.error(f"Unexpected error during LaTeX compilation: {str(e)}")
-            return HttpResponse(f"Unexpected error during LaTeX compilation: {str(e)}", status=500)
-
-        # Step 9: Check if the PDF was created successfully
-        if not os.path.exists(pdf_file_path):
-            logger.error("PDF file was not created.")
-            return HttpResponse("PDF file was not created.", status=500)
-
-        # Step 10: Read the generated PDF content
+    # Step 4: For CVs, list the sections written from parts of the profile that changed since
+    stale_section_titles = []
+    if generation.generation_type == 'cv':
         try:
-            with open(pdf_file_path, 'rb') as pdf_file:
-                pdf_content = pdf_file.read()
-            logger.debug("Read compiled PDF content.")
-        except Exception as e:
-            logger.error(f"Failed to read compiled PDF: {e}")
-            return HttpResponse("Failed to read compiled PDF.", status=500)
+            sections = get_cv_sections(generation)
+            stale_section_titles = [SECTION_TITLES[key] for key in stale_sections(sections, build_user_info(request.user))]
+        except SectionParseError as e:
+            logger.debug(f"Generation ID {generation_id} cannot be regenerated by section: {e}")
 
-    # Step 11: Encode PDF content to base64 for embedding in HTML
-    pdf_base64 = base64.b64encode(pdf_content).decode('utf-8')
-
-    # Step 12: Render the LaTeX code and PDF preview in the template
+    # Step 5: Render the LaTeX code and PDF preview in the template
     return render(request, 'core/render_latex.html', {
-        'latex_code': latex_code_clean,
-        'pdf_content': pdf_base64,
+        'latex_code': prepare_latex_source(latex_code_raw),
         'generation': generation,
+        'stale_section_titles': stale_section_titles,
     })
 
 @login_required
-def download_pdf(request, generation_id):
+def regenerate_sections(request, generation_id):
     """
-    Handles the download of generated PDF documents.
+    Regenerates the sections of a CV whose inputs changed, then recompiles its PDF.
 
     Parameters:
-    - request: The HTTP request object.
-    - generation_id: The ID of the Generation instance.
+    - request: The HTTP request object. A POST may list 'sections' to regenerate
+      (see core.sections.CV_SECTIONS); by default the stale sections are.
+    - generation_id (int): The ID of the CV's Generation.
 
     Returns:
-    - HttpResponse: The PDF file as an HTTP response with the correct filename.
+    - JsonResponse: The result of core.generation.regenerate_cv_sections, or an error.
     """
-    # Retrieve the Generation instance for the current user
-    generation = get_object_or_404(Generation, id=generation_id, user=request.user)
-    
-    # Extract LaTeX code from the JSON output
-    latex_code = generation.json_output.get('latex_code', '')
-    
-    if not latex_code:
+    if request.method != 'POST':
+        return JsonResponse({'error': "Method not allowed."}, status=405)
+    generation = get_object_or_404(Generation.objects.select_related('artifact'), id=generation_id, user=request.user)
+
+    section_keys = request.POST.getlist('sections') or None
+    try:
+        result = regenerate_cv_sections(generation, section_keys, bypass_cache=request.POST.get('bypass_cache') == 'on')
+    except (GenerationError, SectionParseError) as e:
+        return JsonResponse({'error': str(e), 'sections': list(CV_SECTIONS)}, status=400)
+    except TokenBudgetExceeded as e:
+        return JsonResponse({'error': str(e)}, status=429)
+    if result['errors'] and not result['regenerated']:
+        return JsonResponse({'error': "No section could be regenerated.", **result}, status=502)
+    return JsonResponse(result)
+
+def _serve_generation_pdf(request, generation_id, as_attachment):
+    generation = get_object_or_404(
+        Generation.objects.select_related('artifact', 'user__userprofile'), id=generation_id, user=request.user
+    )
+
+    if not generation.json_output.get('latex_code', ''):
         logger.error(f"No LaTeX code found for Generation ID: {generation_id}")
         return HttpResponse("No LaTeX code found for this document.", status=400)
-    
-    with tempfile.TemporaryDirectory() as temp_dir:
-        tex_file_path = os.path.join(temp_dir, 'document.tex')
-        pdf_file_path = os.path.join(temp_dir, 'document.pdf')
-        
-        # Write LaTeX code to .tex file
-        try:
-            with open(tex_file_path, 'w', encoding='utf-8') as tex_file:
-                tex_file.write(latex_code)
-            logger.debug(f"Wrote LaTeX code to {tex_file_path}")
-        except Exception as e:
-            logger.error(f"Failed to write LaTeX code to file: {e}")
-            return HttpResponse("Failed to write LaTeX code to file.", status=500)
-        
-        # Compile LaTeX to PDF using pdflatex
-        try:
-            pdflatex_path = shutil.which('pdflatex')
-            if not pdflatex_path:
-                logger.error("pdflatex executable not found in PATH.")
-                return HttpResponse("pdflatex executable not found. Please ensure that LaTeX is installed correctly and that 'pdflatex' is in your system's PATH.", status=500)
-            logger.debug(f"Using pdflatex at: {pdflatex_path}")
-            
-            subprocess.run(
-                [pdflatex_path, '-interaction=nonstopmode', tex_file_path],
-                cwd=temp_dir,
-                check=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                timeout=60  # Adjust as needed
-            )
-        except subprocess.TimeoutExpired:
-            logger.error("pdflatex subprocess timed out.")
-            return HttpResponse("LaTeX compilation timed out.", status=500)
-        except subprocess.CalledProcessError as e:
-            error_output = e.stderr.decode('utf-8') if e.stderr else "Unknown error."
-            logger.error(f"Error compiling LaTeX for Generation ID {generation_id}: {error_output}")
-            return HttpResponse(f"Error compiling LaTeX: {error_output}", status=500)
-        except Exception as e:
-            logger.error(f"Unexpected error during LaTeX compilation: {e}")
-            return HttpResponse(f"Unexpected error during LaTeX compilation: {e}", status=500)
-        
-        # Read the generated PDF
-        if not os.path.exists(pdf_file_path):
-            logger.error(f"PDF file was not created for Generation ID {generation_id}.")
-            return HttpResponse("PDF file was not created.", status=500)
-        
-        try:
-            with open(pdf_file_path, 'rb') as pdf_file:
-                pdf_content = pdf_file.read()
-            logger.debug(f"Read compiled PDF content for Generation ID {generation_id}.")
-        except Exception as e:
-            logger.error(f"Failed to read compiled PDF: {e}")
-            return HttpResponse("Failed to read compiled PDF.", status=500)
-    
-    # Determine the correct filename based on generation type and company
-    if generation.generation_type == 'cv':
-        name = generation.user.userprofile.name
-        company = generation.company
-        filename = f"CV-{name}-{company}.pdf"
-    elif generation.generation_type == 'cover_letter':
-        company = generation.company
-        filename = f"COVER-LETTER-{company}.pdf"
-    else:
-        filename = f"{generation.get_generation_type_display()}_{generation.id}.pdf"
-    
-    # Sanitize the filename to prevent issues
-    filename = sanitize_filename(filename)
-    
-    # Create HTTP response for file download
-    response = HttpResponse(pdf_content, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    return response
+
+    # Serve the stored PDF artifact (compiled now only for older generations)
+    try:
+        artifact = get_or_create_pdf_artifact(generation)
+    except LatexCompilationError as e:
+        logger.error(f"Error compiling LaTeX for Generation ID {generation_id}: {truncate_payload(str(e))}")
+        return HttpResponse(str(e), status=500)
+
+    return pdf_artifact_response(request, artifact, document_filename(generation), as_attachment=as_attachment)
+
+@login_required
+def serve_pdf(request, generation_id):
     """
-    Handles the download of generated PDF documents.
+    Serves the PDF of a generation for display in the browser.
+
+    The file is streamed from the stored artifact, with ETag / Last-Modified
+    validation (304 responses) and Range requests (206 responses).
 
     Parameters:
     - request: The HTTP request object.
     - generation_id: The ID of the Generation instance.
 
     Returns:
-    - HttpResponse: The PDF file as an HTTP response with the correct filename.
+    - HttpResponse: The PDF, or an error message.
     """
-    generation = get_object_or_404(Generation, id=generation_id, user=request.user)
-    
-    latex_code = generation.json_output.get('latex_code', '')
-    
-    if not latex_code:
-        logger.error(f"No LaTeX code found for Generation ID: {generation_id}")
-        return HttpResponse("No LaTeX code found for this document.", status=400)
-    
-    with tempfile.TemporaryDirectory() as temp_dir:
-        tex_file_path = os.path.join(temp_dir, 'document.tex')
-        pdf_file_path = os.path.join(temp_dir, 'document.pdf')
-        
-        # Write LaTeX code to .tex file
-        try:
-            with open(tex_file_path, 'w', encoding='utf-8') as tex_file:
-                tex_file.write(latex_code)
-            logger.debug(f"Wrote LaTeX code to {tex_file_path}")
-        except Exception as e:
-            logger.error(f"Failed to write LaTeX code to file: {e}")
-            return HttpResponse("Failed to write LaTeX code to file.", status=500)
-        
-        # Compile LaTeX to PDF using pdflatex
-        try:
-            pdflatex_path = shutil.which('pdflatex')
-            if not pdflatex_path:
-                logger.error("pdflatex executable not found in PATH.")
-                return HttpResponse("pdflatex executable not found. Please ensure that LaTeX is installed correctly and that 'pdflatex' is in your system's PATH.", status=500)
-            logger.debug(f"Using pdflatex at: {pdflatex_path}")
-            
-            subprocess.run(
-                [pdflatex_path, '-interaction=nonstopmode', tex_file_path],
-                cwd=temp_dir,
-                check=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                timeout=60  # Adjust as needed
-            )
-        except subprocess.TimeoutExpired:
-            logger.error("pdflatex subprocess timed out.")
-            return HttpResponse("LaTeX compilation timed out.", status=500)
-        except subprocess.CalledProcessError as e:
-            error_output = e.stderr.decode('utf-8') if e.stderr else "Unknown error."
-            logger.error(f"Error compiling LaTeX for Generation ID {generation_id}: {error_output}")
-            return HttpResponse(f"Error compiling LaTeX: {error_output}", status=500)
-        except Exception as e:
-            logger.error(f"Unexpected error during LaTeX compilation: {e}")
-            return HttpResponse(f"Unexpected error during LaTeX compilation: {e}", status=500)
-        
-        # Read the generated PDF
-        if not os.path.exists(pdf_file_path):
-            logger.error(f"PDF file was not created for Generation ID {generation_id}.")
-            return HttpResponse("PDF file was not created.", status=500)
-        
-        try:
-            with open(pdf_file_path, 'rb') as pdf_file:
-                pdf_content = pdf_file.read()
-            logger.debug(f"Read compiled PDF content for Generation ID {generation_id}.")
-        except Exception as e:
-            logger.error(f"Failed to read compiled PDF: {e}")
-            return HttpResponse("Failed to read compiled PDF.", status=500)
-    
-    # Determine the correct filename based on generation type and company
-    if generation.generation_type == 'cv':
-        name = generation.user.userprofile.name
-        company = generation.company
-        filename = f"CV-{name}-{company}.pdf"
-    elif generation.generation_type == 'cover_letter':
-        company = generation.company
-        filename = f"COVER-LETTER-{company}.pdf"
-    else:
-        filename = f"{generation.get_generation_type_display()}_{generation.id}.pdf"
-    
-    # Sanitize the filename to prevent issues
-    filename = sanitize_filename(filename)
-    
-    # Create HTTP response for file download
-    response = HttpResponse(pdf_content, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    return response
+    return _serve_generation_pdf(request, generation_id, as_attachment=False)
+
+@login_required
+def download_pdf(request, generation_id):
     """
     Handles the download of generated PDF documents.
 
+    Served like serve_pdf, but as an attachment with the document's filename.
+
     Parameters:
     - request: The HTTP request object.
     - generation_id: The ID of the Generation instance.
@@ -544,82 +432,30 @@ def download_pdf(request, generation_id):
     Returns:
     - HttpResponse: The PDF file as an HTTP response with the correct filename.
     """
-    generation = get_object_or_404(Generation, id=generation_id, user=request.user)
-    
-    latex_code = generation.json_output.get('latex_code', '')
-    
-    if not latex_code:
-        logger.error(f"No LaTeX code found for Generation ID: {generation_id}")
-        return HttpResponse("No LaTeX code found for this document.", status=400)
-    
-    with tempfile.TemporaryDirectory() as temp_dir:
-        tex_file_path = os.path.join(temp_dir, 'document.tex')
-        pdf_file_path = os.path.join(temp_dir, 'document.pdf')
-        
-        # Write LaTeX code to .tex file
-        try:
-            with open(tex_file_path, 'w', encoding='utf-8') as tex_file:
-                tex_file.write(latex_code)
-            logger.debug(f"Wrote LaTeX code to {tex_file_path}")
-        except Exception as e:
-            logger.error(f"Failed to write LaTeX code to file: {e}")
-            return HttpResponse("Failed to write LaTeX code to file.", status=500)
-        
-        # Compile LaTeX to PDF using pdflatex
-        try:
-            pdflatex_path = shutil.which('pdflatex')
-            if not pdflatex_path:
-                logger.error("pdflatex executable not found in PATH.")
-                return HttpResponse("pdflatex executable not found. Please ensure that LaTeX is installed correctly and that 'pdflatex' is in your system's PATH.", status=500)
-            logger.debug(f"Using pdflatex at: {pdflatex_path}")
-            
-            subprocess.run(
-                [pdflatex_path, '-interaction=nonstopmode', tex_file_path],
-                cwd=temp_dir,
-                check=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                timeout=60  # Adjust as needed
-            )
-        except subprocess.TimeoutExpired:
-            logger.error("pdflatex subprocess timed out.")
-            return HttpResponse("LaTeX compilation timed out.", status=500)
-        except subprocess.CalledProcessError as e:
-            error_output = e.stderr.decode('utf-8') if e.stderr else "Unknown error."
-            logger.error(f"Error compiling LaTeX for Generation ID {generation_id}: {error_output}")
-            return HttpResponse(f"Error compiling LaTeX: {error_output}", status=500)
-        except Exception as e:
-            logger.error(f"Unexpected error during LaTeX compilation: {e}")
-            return HttpResponse(f"Unexpected error during LaTeX compilation: {e}", status=500)
-        
-        # Read the generated PDF
-        if not os.path.exists(pdf_file_path):
-            logger.error(f"PDF file was not created for Generation ID {generation_id}.")
-            return HttpResponse("PDF file was not created.", status=500)
-        
-        try:
-            with open(pdf_file_path, 'rb') as pdf_file:
-                pdf_content = pdf_file.read()
-            logger.debug(f"Read compiled PDF content for Generation ID {generation_id}.")
-        except Exception as e:
-            logger.error(f"Failed to read compiled PDF: {e}")
-            return HttpResponse("Failed to read compiled PDF.", status=500)
-    
-    # Determine the correct filename based on generation type and company
-    if generation.generation_type == 'cv':
-        name = generation.user.userprofile.name
-        company = generation.company
-        filename = f"CV-{name}-{company}.pdf"
-    elif generation.generation_type == 'cover_letter':
-        company = generation.company
-        filename = f"COVER-LETTER-{company}.pdf"
+    return _serve_generation_pdf(request, generation_id, as_attachment=True)
+
+def metrics(request):
+    """
+    Exposes the pipeline metrics of this process in the Prometheus text format.
+
+    Disabled unless settings.METRICS_ENABLED. The scraper must send
+    settings.METRICS_AUTH_TOKEN as a Bearer token; without a token, the endpoint is
+    only served with DEBUG on.
+
+    Parameters:
+    - request: The HTTP request object.
+
+    Returns:
+    - HttpResponse: The metrics, or a 401/404 error.
+    """
+    if not settings.METRICS_ENABLED:
+        return HttpResponse("Not found.", status=404)
+    if not settings.METRICS_AUTH_TOKEN:
+        if not settings.DEBUG:
+            logger.warning("METRICS_ENABLED is set without METRICS_AUTH_TOKEN; not serving /metrics.")
+            return HttpResponse("Not found.", status=404)
     else:
-        filename = f"{generation.get_generation_type_display()}_{generation.id}.pdf"
-    
-    # Sanitize the filename to prevent issues
-    filename = sanitize_filename(filename)
-    
-    # Create HTTP response for file download
-    response = HttpResponse(pdf_content, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    return response
\ No newline at end of file
+        authorization = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(authorization, f"Bearer {settings.METRICS_AUTH_TOKEN}"):
+            return HttpResponse("Unauthorized.", status=401)
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import json
 import os
 from pathlib import Path
 from dotenv import load_dotenv
@@ -59,6 +60,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.timing_middleware",  # First, so it times the whole request
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -89,6 +91,13 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "cv_app.wsgi.application"
 
+ASGI_APPLICATION = "cv_app.asgi.application"
+
+# Stream generation progress to the browser (Server-Sent Events) instead of queueing
+# a background job. Only enable this when serving cv_app.asgi with an ASGI server
+# (e.g. uvicorn or daphne): under WSGI the event stream is buffered until the end.
+GENERATION_STREAMING_ENABLED = os.getenv('GENERATION_STREAMING_ENABLED') == 'True'
+
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
@@ -123,17 +132,53 @@ SOCIALACCOUNT_PROVIDERS = {
     }
 }
 
+# Logging
+# LOG_PROFILE 'production' (the default unless DEBUG) writes JSON lines at LOG_LEVEL
+# (INFO by default) from a background thread, so requests never wait on console
+# I/O, and keeps the HTTP client libraries at WARNING. 'development' writes plain
+# lines synchronously, at DEBUG by default. Large payloads (compiler output, model
+# responses) are cut to LOG_PAYLOAD_MAX_CHARS characters; a share of
+# LOG_PAYLOAD_SAMPLE_RATE of them is logged in full (see core.log.log_payload).
+
+LOG_PROFILE = os.getenv('LOG_PROFILE', 'development' if DEBUG else 'production')
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'DEBUG' if LOG_PROFILE == 'development' else 'INFO')
+
+LOG_PAYLOAD_MAX_CHARS = int(os.getenv('LOG_PAYLOAD_MAX_CHARS', 500))
+
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv('LOG_PAYLOAD_SAMPLE_RATE', 0.0))
+
+if LOG_PROFILE == 'production':
+    _console_handler = {
+        'class': 'core.log.QueueStreamHandler',
+        'formatter': 'json',
+    }
+    # The HTTP client libraries log a line per API call at INFO, connection details at DEBUG
+    _library_log_level = 'WARNING'
+else:
+    _console_handler = {
+        'class': 'logging.StreamHandler',
+        'formatter': 'plain',
+    }
+    _library_log_level = LOG_LEVEL
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
-    'handlers': {
-        'console': {
-            'class': 'logging.StreamHandler',
+    'formatters': {
+        'plain': {
+            'format': '%(asctime)s %(levelname)s %(name)s: %(message)s',
         },
+        'json': {
+            '()': 'core.log.JsonFormatter',
+        },
+    },
+    'handlers': {
+        'console': _console_handler,
     },
     'root': {
         'handlers': ['console'],
-        'level': 'DEBUG',  # Set root logger to DEBUG level
+        'level': LOG_LEVEL,
     },
     'loggers': {
         'django': {
@@ -141,11 +186,14 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
         },
-        'core': {  # Replace 'core' with your app name
+        'core': {
             'handlers': ['console'],
-            'level': 'DEBUG',
+            'level': LOG_LEVEL,
             'propagate': False,
         },
+        'httpx': {'level': _library_log_level},
+        'httpcore': {'level': _library_log_level},
+        'openai': {'level': _library_log_level},
     },
 }
 
@@ -191,3 +239,204 @@ STATIC_URL = "static/"
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# Compiled PDF cache
+# Compiled PDFs are cached on disk, keyed by a hash of their LaTeX source,
+# so repeated views/downloads of a document skip pdflatex entirely.
+
+PDF_CACHE_DIR = os.getenv('PDF_CACHE_DIR', BASE_DIR / "pdf_cache")
+
+PDF_CACHE_MAX_BYTES = int(os.getenv('PDF_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+
+# LaTeX compilation
+# Documents are compiled by the LATEX_BACKEND class (see core.latex.LatexBackend).
+# At most LATEX_COMPILE_WORKERS compilations run at once per server process.
+# Documents using a bundled template preamble are compiled with a precompiled
+# format of that preamble, stored in LATEX_FORMAT_DIR (build them ahead of time
+# with `python manage.py warm_latex_formats`).
+
+LATEX_BACKEND = os.getenv('LATEX_BACKEND', 'core.latex.PdflatexBackend')
+
+# Path of the pdflatex executable; found on the PATH at startup when unset
+PDFLATEX_PATH = os.getenv('PDFLATEX_PATH')
+
+LATEX_COMPILE_WORKERS = int(os.getenv('LATEX_COMPILE_WORKERS', 4))
+
+LATEX_PRELOAD_FORMATS = os.getenv('LATEX_PRELOAD_FORMATS', 'True') == 'True'
+
+LATEX_FORMAT_DIR = os.getenv('LATEX_FORMAT_DIR', BASE_DIR / "latex_formats")
+
+# Stored artifacts (compiled PDFs). These are served through authenticated views,
+# never directly from MEDIA_URL.
+
+MEDIA_ROOT = os.getenv('MEDIA_ROOT', BASE_DIR / "media")
+
+MEDIA_URL = "media/"
+
+# Job details extracted from a job description are memoized (in-process and in
+# the 'job_details' cache, on disk so the web and worker processes share it) for
+# this many seconds, keyed by the normalized posting text.
+
+JOB_DETAILS_CACHE_TTL = int(os.getenv('JOB_DETAILS_CACHE_TTL', 7 * 24 * 60 * 60))
+
+# OpenAI rate limits
+# All LLM calls of a process share these budgets (set them to the account's
+# limits divided by the number of server and worker processes; 0 disables a
+# limit). Calls are queued fairly between users, and 429 / 5xx responses are
+# retried up to OPENAI_MAX_RETRIES times with jittered exponential backoff.
+# The tokens budget is off by default: a low value (e.g. the 30000 of the lowest
+# tier) is smaller than one CV, cover letter and job details burst at the default
+# completion limits, so it would serialize every generation.
+
+OPENAI_REQUESTS_PER_MINUTE = int(os.getenv('OPENAI_REQUESTS_PER_MINUTE', 500))
+
+OPENAI_TOKENS_PER_MINUTE = int(os.getenv('OPENAI_TOKENS_PER_MINUTE', 0))
+
+OPENAI_MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', 5))
+
+OPENAI_BACKOFF_BASE = float(os.getenv('OPENAI_BACKOFF_BASE', 1.0))
+
+OPENAI_BACKOFF_MAX = float(os.getenv('OPENAI_BACKOFF_MAX', 60.0))
+
+# OpenAI connections
+# Every LLM call of a process goes through one shared client per sync/async
+# flavour, whose connection pool keeps connections alive between calls.
+# OPENAI_HTTP2 needs the 'h2' package (pip install 'httpx[http2]'). Timeouts are
+# in seconds: generation calls get OPENAI_GENERATION_TIMEOUT, job details
+# extraction OPENAI_EXTRACTION_TIMEOUT, anything else OPENAI_READ_TIMEOUT.
+# OPENAI_BASE_URL points the clients at another OpenAI-compatible server, such as
+# the local stub used by `manage.py benchmark_generation` (the API by default).
+
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL') or None
+
+OPENAI_MAX_CONNECTIONS = int(os.getenv('OPENAI_MAX_CONNECTIONS', 20))
+
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('OPENAI_MAX_KEEPALIVE_CONNECTIONS', 10))
+
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv('OPENAI_KEEPALIVE_EXPIRY', 60.0))
+
+OPENAI_HTTP2 = os.getenv('OPENAI_HTTP2', 'False') == 'True'
+
+OPENAI_CONNECT_TIMEOUT = float(os.getenv('OPENAI_CONNECT_TIMEOUT', 5.0))
+
+OPENAI_READ_TIMEOUT = float(os.getenv('OPENAI_READ_TIMEOUT', 60.0))
+
+OPENAI_GENERATION_TIMEOUT = float(os.getenv('OPENAI_GENERATION_TIMEOUT', 120.0))
+
+OPENAI_EXTRACTION_TIMEOUT = float(os.getenv('OPENAI_EXTRACTION_TIMEOUT', 30.0))
+
+# Generation workers
+# A job still running GENERATION_JOB_TIMEOUT seconds after a worker claimed it is
+# taken to belong to a worker that died, and is queued again for another worker.
+# Keep it well above the longest generation; 0 disables it.
+
+GENERATION_JOB_TIMEOUT = int(os.getenv('GENERATION_JOB_TIMEOUT', 30 * 60))
+
+# Bulk generation
+# Jobs of one batch running at once (per batch, across all workers), and the
+# maximum number of job descriptions accepted in one submission.
+
+BULK_GENERATION_CONCURRENCY = int(os.getenv('BULK_GENERATION_CONCURRENCY', 3))
+
+BULK_GENERATION_MAX_JOBS = int(os.getenv('BULK_GENERATION_MAX_JOBS', 100))
+
+# Batches can instead be generated through the OpenAI Batch API. Set
+# OPENAI_BATCH_BACKEND to 'core.batch_api.LocalBatchBackend' to use a file-based
+# stand-in (in OPENAI_BATCH_LOCAL_DIR) that answers with placeholder documents.
+
+OPENAI_BATCH_BACKEND = os.getenv('OPENAI_BATCH_BACKEND', 'core.batch_api.OpenAIBatchBackend')
+
+OPENAI_BATCH_LOCAL_DIR = os.getenv('OPENAI_BATCH_LOCAL_DIR', BASE_DIR / "openai_batches")
+
+# Caches
+# The 'llm_responses' cache persists structured LLM responses on disk so that
+# regenerating identical documents (same model, prompt, schema and temperature)
+# skips the API call. It is opt-in through LLM_RESPONSE_CACHE_ENABLED.
+
+LLM_RESPONSE_CACHE_ENABLED = os.getenv('LLM_RESPONSE_CACHE_ENABLED') == 'True'
+
+LLM_RESPONSE_CACHE_TTL = int(os.getenv('LLM_RESPONSE_CACHE_TTL', 30 * 24 * 60 * 60))
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "llm_responses": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.getenv('LLM_RESPONSE_CACHE_DIR', BASE_DIR / "llm_cache"),
+        "TIMEOUT": LLM_RESPONSE_CACHE_TTL,
+        "OPTIONS": {
+            "MAX_ENTRIES": 10000,
+        },
+    },
+    "job_details": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.getenv('JOB_DETAILS_CACHE_DIR', BASE_DIR / "job_details_cache"),
+        "TIMEOUT": JOB_DETAILS_CACHE_TTL,
+        "OPTIONS": {
+            "MAX_ENTRIES": 10000,
+        },
+    },
+}
+
+# Document generation models. Fast Mode uses a smaller model, a trimmed prompt and a
+# lower completion limit. JOB_DETAILS_MODEL extracts the job title and company
+# (directly, in Batch API batches and in the prompt size report).
+
+GENERATION_MODEL = os.getenv('GENERATION_MODEL', "gpt-4o-2024-08-06")
+
+FAST_MODE_MODEL = os.getenv('FAST_MODE_MODEL', "gpt-4o-mini-2024-07-18")
+
+JOB_DETAILS_MODEL = os.getenv('JOB_DETAILS_MODEL', GENERATION_MODEL)
+
+FAST_MODE_MAX_TOKENS = int(os.getenv('FAST_MODE_MAX_TOKENS', 3000))
+
+# With local rendering, the layout, contact header, education, dates and skills of
+# the documents are rendered from the profile (core.rendering) and the model only
+# writes the tailored prose, within LOCAL_RENDERING_MAX_TOKENS. Set it to False to
+# have the model fill in the whole LaTeX template instead.
+
+LOCAL_LATEX_RENDERING = os.getenv('LOCAL_LATEX_RENDERING', 'True') == 'True'
+
+LOCAL_RENDERING_MAX_TOKENS = int(os.getenv('LOCAL_RENDERING_MAX_TOKENS', 2000))
+
+# The profile is sent to the model as minified JSON; empty fields are left out
+# unless PROMPT_PRUNE_EMPTY_FIELDS is False. See `manage.py prompt_token_report`.
+
+PROMPT_PRUNE_EMPTY_FIELDS = os.getenv('PROMPT_PRUNE_EMPTY_FIELDS', 'True') == 'True'
+
+# Completion limit of the calls that regenerate a single CV section (see core.sections).
+
+SECTION_MAX_TOKENS = int(os.getenv('SECTION_MAX_TOKENS', 1500))
+
+# Usage accounting
+# The tokens, latency and cost of every completion call are stored as UsageRecord
+# rows, linked to the document they produced (see `manage.py usage_report`).
+# LLM_PRICES are USD per million (prompt, completion) tokens, by model; add or
+# override models with a JSON object in the LLM_PRICES environment variable.
+# Batch API calls cost LLM_BATCH_PRICE_FACTOR of the regular price.
+# USER_DAILY_TOKEN_BUDGET caps the tokens a user can use per day (UTC; 0 disables it).
+
+LLM_PRICES = {
+    'gpt-4o-2024-08-06': (2.50, 10.00),
+    'gpt-4o-mini-2024-07-18': (0.15, 0.60),
+    **json.loads(os.getenv('LLM_PRICES', '{}')),
+}
+
+LLM_BATCH_PRICE_FACTOR = float(os.getenv('LLM_BATCH_PRICE_FACTOR', 0.5))
+
+USER_DAILY_TOKEN_BUDGET = int(os.getenv('USER_DAILY_TOKEN_BUDGET', 0))
+
+# Metrics
+# Pipeline stages (profile queries, prompt build, completion calls, DB writes, LaTeX
+# compilation, PDF reads) are timed by core.metrics and exposed at /metrics in the
+# Prometheus format once METRICS_ENABLED is set, to scrapers sending METRICS_AUTH_TOKEN
+# as a Bearer token (without a token, only with DEBUG on). With
+# SERVER_TIMING_ENABLED, responses list the stages they went through in a
+# Server-Timing header (visible in the browser's network panel).
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'False') == 'True'
+
+METRICS_AUTH_TOKEN = os.getenv('METRICS_AUTH_TOKEN', '')
+
+SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING_ENABLED', 'False') == 'True'